@@ -0,0 +1,187 @@
+# batch.py
+"""
+Plan pairings for a whole file of catering orders at once.
+
+    python batch.py orders.csv -o pairings.jsonl --concurrency 8
+
+Input is CSV (header row) or JSONL. Each row needs a `query` (or `event`) and may
+add `audience`, `constraints` (comma/semicolon separated or a JSON list) and
+`headcount`. Each successful order becomes one PairingResponse JSON line in the
+output; failures go to `<output>.errors.jsonl` with their row number.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from scheduler import backoff_delay, is_retryable, priority, retry_after
+
+
+# ---------- input ----------
+def _split_constraints(value) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).replace(";", ",").split(",") if v.strip()]
+
+
+def row_to_query(row: Dict[str, Any]) -> str:
+    """
+    Fold the structured columns back into the free-text form the pipeline expects. The
+    audience goes in as an explicit `audience:` field, which parse_query strips from the
+    event and lets override audience words in the event name.
+    """
+    parts = [str(row.get("query") or row.get("event") or "").strip()]
+    if row.get("audience"):
+        parts.append(f"audience: {row['audience']}")
+    constraints = _split_constraints(row.get("constraints"))
+    if constraints:
+        parts.append(", ".join(constraints))
+    if row.get("headcount"):
+        parts.append(f"for {row['headcount']}")
+    return ", ".join(p for p in parts if p)
+
+
+def read_requests(path: str) -> List[str]:
+    if path.endswith(".jsonl") or path.endswith(".ndjson"):
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    obj = json.loads(line)
+                    rows.append(obj if isinstance(obj, dict) else {"query": str(obj)})
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+    return [row_to_query(r) for r in rows]
+
+
+# ---------- retry ----------
+# Each model call already retries on 429 / overload in the scheduler; this outer retry
+# re-plans an order whose calls ran out of retries.
+async def _plan_with_retry(query: str, retries: int):
+    from main import aplan_pairing
+
+    attempt = 0
+    while True:
+        try:
+            # a catering order would rather wait than get a degraded quick answer
+            return await aplan_pairing(query, quote=False, deadline_s=0)
+        except Exception as ex:
+            if attempt >= retries or not is_retryable(ex):
+                raise
+            await asyncio.sleep(retry_after(ex) or backoff_delay(attempt))
+            attempt += 1
+
+
+# ---------- runner ----------
+async def run_batch(queries: List[str], concurrency: int = 8, retries: int = 5,
+                    progress: bool = True) -> List[Any]:
+    """Plan every query with at most `concurrency` in flight. Returns results/exceptions in input order."""
+    sem = asyncio.Semaphore(max(1, concurrency))
+    done = 0
+
+    async def one(q: str):
+        nonlocal done
+        async with sem:
+            try:
+                return await _plan_with_retry(q, retries)
+            except Exception as ex:
+                return ex
+            finally:
+                done += 1
+                if progress:
+                    print(f"\r{done}/{len(queries)} planned", end="", file=sys.stderr, flush=True)
+
+    # bulk imports queue behind counter requests for model calls (scheduler.py)
+    with priority("batch"):
+        results = await asyncio.gather(*(one(q) for q in queries))
+    if progress:
+        print(file=sys.stderr)
+    return attach_quotes(queries, results)
+
+
+def attach_quotes(queries: List[str], results: List[Any]) -> List[Any]:
+    """Size every order that names a headcount in one vectorized pass (see quantities.py)."""
+    from query import parse_query
+    from quantities import attach_quote, quote_many
+
+    todo = [(i, parse_query(q).headcount) for i, (q, r) in enumerate(zip(queries, results))
+            if not isinstance(r, BaseException)]
+    todo = [(i, n) for i, n in todo if n]
+    if not todo:
+        return results
+    quotes = quote_many([results[i] for i, _ in todo], [n for _, n in todo])
+    results = list(results)
+    for (i, _), q in zip(todo, quotes):
+        results[i] = attach_quote(results[i], q)
+    return results
+
+
+def write_results(queries: List[str], results: List[Any], out_path: str) -> int:
+    errors = []
+    ok = 0
+    with open(out_path, "w", encoding="utf-8") as out:
+        for i, (q, r) in enumerate(zip(queries, results), start=1):
+            if isinstance(r, BaseException):
+                errors.append({"row": i, "query": q, "error": f"{type(r).__name__}: {r}"})
+                continue
+            out.write(r.model_dump_json() + "\n")
+            ok += 1
+    if errors:
+        with open(out_path + ".errors.jsonl", "w", encoding="utf-8") as f:
+            for e in errors:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+    return ok
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Plan pairings for a CSV/JSONL of catering orders.")
+    ap.add_argument("input", help="orders file (.csv or .jsonl)")
+    ap.add_argument("-o", "--output", default="pairings_batch.jsonl", help="PairingResponse JSONL to write")
+    ap.add_argument("-c", "--concurrency", type=int, default=8, help="max requests in flight")
+    ap.add_argument("--retries", type=int, default=5, help="retries per order on rate limits / overload")
+    ap.add_argument("--history", action="store_true", help="also save planned orders to the history store")
+    args = ap.parse_args(argv)
+
+    queries = read_requests(args.input)
+    started = time.perf_counter()
+    results = asyncio.run(run_batch(queries, args.concurrency, args.retries))
+    elapsed = time.perf_counter() - started
+    ok = write_results(queries, results, args.output)
+    if args.history:
+        from history import HistoryStore
+        planned = [(q, r) for q, r in zip(queries, results) if not isinstance(r, BaseException)]
+        with HistoryStore() as history:
+            history.add_many([r for _, r in planned], [q for q, _ in planned])
+
+    from main import get_response_cache
+    from repair import repair_summary
+    from metrics import get_recorder
+    from routing import routing_summary
+    from prefetch import prefetch_summary
+    from snapshot import snapshot_summary
+    from scheduler import scheduler_summary
+    print(f"{ok}/{len(queries)} orders planned in {elapsed:.1f}s "
+          f"({len(queries) / elapsed if elapsed else 0:.1f} orders/s) -> {args.output}")
+    if ok < len(queries):
+        print(f"{len(queries) - ok} failed, see {args.output}.errors.jsonl")
+    from tools import tool_summary
+    print(get_response_cache().summary())
+    print(tool_summary())
+    print(repair_summary())
+    print(routing_summary())
+    print(prefetch_summary())
+    print(snapshot_summary())
+    print(scheduler_summary())
+    print(get_recorder().summary())
+    return 0 if ok == len(queries) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
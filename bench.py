@@ -0,0 +1,309 @@
+# bench.py
+# Offline benchmark of the request pipeline — no Anthropic key, no network.
+# A deterministic fake chat model replays tool calls / answers (recorded ones if given,
+# otherwise scripted from the KB), and `search` / `wikipedia` are local stand-ins.
+# Everything else is the real code path:
+#   prompt -> tool-calling agent -> fix_output -> parse (+ local repair) -> render -> save_to_txt
+#
+#     python bench.py                          # built-in corpus, 5 iterations
+#     python bench.py --corpus queries.txt --iterations 20 --json bench.json
+#     python bench.py --baseline bench.json --max-regression 0.2   # non-zero exit on regression
+import argparse
+import ast
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from metrics import percentile
+
+DEFAULT_CORPUS = [
+    "pizza night",
+    "tailgate",
+    "ravens game for 30",
+    "office lunch for 20, vegetarian",
+    "kids birthday, nut-free",
+    "date night",
+    "italian family dinner for 8",
+    "coffee & pastry break for the office",
+    "butcher grill pack for a cookout",
+    "build-your-own pasta kit for 6, nut-free",
+    "holiday antipasto & dessert trays",
+    "italian sub platter for a team meeting",
+    "christmas eve feast",
+    "baby shower brunch",
+    "retirement party for 40 adults",
+    "graduation open house, mixed ages",
+    "book club evening",
+    "wedding rehearsal dinner, 21+",
+    "sunday gravy dinner with nonna",
+    "football party, no alcohol",
+]
+
+CANNED_SEARCH = ("Scittino's Italian Market — Catering: antipasto platters, pasta trays, "
+                 "meatball trays, cannoli trays. https://www.scittinositalianmarketplace.com/catering")
+CANNED_WIKI = "Italian cuisine: a Mediterranean cuisine of ingredients, recipes and techniques."
+
+
+# ---------- fake model ----------
+def _kb_answer(query: str, observation: str) -> Dict[str, Any]:
+    from repair import coerce_pairing
+    try:
+        obj = ast.literal_eval(observation)
+    except (ValueError, SyntaxError):
+        obj = None
+    answer = coerce_pairing(obj) if isinstance(obj, dict) else None
+    if answer is not None:
+        answer.update(event=obj.get("preset") or query, sources=["Scittino’s KB"], tools_used=["pairing_kb"],
+                      rationale=f"Matched the '{obj.get('preset')}' preset from Scittino’s KB.")
+    else:
+        answer = {
+            "event": query,
+            "menu": {"appetizers": ["Antipasto platter", "Arancini"], "mains": ["Baked ziti tray", "Meatball tray"],
+                     "sides": ["House salad"], "desserts": ["Cannoli tray"]},
+            "drinks": {"alcoholic": [], "non_alcoholic": ["Italian sodas", "Sparkling water"]},
+            "rationale": "No preset fit, so this is a Scittino’s-inspired plan from catering staples.",
+            "sources": ["Scittino’s-inspired custom plan"],
+            "tools_used": ["pairing_kb", "search"],
+        }
+    for k in ("tags", "preset", "match_score", "notes"):
+        answer.pop(k, None)
+    return answer
+
+
+@lru_cache(maxsize=None)
+def _fake_model_class():
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class ReplayChatModel(BaseChatModel):
+        """
+        Deterministic stand-in for ChatAnthropic. Per query it replays `recordings[query]`
+        (a list of turns: {"tool_calls": [...]} or {"content": "..."}) when present;
+        otherwise it scripts pairing_kb -> (search on NO_MATCH) -> final JSON answer.
+        """
+
+        recordings: Dict[str, List[Dict[str, Any]]] = {}
+        latency_s: float = 0.0
+        malformed_every: int = 0   # every Nth answer gets a trailing comma (exercises local repair)
+        calls: int = 0
+
+        @property
+        def _llm_type(self) -> str:
+            return "replay-fake"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            self.calls += 1
+            query = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+            turn = sum(1 for m in messages if isinstance(m, AIMessage) and m.tool_calls)
+            message = self._replay(query, turn) or self._script(query, messages, turn)
+            chars_in = sum(len(str(m.content)) for m in messages)
+            message.usage_metadata = {"input_tokens": chars_in // 4,
+                                      "output_tokens": len(str(message.content)) // 4 + 10,
+                                      "total_tokens": chars_in // 4 + len(str(message.content)) // 4 + 10}
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        def _replay(self, query: str, turn: int):
+            turns = self.recordings.get(query)
+            if not turns or turn >= len(turns):
+                return None
+            t = turns[turn]
+            return AIMessage(content=t.get("content", ""), tool_calls=[
+                {"name": c["name"], "args": c.get("args", {}), "id": c.get("id", f"call_{turn}_{i}")}
+                for i, c in enumerate(t.get("tool_calls", []))
+            ])
+
+        def _script(self, query: str, messages, turn: int):
+            tool_msgs = [m for m in messages if isinstance(m, ToolMessage)]
+            if turn == 0:
+                return AIMessage(content="", tool_calls=[
+                    {"name": "pairing_kb", "args": {"__arg1": query}, "id": "call_kb"}])
+            last = str(tool_msgs[-1].content) if tool_msgs else ""
+            if turn == 1 and last.startswith("NO_MATCH"):
+                return AIMessage(content="", tool_calls=[
+                    {"name": "search", "args": {"__arg1": f"site:scittinositalianmarketplace.com {query}"},
+                     "id": "call_search"}])
+            kb_obs = str(tool_msgs[0].content) if tool_msgs else ""
+            text = json.dumps(_kb_answer(query, kb_obs), ensure_ascii=False, indent=2)
+            if self.malformed_every and self.calls % self.malformed_every == 0:
+                text = text.replace("\n  ]", ",\n  ]", 1)
+            return AIMessage(content=text)
+
+    return ReplayChatModel
+
+
+def make_fake_llm(recordings: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                  latency_ms: float = 0.0, malformed_every: int = 0):
+    return _fake_model_class()(recordings=recordings or {}, latency_s=latency_ms / 1000,
+                               malformed_every=malformed_every)
+
+
+def make_offline_tools():
+    """Real pairing_kb plus canned `search` / `wikipedia` stand-ins."""
+    from langchain.tools import Tool
+    from tools import pairing_kb_tool
+    return [
+        pairing_kb_tool,
+        Tool(name="search", func=lambda q: CANNED_SEARCH,
+             description="Search the web for menu or drink details if the KB is insufficient."),
+        Tool(name="wikipedia", func=lambda q: CANNED_WIKI,
+             description="Look up general background on a food or drink."),
+    ]
+
+
+# ---------- pipeline ----------
+def run_one(executor, query: str, save_path: str) -> Dict[str, float]:
+    """One request through the real agent/parse/render/save path; returns ms per stage."""
+    from main import _render_menu_and_drinks, fix_output, parse_model_output
+    from tools import save_to_txt
+
+    t0 = time.perf_counter()
+    raw = executor.invoke({"query": query, "chat_history": []})
+    t1 = time.perf_counter()
+    model_text = fix_output(raw.get("output", ""))
+    result = parse_model_output(model_text)
+    t2 = time.perf_counter()
+    _render_menu_and_drinks(result.menu, result.drinks)
+    t3 = time.perf_counter()
+    save_to_txt(model_text, filename=save_path)
+    t4 = time.perf_counter()
+    return {"agent": (t1 - t0) * 1000, "parse": (t2 - t1) * 1000, "render": (t3 - t2) * 1000,
+            "save": (t4 - t3) * 1000, "total": (t4 - t0) * 1000}
+
+
+def run_bench(corpus: List[str], iterations: int = 5, latency_ms: float = 0.0,
+              recordings=None, malformed_every: int = 7, alloc: bool = True) -> Dict[str, Any]:
+    from main import build_agent_executor
+
+    llm = make_fake_llm(recordings, latency_ms, malformed_every)
+    executor = build_agent_executor(llm=llm, tools=make_offline_tools(), verbose=False)
+    samples: Dict[str, List[float]] = {}
+    errors = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        save_path = os.path.join(tmp, "pairings_output.txt")
+        run_one(executor, corpus[0], save_path)  # warm-up: imports, prompt formatting caches
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            for q in corpus:
+                try:
+                    for k, v in run_one(executor, q, save_path).items():
+                        samples.setdefault(k, []).append(v)
+                except Exception:
+                    errors += 1
+        wall = time.perf_counter() - started
+
+        allocs = None
+        if alloc:
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            for q in corpus:
+                try:
+                    run_one(executor, q, save_path)
+                except Exception:
+                    pass
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            top = after.compare_to(before, "filename")[:5]
+            allocs = {
+                "peak_kb": round(peak / 1024, 1),
+                "per_request_kb": round(sum(s.size_diff for s in after.compare_to(before, "filename")
+                                            if s.size_diff > 0) / 1024 / len(corpus), 1),
+                "top": [f"{s.traceback[0].filename}: {s.size_diff / 1024:+.1f} KiB" for s in top],
+            }
+
+    n = iterations * len(corpus)
+    return {
+        "requests": n,
+        "errors": errors,
+        "throughput_rps": round((n - errors) / wall, 1) if wall else 0.0,
+        "model_calls": llm.calls,
+        "latency_ms": {k: {"p50": round(percentile(v, 50), 3), "p95": round(percentile(v, 95), 3),
+                           "p99": round(percentile(v, 99), 3)} for k, v in samples.items()},
+        "allocations": allocs,
+    }
+
+
+def _report(res: Dict[str, Any]) -> str:
+    lines = [f"{res['requests']} requests, {res['errors']} errors, {res['throughput_rps']} req/s, "
+             f"{res['model_calls']} fake model calls",
+             f"{'stage':<8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for k in ("agent", "parse", "render", "save", "total"):
+        if k in res["latency_ms"]:
+            v = res["latency_ms"][k]
+            lines.append(f"{k:<8} {v['p50']:>9.2f} {v['p95']:>9.2f} {v['p99']:>9.2f}")
+    if res.get("allocations"):
+        a = res["allocations"]
+        lines.append(f"allocations: peak {a['peak_kb']} KiB, ~{a['per_request_kb']} KiB retained/request")
+        lines += [f"  {t}" for t in a["top"]]
+    return "\n".join(lines)
+
+
+def _load_corpus(path: Optional[str]) -> List[str]:
+    if not path:
+        return list(DEFAULT_CORPUS)
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                row = json.loads(line)
+                out.append(row.get("query") or row.get("event") or "")
+            else:
+                out.append(line)
+    return [q for q in out if q]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline benchmark of the pairing pipeline (fake LLM).")
+    ap.add_argument("--corpus", help="queries file (one per line, or JSONL with query/event)")
+    ap.add_argument("--iterations", type=int, default=5)
+    ap.add_argument("--model-latency-ms", type=float, default=0.0, help="simulated model latency per call")
+    ap.add_argument("--recordings", help="JSON {query: [turns...]} of recorded model turns to replay")
+    ap.add_argument("--malformed-every", type=int, default=7, help="every Nth answer is slightly broken JSON")
+    ap.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    ap.add_argument("--json", dest="json_out", help="write results as JSON here")
+    ap.add_argument("--baseline", help="earlier --json result to compare against")
+    ap.add_argument("--max-regression", type=float, default=0.2, help="allowed p50 total slowdown (0.2 = 20%%)")
+    args = ap.parse_args(argv)
+
+    recordings = None
+    if args.recordings:
+        with open(args.recordings, encoding="utf-8") as f:
+            recordings = json.load(f)
+
+    res = run_bench(_load_corpus(args.corpus), args.iterations, args.model_latency_ms,
+                    recordings, args.malformed_every, alloc=not args.no_alloc)
+    print(_report(res))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)
+        old, new = base["latency_ms"]["total"]["p50"], res["latency_ms"]["total"]["p50"]
+        change = (new - old) / old if old else 0.0
+        print(f"p50 total: {old:.2f} ms -> {new:.2f} ms ({change:+.0%})")
+        if change > args.max_regression:
+            print("REGRESSION: over the allowed slowdown")
+            return 1
+    return 1 if res["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
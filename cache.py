@@ -0,0 +1,155 @@
+# cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set
+
+DEFAULT_TTL = 7 * 24 * 3600  # a week; prompt/KB edits invalidate sooner via the row tag
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def fingerprint(*parts) -> str:
+    """Stable short hash of prompts / KB data; anything JSON-serializable."""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8") if isinstance(p, str) else json.dumps(p, sort_keys=True).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+class DiskCache:
+    """
+    Small SQLite key/value store with TTL expiry and LRU eviction.
+    Values are text (we store validated PairingResponse JSON). Each row carries a
+    'tag' (the prompt fingerprint) so a prompt edit drops stale rows, and optionally the
+    names it depends on (KB presets) so one edited preset only drops the rows built on it.
+    """
+
+    def __init__(self, path: str = "pairings_cache.sqlite3", table: str = "responses",
+                 ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "writes": 0,
+                                  "invalidated": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, tag TEXT, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed)")
+        # older files predate per-row dependencies
+        if "deps" not in {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN deps TEXT")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, key: str, value: str, tag: Optional[str] = None, deps: Iterable[str] = ()) -> None:
+        """`deps`: names the value was built from; drop_deps() on any of them removes the row."""
+        now = time.time()
+        deps = "|" + "|".join(deps) + "|" if deps else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, tag, created, accessed, deps) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, tag, now, now, deps),
+            )
+            self.stats["writes"] += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        over = count - self.max_entries
+        if over > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed ASC LIMIT ?)",
+                (over,),
+            )
+            self.stats["evicted"] += over
+
+    def drop_stale(self, tag: str) -> int:
+        """Delete every row written under a different tag (old prompt / KB)."""
+        with self._lock:
+            cur = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE tag IS NOT ?", (tag,)
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def dependencies(self) -> Set[str]:
+        """Every dependency name some row was written with."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT DISTINCT deps FROM {self.table} WHERE deps IS NOT NULL").fetchall()
+        return {d for (deps,) in rows for d in deps.strip("|").split("|") if d}
+
+    def drop_deps(self, deps: Iterable[str]) -> int:
+        """Delete the rows that depend on any of `deps` (one edited preset, not the whole cache)."""
+        dropped = 0
+        with self._lock:
+            for d in deps:
+                cur = self._conn.execute(f"DELETE FROM {self.table} WHERE instr(deps, ?) > 0", (f"|{d}|",))
+                dropped += cur.rowcount
+            self._conn.commit()
+        self.stats["invalidated"] += dropped
+        return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def summary(self, label: str = "cache") -> str:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = (self.stats["hits"] / lookups * 100) if lookups else 0.0
+        return (f"{label}: {len(self)} entries, {self.stats['hits']} hits / {self.stats['misses']} misses "
+                f"({rate:.0f}% hit rate), {self.stats['evicted']} evicted, {self.stats['expired']} expired")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def response_cache_key(parsed, model: str, prompt_fp: str) -> str:
+    """
+    Key for a parsed query (see query.parse_query) under a given model + prompt/KB fingerprint.
+    Headcount is left out: quantities are computed locally, so the menu is shared across sizes.
+    """
+    payload = {
+        "event": parsed.event,
+        "audience": parsed.audience,
+        "constraints": sorted(parsed.constraints),
+        "model": model,
+        "fp": prompt_fp,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
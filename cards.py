@@ -0,0 +1,294 @@
+# cards.py
+"""
+Bulk printable pairing cards: plain text, HTML or paginated PDF, streamed to disk one
+card at a time so a few thousand cards render in seconds with flat memory.
+
+    python cards.py pairings.jsonl -o cards.pdf          # batch.py output -> one card per page
+    python cards.py pairings.jsonl -o cards.html --width 72
+
+Normalization is a single str.translate (NFKC only for the rare leftovers), and wrapped
+bullets are memoized, since the same KB items show up on most cards. The PDF writer is
+hand-rolled (core Helvetica, Flate-compressed pages), so nothing extra needs installing.
+"""
+import argparse
+import html
+import sys
+import textwrap
+import time
+import unicodedata
+import zlib
+from functools import lru_cache
+from typing import IO, Iterable, Iterator, List, Tuple
+
+from snapshot import prerendered
+
+DEFAULT_WIDTH = 90
+
+# ---------- text helpers ----------
+_ASCII_PUNCT = str.maketrans({
+    "“": '"', "”": '"', "‘": "'", "’": "'",
+    "–": "-", "—": "-", "−": "-",
+    "…": "...", " ": " ",
+})
+
+
+def normalize_text(s: str) -> str:
+    """Smart quotes/dashes -> ASCII so widths render predictably."""
+    if not isinstance(s, str) or s.isascii():
+        return s
+    s = s.translate(_ASCII_PUNCT)
+    return s if s.isascii() else unicodedata.normalize("NFKC", s)
+
+
+@lru_cache(maxsize=8192)
+def wrap_bullet(item: str, width: int) -> Tuple[str, ...]:
+    """'• item' wrapped to width with a hanging indent; cached per (item, width)."""
+    return tuple(textwrap.wrap(normalize_text(item), width=width, initial_indent="  • ",
+                               subsequent_indent="    ", break_on_hyphens=False)) or ("  • —",)
+
+
+@lru_cache(maxsize=1024)
+def _wrap_para(text: str, width: int) -> Tuple[str, ...]:
+    return tuple(textwrap.wrap(normalize_text(text), width=width, initial_indent="  ",
+                               subsequent_indent="  "))
+
+
+SECTIONS = (
+    ("Appetizers", "menu", "appetizers"),
+    ("Mains", "menu", "mains"),
+    ("Sides", "menu", "sides"),
+    ("Desserts", "menu", "desserts"),
+    ("Drinks (Alcoholic)", "drinks", "alcoholic"),
+    ("Drinks (Non-Alcoholic)", "drinks", "non_alcoholic"),
+)
+
+
+def card_sections(result) -> Iterator[Tuple[str, List[str]]]:
+    for label, group, key in SECTIONS:
+        items = getattr(getattr(result, group), key)
+        if items:
+            yield label, items
+
+
+def card_lines(result, width: int = DEFAULT_WIDTH) -> List[str]:
+    """One card as lines of plain text; the layout every target shares."""
+    pre = prerendered(result)
+    if pre is not None and width == DEFAULT_WIDTH:
+        return list(pre.card)
+    q = getattr(result, "quote", None)   # only a QuotedPairing has one
+    title = normalize_text(result.event).upper()
+    lines = [f"SCITTINO'S PAIRING CARD: {title}", "=" * min(width, len(title) + 25)]
+    meta = [("Audience", result.audience), ("Constraints", ", ".join(result.constraints)),
+            ("Guests", str(q.headcount) if q else "")]
+    lines += [f"{k:<12}: {normalize_text(v)}" for k, v in meta if v]
+    for label, items in card_sections(result):
+        lines.append("")
+        lines.append(label)
+        for item in items:
+            lines.extend(wrap_bullet(item, width))
+    if result.rationale:
+        lines += ["", "Why this works"]
+        lines.extend(_wrap_para(result.rationale.strip(), width))
+    if q:
+        lines += ["", f"Quote: {q.headcount} guests, ${q.total:,.2f} (${q.per_guest:,.2f}/guest)"]
+    if result.sources:
+        lines += ["", "Sources: " + normalize_text("; ".join(result.sources))]
+    return lines
+
+
+# ---------- writers ----------
+class TextCardWriter:
+    def __init__(self, out: IO[str], width: int = DEFAULT_WIDTH):
+        self.out = out
+        self.width = width
+        self.count = 0
+
+    def write(self, result) -> None:
+        if self.count:
+            self.out.write("\f\n")  # form feed: printers start each card on a new page
+        self.out.write("\n".join(card_lines(result, self.width)) + "\n")
+        self.count += 1
+
+    def close(self) -> None:
+        self.out.flush()
+
+
+_HTML_HEAD = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Scittino’s pairing cards</title>
+<style>
+body { font-family: Georgia, serif; margin: 0; }
+.card { padding: 1.5em 2em; page-break-after: always; break-after: page; }
+.card h1 { font-size: 1.4em; border-bottom: 2px solid #7a1f1f; }
+.card h2 { font-size: 1em; margin: .8em 0 .2em; }
+.card ul { margin: 0; padding-left: 1.2em; }
+.meta, .src { color: #555; font-size: .9em; }
+</style></head><body>
+"""
+
+
+class HtmlCardWriter:
+    def __init__(self, out: IO[str], width: int = DEFAULT_WIDTH):
+        self.out = out
+        self.count = 0
+        out.write(_HTML_HEAD)
+
+    def write(self, result) -> None:
+        e = html.escape
+        q = getattr(result, "quote", None)
+        parts = [f'<article class="card"><h1>{e(result.event.title())}</h1>']
+        meta = [v for v in (result.audience, ", ".join(result.constraints),
+                            f"{q.headcount} guests" if q else "") if v]
+        if meta:
+            parts.append(f'<p class="meta">{e(" · ".join(meta))}</p>')
+        for label, items in card_sections(result):
+            parts.append(f"<h2>{e(label)}</h2><ul>" + "".join(f"<li>{e(i)}</li>" for i in items) + "</ul>")
+        if result.rationale:
+            parts.append(f"<h2>Why this works</h2><p>{e(result.rationale.strip())}</p>")
+        if q:
+            parts.append(f"<p><strong>Quote:</strong> {q.headcount} guests, ${q.total:,.2f} "
+                         f"(${q.per_guest:,.2f}/guest)</p>")
+        if result.sources:
+            parts.append(f'<p class="src">Sources: {e("; ".join(result.sources))}</p>')
+        parts.append("</article>\n")
+        self.out.write("".join(parts))
+        self.count += 1
+
+    def close(self) -> None:
+        self.out.write("</body></html>\n")
+        self.out.flush()
+
+
+def _pdf_escape(line: str) -> bytes:
+    raw = line.encode("cp1252", "replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class PdfCardWriter:
+    """
+    Minimal streaming PDF: objects are written as pages fill, only their byte offsets
+    are kept, and the page tree / xref go at the end. Letter size, Helvetica 10/13.
+    """
+    PAGE_W, PAGE_H, MARGIN = 612, 792, 54
+    FONT_SIZE, LEADING = 10, 13
+    _PAGES_ID, _FONT_ID, _BOLD_ID = 1, 2, 3
+
+    def __init__(self, out: IO[bytes], width: int = DEFAULT_WIDTH):
+        self.out = out
+        self.width = width
+        self.count = 0
+        self.offsets: List[int] = []   # offsets[id - 1]
+        self.page_ids: List[int] = []
+        self.lines_per_page = (self.PAGE_H - 2 * self.MARGIN) // self.LEADING
+        self._pos = 0
+        self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets += [0, 0, 0]  # pages tree is written last; fonts now
+        self._obj(self._FONT_ID, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                                 b"/Encoding /WinAnsiEncoding >>")
+        self._obj(self._BOLD_ID, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold "
+                                 b"/Encoding /WinAnsiEncoding >>")
+
+    def _emit(self, data: bytes) -> None:
+        self.out.write(data)
+        self._pos += len(data)
+
+    def _new_id(self) -> int:
+        self.offsets.append(0)
+        return len(self.offsets)
+
+    def _obj(self, oid: int, body: bytes) -> None:
+        self.offsets[oid - 1] = self._pos
+        self._emit(b"%d 0 obj\n" % oid + body + b"\nendobj\n")
+
+    def _page(self, lines: List[str], first: bool) -> None:
+        y = self.PAGE_H - self.MARGIN
+        ops = [b"BT /F1 %d Tf %d TL %d %d Td" % (self.FONT_SIZE, self.LEADING, self.MARGIN, y)]
+        for i, line in enumerate(lines):
+            if first and i == 0:
+                ops.append(b"/F2 12 Tf (%s) Tj /F1 %d Tf T*" % (_pdf_escape(line), self.FONT_SIZE))
+            else:
+                ops.append(b"(%s) Tj T*" % _pdf_escape(line))
+        ops.append(b"ET")
+        data = zlib.compress(b"\n".join(ops))
+        content_id = self._new_id()
+        self._obj(content_id, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data)
+                  + data + b"\nendstream")
+        page_id = self._new_id()
+        self._obj(page_id, b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+                           b"/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> /Contents %d 0 R >>"
+                  % (self._PAGES_ID, self.PAGE_W, self.PAGE_H, self._FONT_ID, self._BOLD_ID, content_id))
+        self.page_ids.append(page_id)
+
+    def write(self, result) -> None:
+        lines = card_lines(result, self.width)
+        n = self.lines_per_page
+        for start in range(0, len(lines), n):
+            self._page(lines[start:start + n], first=start == 0)
+        self.count += 1
+
+    def close(self) -> None:
+        kids = b" ".join(b"%d 0 R" % pid for pid in self.page_ids)
+        self._obj(self._PAGES_ID, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)))
+        catalog_id = self._new_id()
+        self._obj(catalog_id, b"<< /Type /Catalog /Pages %d 0 R >>" % self._PAGES_ID)
+        xref = self._pos
+        rows = [b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.offsets) + 1)]
+        rows += [b"%010d 00000 n \n" % off for off in self.offsets]
+        self._emit(b"".join(rows))
+        self._emit(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                   % (len(self.offsets) + 1, catalog_id, xref))
+        self.out.flush()
+
+
+WRITERS = {"text": TextCardWriter, "html": HtmlCardWriter, "pdf": PdfCardWriter}
+
+
+def format_for(path: str) -> str:
+    lower = path.lower()
+    if lower.endswith(".pdf"):
+        return "pdf"
+    if lower.endswith((".html", ".htm")):
+        return "html"
+    return "text"
+
+
+def render_cards(results: Iterable, path: str, fmt: str = None, width: int = DEFAULT_WIDTH) -> int:
+    """Stream every PairingResponse in `results` to `path` as cards; returns the card count."""
+    fmt = fmt or format_for(path)
+    mode = "wb" if fmt == "pdf" else "w"
+    with open(path, mode, **({} if fmt == "pdf" else {"encoding": "utf-8"})) as out:
+        writer = WRITERS[fmt](out, width)
+        for result in results:
+            writer.write(result)
+        writer.close()
+        return writer.count
+
+
+def read_jsonl(path: str) -> Iterator:
+    """PairingResponse per line of a JSONL file (e.g. batch.py output), lazily."""
+    from schema import QuotedPairing
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line in f:
+            if line.strip():
+                yield QuotedPairing.model_validate_json(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Render PairingResponse JSONL as printable cards.")
+    ap.add_argument("input", help="PairingResponse JSONL (batch.py output), or - for stdin")
+    ap.add_argument("-o", "--output", default="pairing_cards.pdf")
+    ap.add_argument("--format", choices=sorted(WRITERS), help="default: from the output extension")
+    ap.add_argument("--width", type=int, default=DEFAULT_WIDTH, help="wrap width in characters")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    n = render_cards(read_jsonl(args.input), args.output, args.format, args.width)
+    print(f"{n} cards -> {args.output} in {time.perf_counter() - t0:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+# composer.py
+# Local "Scittino’s-inspired custom plan" for events without a preset ("baby shower brunch").
+# Every item in the KB becomes a TF-IDF document (its name plus the course, tags, notes,
+# names and synonyms of the presets it appears in), event words are expanded through a
+# small concept lexicon onto that vocabulary, and course-balancing rules pick 3–6
+# distinct items per section. Deterministic and model-free; an event with words it has
+# never seen still goes to the agent.
+import re
+import sys
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from diet import forbidden_attributes, _pick
+from kb import KBStore, _tokens, current_store, normalize_event, on_reload
+
+CUSTOM_SOURCE = "Scittino’s-inspired custom plan"
+
+MIN_PER_SECTION, MAX_PER_SECTION = 3, 6
+MAX_COFFEE = 2          # espresso drinks share the non-alcoholic list
+MIN_SCORE = 0.12        # best item must clear this, or the event isn't really understood
+KEEP_RATIO = 0.45       # past the minimum, an item needs this share of its section's best score
+DUP_SIMILARITY = 0.5    # name cosine above this = same dish twice ("Cannoli" / "Mini cannoli")
+PRESET_WEIGHT = 0.35    # boost for items of presets the event loosely resembles
+CONCEPT_WEIGHT = 0.5
+
+# field weights inside an item document
+_NAME_W, _COURSE_W, _TAG_W, _PRESET_W, _NOTES_W = 3.0, 1.0, 1.0, 1.0, 0.5
+
+FOOD_SECTIONS = ("appetizers", "mains", "sides", "desserts")
+DRINK_SECTIONS = ("alcoholic", "non_alcoholic")
+
+# event phrase -> KB words it implies (words outside the KB vocabulary are ignored)
+CONCEPTS: Dict[str, str] = {
+    "brunch": "brunch breakfast coffee pastry bakery cappuccino latte fruit caprese salad prosecco",
+    "breakfast": "breakfast coffee pastry bakery cappuccino latte espresso fruit",
+    "baby shower": "bakery pastry fruit platter caprese salad cupcake cookie lemonade sparkling tea",
+    "bridal shower": "elegant bakery pastry platter caprese salad prosecco moscato sparkling fruit",
+    "shower": "bakery pastry platter salad fruit sparkling",
+    "wedding": "elegant platter antipasto prosciutto burrata prosecco moscato cannoli cake",
+    "rehearsal": "elegant dinner family style lasagna chianti",
+    "engagement": "elegant prosecco burrata antipasto cannoli cake",
+    "anniversary": "anniversary elegant romantic date prosecco tiramisu",
+    "retirement": "catering platter office sandwich antipasto cake cookie",
+    "graduation": "catering platter shareable sandwich pasta tray cake cookie soda",
+    "open house": "catering platter shareable tray cookie soda",
+    "christening": "family platter antipasto tray cake cookie",
+    "baptism": "family platter antipasto tray cake cookie",
+    "communion": "family platter antipasto tray cake cookie",
+    "repast": "family comfort platter sandwich pasta tray cookie coffee",
+    "memorial": "family comfort platter sandwich pasta tray cookie coffee",
+    "funeral": "family comfort platter sandwich pasta tray cookie coffee",
+    "reunion": "family style shareable pasta tray platter",
+    "picnic": "sandwich sub cold cut salad chip fruit lemonade iced tea",
+    "potluck": "shareable tray pasta salad family",
+    "cookout": "cookout grill bbq sausage burger chicken",
+    "book club": "antipasto platter cheese wine cookie biscotti coffee",
+    "wine tasting": "chianti barbera sangiovese pinot noir antipasto cheese prosciutto",
+    "wine": "chianti barbera sangiovese red prosecco",
+    "poker": "casual shareable sandwich slider wing chip",
+    "card": "casual shareable sandwich slider wing chip",
+    "halloween": "casual kid friendly pizza cookie brownie",
+    "new year": "holiday prosecco antipasto platter",
+    "christmas eve": "christma holiday family style dinner shrimp calamari salmon antipasto panettone cuccidati",
+    "christmas": "christma holiday family style antipasto panettone cuccidati cookie",
+    "hanukkah": "holiday family platter cookie",
+    "easter": "easter holiday family lasagna antipasto",
+    "thanksgiving": "thanksgiving holiday family comfort",
+    "valentine": "valentine romantic date elegant",
+    "mother": "brunch elegant family",
+    "father": "grill butcher sausage family",
+    "pool": "casual sandwich sub salad fruit lemonade iced tea",
+    "beach": "casual sandwich sub salad fruit lemonade",
+    "housewarming": "shareable platter antipasto cookie",
+    "happy hour": "antipasto platter lager pilsner prosecco",
+    "cocktail": "antipasto platter skewer prosecco elegant",
+    "fundraiser": "catering platter tray shareable",
+    "church": "family catering tray platter",
+    "team": "team catering office",
+    "sleepover": "kid pizza cookie brownie",
+    "teen": "kid pizza sub sandwich soda",
+    "vegetarian": "veg veggie eggplant caprese",
+    "seafood": "shrimp calamari salmon",
+    "sweet": "dessert bakery pastry cookie",
+    "dessert": "dessert bakery pastry",
+}
+
+# words that dress up a dish name without changing the dish ("Assorted cookies" = "Cookie tray")
+_FILLER = frozenset(_tokens(
+    "assorted assortment tray trays platter platters mini house homemade scittino’s classic gourmet "
+    "fresh or mix"
+))
+_PAREN_RE = re.compile(r"\(.*?\)")
+
+# words that name the occasion, not what to serve
+GENERIC = frozenset(_tokens(
+    "night evening morning afternoon day weekend celebration celebrate gathering get together "
+    "feast open house eve lunch dinner supper get-together social bash do shindig small big "
+    "large fun special"
+))
+
+
+class ComposedPlan(NamedTuple):
+    event: str
+    food: Dict[str, List[str]]
+    drinks: Dict[str, List[str]]
+    matched: List[str]                  # event words / concepts the plan was built from
+    closest: List[str]                  # presets the event loosely resembles
+    swapped: List[Tuple[str, str]]      # diet swaps (original, variant served)
+
+
+# ---------- index ----------
+class ItemIndex:
+    """TF-IDF vectors for every distinct KB item, built once per KB snapshot."""
+
+    def __init__(self, store: KBStore):
+        docs: Dict[str, Dict[str, float]] = {}
+        self.sections: Dict[str, set] = {}
+        self.presets_of: Dict[str, set] = {}
+        self.dish: Dict[str, FrozenSet[str]] = {}   # normalized name, for near-duplicate checks
+        self.pool: Dict[str, str] = {}              # "Add-ons: meatballs, ..." -> "add on"
+
+        def add(doc: Dict[str, float], text: str, weight: float):
+            for tok in _tokens(text.replace("-", " ").replace("_", " ")):
+                doc[tok] = doc.get(tok, 0.0) + weight
+
+        for key, data in store.presets.items():
+            context = [(t, _TAG_W) for t in data.get("tags", [])]
+            context += [(key, _PRESET_W)] + [(s, _PRESET_W) for s in store.synonyms.get(key, [])]
+            context += [(data.get("notes") or "", _NOTES_W)]
+            for group in ("food", "drinks"):
+                for section, entries in data.get(group, {}).items():
+                    for item in entries:
+                        doc = docs.setdefault(item, {})
+                        if item not in self.sections:
+                            add(doc, item, _NAME_W)
+                            self.dish[item] = dish_key(item)
+                            label, sep, _ = item.partition(":")
+                            if sep:
+                                self.pool[item] = " ".join(_tokens(label))
+                        self.sections.setdefault(item, set()).add(section)
+                        self.presets_of.setdefault(item, set()).add(key)
+                        add(doc, section, _COURSE_W)
+                        for text, w in context:
+                            add(doc, text, w)
+
+        self.items: List[str] = sorted(docs)
+        self.row = {item: i for i, item in enumerate(self.items)}
+        self.vocab: Dict[str, int] = {t: j for j, t in enumerate(sorted({t for d in docs.values() for t in d}))}
+        tf = np.zeros((len(self.items), len(self.vocab)))
+        names = np.zeros_like(tf)
+        for item, doc in docs.items():
+            for tok, w in doc.items():
+                tf[self.row[item], self.vocab[tok]] = w
+            for tok in _tokens(item):
+                names[self.row[item], self.vocab[tok]] = 1.0
+        df = np.count_nonzero(tf, axis=0)
+        self.idf = np.log((1 + len(self.items)) / (1 + df)) + 1.0
+        self.matrix = _l2_rows(np.log1p(tf) * self.idf)
+        self.names = _l2_rows(names * self.idf)
+        self.concepts: Dict[str, List[str]] = {
+            phrase: [t for t in _tokens(words) if t in self.vocab] for phrase, words in CONCEPTS.items()
+        }
+
+    def query_vector(self, event: str) -> Tuple[Optional[np.ndarray], List[str]]:
+        """(unit query vector, matched words); vector is None if any content word is unknown."""
+        text = normalize_event(event)
+        weights: Dict[str, float] = {}
+        matched: List[str] = []
+        for phrase, terms in self.concepts.items():
+            if " " in phrase and re.search(rf"\b{phrase}\b", text):
+                text = re.sub(rf"\b{phrase}\b", " ", text)
+                matched.append(phrase)
+                for t in terms:
+                    weights[t] = weights.get(t, 0.0) + CONCEPT_WEIGHT
+        for tok in _tokens(text):
+            if tok in GENERIC:
+                continue
+            known = False
+            if tok in self.vocab:
+                weights[tok] = weights.get(tok, 0.0) + 1.0
+                known = True
+            for t in self.concepts.get(tok, ()):
+                weights[t] = weights.get(t, 0.0) + CONCEPT_WEIGHT
+                known = True
+            if not known:
+                return None, matched
+            matched.append(tok)
+        if not weights:
+            return None, matched
+        vec = np.zeros(len(self.vocab))
+        for tok, w in weights.items():
+            vec[self.vocab[tok]] = w * self.idf[self.vocab[tok]]
+        return vec / np.linalg.norm(vec), list(dict.fromkeys(matched))
+
+
+def dish_key(item: str) -> FrozenSet[str]:
+    """'Assorted biscotti & cookies' -> {'biscotti', 'cookie'}: stemmed name words, no filler or (details)."""
+    return frozenset(t for t in _tokens(_PAREN_RE.sub(" ", item)) if t not in _FILLER)
+
+
+def _same_dish(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    # "House salad" / "Caesar or house salad": one name is the other plus qualifiers
+    return bool(a and b) and (a <= b or b <= a)
+
+
+def _l2_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms == 0, 1.0, norms)
+
+
+@lru_cache(maxsize=2)
+def get_index(store: KBStore) -> ItemIndex:
+    return ItemIndex(store)
+
+
+@on_reload
+def _rebuild_index(old: KBStore, new: KBStore, diff) -> None:
+    # IDF weights span the whole KB, so an edit means a new matrix; build it here (reload
+    # thread), not on the next request. Requests pinned to `old` still have theirs.
+    if get_index.cache_info().currsize:
+        get_index(new)
+
+
+# ---------- composition ----------
+def _is_coffee(index: ItemIndex, item: str) -> bool:
+    return index.sections[item] == {"coffee"}
+
+
+def _candidates(index: ItemIndex, section: str) -> List[str]:
+    """Items served in `section`; a named pool ("Add-ons: ...") only if it is named for that course."""
+    wanted = {"non_alcoholic", "coffee"} if section == "non_alcoholic" else {section}
+    course = set(_tokens(section.replace("_", " ")))
+    return [item for item in index.items if index.sections[item] & wanted
+            and (item not in index.pool or course <= set(index.pool[item].split()))]
+
+
+def _balance(index: ItemIndex, candidates: Sequence[str], scores: np.ndarray, forbidden: FrozenSet[str],
+             store: KBStore, taken: List[str], swapped: List[Tuple[str, str]]) -> List[str]:
+    """
+    Best-scoring distinct items of one section, MIN..MAX of them, diet-checked. Ties (and
+    sections the event says nothing about) go to the items most presets serve. `taken`
+    holds the KB items already on the plan, so no dish shows up in two sections; within
+    the section, names that reduce to the same dish (dish_key) are skipped too.
+    """
+    ranked = sorted(candidates, key=lambda i: (-round(float(scores[index.row[i]]), 6),
+                                               -len(index.presets_of[i]), i))
+    best = scores[index.row[ranked[0]]] if ranked else 0.0
+    chosen: List[str] = []   # KB item names in this section
+    served: List[str] = []   # what goes on the menu (diet variant if swapped)
+    coffee = 0
+    for item in ranked:
+        if len(chosen) >= MAX_PER_SECTION:
+            break
+        if len(chosen) >= MIN_PER_SECTION and scores[index.row[item]] < best * KEEP_RATIO:
+            break
+        picked = _pick(item, forbidden, store)
+        if not isinstance(picked, str):
+            continue  # ruled out by the constraints, or no attributes on file
+        if _is_coffee(index, item) and coffee >= MAX_COFFEE:
+            continue
+        name_vec = index.names[index.row[item]]
+        if any(float(name_vec @ index.names[index.row[c]]) > DUP_SIMILARITY for c in taken):
+            continue
+        if any(_same_dish(index.dish[item], index.dish[c]) for c in chosen):
+            continue
+        if picked in served:
+            continue
+        chosen.append(item)
+        taken.append(item)
+        served.append(picked)
+        coffee += _is_coffee(index, item)
+        if picked != item:
+            swapped.append((item, picked))
+    return served
+
+
+def compose(event: str, constraints: Iterable[str] = (), audience: Optional[str] = None,
+            store: Optional[KBStore] = None) -> Optional[ComposedPlan]:
+    """3–6 items per section for an unseen event from KB items; None means ask the agent."""
+    store = store or current_store()
+    forbidden = forbidden_attributes(constraints, audience)
+    if forbidden is None:
+        return None  # budget asks etc. need the model
+    index = get_index(store)
+    terms = event if audience != "kids" else f"{event} kid"
+    qvec, matched = index.query_vector(terms)
+    if qvec is None:
+        return None
+
+    scores = index.matrix @ qvec
+    closest = [k for k, s in store.lookup.rank(event, limit=3) if s >= 0.25]
+    if closest:
+        boost = np.zeros(len(index.items))
+        for rank, key in enumerate(closest):
+            w = PRESET_WEIGHT / (rank + 1)
+            for group in ("food", "drinks"):
+                for entries in store.presets[key].get(group, {}).values():
+                    for item in entries:
+                        boost[index.row[item]] = max(boost[index.row[item]], w)
+        scores = scores + boost
+    if float(scores.max(initial=0.0)) < MIN_SCORE:
+        return None
+
+    taken: List[str] = []
+    swapped: List[Tuple[str, str]] = []
+
+    def section(name: str) -> List[str]:
+        return _balance(index, _candidates(index, name), scores, forbidden, store, taken, swapped)
+
+    food = {s: section(s) for s in FOOD_SECTIONS}
+    if any(len(v) < MIN_PER_SECTION for v in food.values()):
+        return None
+    drinks = {"alcoholic": [] if "alcohol" in forbidden else section("alcoholic"),
+              "non_alcoholic": section("non_alcoholic")}
+    if not drinks["non_alcoholic"]:
+        return None
+    return ComposedPlan(normalize_event(event), food, drinks, matched, closest, swapped)
+
+
+def main(argv=None):
+    import argparse
+    from query import parse_query, strip_audience
+
+    ap = argparse.ArgumentParser(description="Compose a plan from KB items for an event with no preset.")
+    ap.add_argument("event", help='e.g. "baby shower brunch, vegetarian"')
+    args = ap.parse_args(argv)
+    parsed = parse_query(args.event)
+    plan = compose(strip_audience(parsed.event), parsed.constraints, parsed.audience)
+    if plan is None:
+        print("No confident local plan; this one goes to the agent.")
+        return 1
+    print(f"{plan.event}  (from: {', '.join(plan.matched)}; closest presets: {', '.join(plan.closest) or '—'})")
+    for section, items in list(plan.food.items()) + list(plan.drinks.items()):
+        print(f"\n{section}")
+        for item in items:
+            print(f"  • {item}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
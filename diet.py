@@ -0,0 +1,107 @@
+# diet.py
+# Deterministic dietary / audience filter over KB presets. "pizza night, vegetarian" is the
+# pizza night preset with the meat items dropped (or swapped for a lighter variant from
+# kb.json), so it doesn't need the model. Anything the filter can't vouch for (unknown
+# items, budget asks, a menu that ends up too thin) returns None and goes to the agent.
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from kb import KBStore, current_store
+
+_ANIMAL = frozenset({"meat", "pork", "poultry", "fish", "shellfish"})
+
+# constraint -> item attributes it rules out
+FORBIDDEN: Dict[str, FrozenSet[str]] = {
+    "vegetarian": _ANIMAL,
+    "vegan": _ANIMAL | {"dairy", "egg"},
+    "nut-free": frozenset({"nuts"}),
+    "gluten-free": frozenset({"gluten"}),
+    "dairy-free": frozenset({"dairy"}),
+    # the butcher counter isn't certified, so only fish / vegetarian proteins qualify
+    "halal": frozenset({"meat", "pork", "poultry", "alcohol"}),
+    "kosher": frozenset({"meat", "pork", "poultry", "shellfish"}),
+    "non-alcoholic": frozenset({"alcohol"}),
+}
+# audiences that never get alcohol, whatever they asked for
+NO_ALCOHOL_AUDIENCES = frozenset({"kids"})
+
+MIN_FOOD_ITEMS = 3
+
+
+class FilteredPreset(NamedTuple):
+    food: Dict[str, List[str]]
+    drinks: Dict[str, List[str]]
+    removed: List[str]
+    swapped: List[Tuple[str, str]]   # (original item, variant served instead)
+
+
+def forbidden_attributes(constraints: Iterable[str], audience: Optional[str] = None) -> Optional[FrozenSet[str]]:
+    """Union of ruled-out attributes; None if a constraint isn't one we can enforce locally."""
+    out = set()
+    for c in constraints:
+        if c not in FORBIDDEN:
+            return None
+        out |= FORBIDDEN[c]
+    if audience in NO_ALCOHOL_AUDIENCES:
+        out.add("alcohol")
+    return frozenset(out)
+
+
+_UNKNOWN = object()
+
+
+def _pick(item: str, forbidden: FrozenSet[str], store: KBStore):
+    """The item itself, its first allowed variant, None if neither fits, _UNKNOWN if unlisted."""
+    info = store.items.get(item)
+    if info is None:
+        return _UNKNOWN
+    if not (info.has & forbidden):
+        return item
+    for name, has in info.variants:
+        if not (has & forbidden):
+            return name
+    return None
+
+
+def _filter_section(section: Dict[str, List[str]], forbidden, store, removed, swapped):
+    out: Dict[str, List[str]] = {}
+    for course, items in section.items():
+        kept: List[str] = []
+        for item in items:
+            picked = _pick(item, forbidden, store)
+            if picked is _UNKNOWN:
+                return None
+            if picked is None:
+                removed.append(item)
+            else:
+                if picked != item:
+                    swapped.append((item, picked))
+                if picked not in kept:
+                    kept.append(picked)
+        out[course] = kept
+    return out
+
+
+def filter_preset(key: str, constraints: Iterable[str], audience: Optional[str] = None,
+                  store: Optional[KBStore] = None) -> Optional[FilteredPreset]:
+    """Preset `key` with every item that breaks the constraints removed; None means escalate."""
+    store = store or current_store()
+    data = store.presets.get(key)
+    forbidden = forbidden_attributes(constraints, audience)
+    if data is None or forbidden is None:
+        return None
+
+    removed: List[str] = []
+    swapped: List[Tuple[str, str]] = []
+    food = _filter_section(data.get("food", {}), forbidden, store, removed, swapped)
+    drinks = _filter_section(data.get("drinks", {}), forbidden, store, removed, swapped)
+    if food is None or drinks is None:
+        return None
+
+    # still a real menu? mains survive (if the preset had any), enough food, something to drink
+    if data.get("food", {}).get("mains") and not food.get("mains"):
+        return None
+    if sum(len(v) for v in food.values()) < MIN_FOOD_ITEMS:
+        return None
+    if not (drinks.get("non_alcoholic") or drinks.get("coffee")):
+        return None
+    return FilteredPreset(food, drinks, removed, swapped)
@@ -0,0 +1,243 @@
+# history.py
+"""
+Saved pairings as validated PairingResponse records in SQLite, instead of an append-only
+text file. Rows carry timestamp, event, matched preset, audience, headcount and one row
+per constraint, all indexed, so "every kids birthday in the last 30 days" is an index scan.
+Cards for pairings_output.txt are rendered on export.
+
+    python history.py find --preset "kids birthday" --since 30d
+    python history.py find --constraint vegetarian --audience kids -n 20
+    python history.py export pairings_output.txt --since 2025-01-01
+    python history.py export todays_cards.pdf --since 1d
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Tuple
+
+HISTORY_PATH = os.getenv("PAIRINGS_HISTORY_DB", "pairings_history.sqlite3")
+DEFAULT_BATCH = 50
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS history ("
+    "id INTEGER PRIMARY KEY, ts REAL NOT NULL, event TEXT NOT NULL, preset TEXT, "
+    "audience TEXT, headcount INTEGER, query TEXT, response TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS history_constraints ("
+    "history_id INTEGER NOT NULL REFERENCES history(id) ON DELETE CASCADE, name TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS history_ts ON history(ts)",
+    "CREATE INDEX IF NOT EXISTS history_preset_ts ON history(preset, ts)",
+    "CREATE INDEX IF NOT EXISTS history_event_ts ON history(event, ts)",
+    "CREATE INDEX IF NOT EXISTS history_audience_ts ON history(audience, ts)",
+    "CREATE INDEX IF NOT EXISTS history_constraints_name ON history_constraints(name, history_id)",
+    # which rows already sit in which text card file, so overlapping exports don't repeat cards
+    "CREATE TABLE IF NOT EXISTS history_exports ("
+    "path TEXT NOT NULL, history_id INTEGER NOT NULL, PRIMARY KEY (path, history_id))",
+)
+
+
+def _preset_for(event: str) -> Optional[str]:
+    from kb import LOOKUP_MIN_SCORE, rank_pairings
+    ranked = rank_pairings(event, limit=1)
+    return ranked[0][0] if ranked and ranked[0][1] >= LOOKUP_MIN_SCORE else None
+
+
+class HistoryStore:
+    """
+    Writes are buffered and flushed in one transaction every `batch_size` records
+    (or on flush() / close() / leaving a `with` block).
+    """
+
+    def __init__(self, path: str = HISTORY_PATH, batch_size: int = DEFAULT_BATCH):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._pending: List[Tuple[float, Any, Optional[str]]] = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        for stmt in _SCHEMA:
+            self._conn.execute(stmt)
+        self._conn.commit()
+
+    # ---------- writes ----------
+    def add(self, result, query: Optional[str] = None, ts: Optional[float] = None) -> None:
+        with self._lock:
+            self._pending.append((ts or time.time(), result, query))
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def add_many(self, results: Iterable, queries: Optional[Iterable[Optional[str]]] = None) -> None:
+        now = time.time()
+        queries = list(queries) if queries is not None else None
+        with self._lock:
+            for i, result in enumerate(results):
+                self._pending.append((now, result, queries[i] if queries else None))
+            self._flush_locked()
+
+    def flush(self) -> int:
+        with self._lock:
+            return self._flush_locked()
+
+    def _flush_locked(self) -> int:
+        if not self._pending:
+            return 0
+        rows = self._pending
+        self._pending = []
+        with self._conn:  # one transaction per batch
+            for ts, result, query in rows:
+                cur = self._conn.execute(
+                    "INSERT INTO history (ts, event, preset, audience, headcount, query, response) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (ts, result.event, _preset_for(result.event), result.audience,
+                     getattr(result, "headcount", None), query, result.model_dump_json()),
+                )
+                self._conn.executemany(
+                    "INSERT INTO history_constraints (history_id, name) VALUES (?, ?)",
+                    [(cur.lastrowid, c) for c in dict.fromkeys(result.constraints)],
+                )
+        return len(rows)
+
+    # ---------- reads ----------
+    def find(self, preset: Optional[str] = None, event: Optional[str] = None,
+             audience: Optional[str] = None, constraint: Optional[str] = None,
+             since: Optional[float] = None, until: Optional[float] = None,
+             limit: Optional[int] = 100) -> List[Tuple[int, float, Any]]:
+        """[(id, ts, QuotedPairing)] newest first. `event` is a substring match."""
+        from schema import QuotedPairing
+
+        self.flush()
+        where, args = [], []
+        if preset:
+            where.append("h.preset = ?")
+            args.append(preset)
+        if event:
+            where.append("h.event LIKE ?")
+            args.append(f"%{event}%")
+        if audience:
+            where.append("h.audience = ?")
+            args.append(audience)
+        if constraint:
+            where.append("h.id IN (SELECT history_id FROM history_constraints WHERE name = ?)")
+            args.append(constraint)
+        if since is not None:
+            where.append("h.ts >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("h.ts < ?")
+            args.append(until)
+        sql = "SELECT h.id, h.ts, h.response FROM history h"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY h.ts DESC"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [(rid, ts, QuotedPairing.model_validate_json(resp)) for rid, ts, resp in rows]
+
+    def export_cards(self, path: str, rows: List[Tuple[int, float, Any]]) -> int:
+        """
+        Append rows to a card file (pairings_output.txt format) in one write, or render
+        printable cards when path ends in .pdf / .html (see cards.py).
+
+        Text exports skip rows already exported to the same file, so re-running an
+        overlapping --since only appends the new cards. Returns the number of cards written.
+        """
+        from cards import format_for, render_cards
+        if format_for(path) != "text":
+            return render_cards((r for _, _, r in reversed(rows)), path)
+        key = os.path.abspath(path)
+        with self._lock:
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                # file deleted or truncated: its old cards are gone, export them again
+                self._conn.execute("DELETE FROM history_exports WHERE path = ?", (key,))
+            done = {hid for (hid,) in self._conn.execute(
+                "SELECT history_id FROM history_exports WHERE path = ?", (key,))}
+        rows = [row for row in rows if row[0] not in done]
+        if not rows:
+            return 0
+        from tools import format_card
+        cards = [format_card(r, datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"))
+                 for _, ts, r in reversed(rows)]  # oldest first, like the file always was
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(cards))
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO history_exports VALUES (?, ?)",
+                                   [(key, hid) for hid, _, _ in rows])
+            self._conn.commit()
+        return len(cards)
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_DURATION_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*$", re.I)
+_UNIT_S = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_when(text: Optional[str]) -> Optional[float]:
+    """'30d' / '12h' (ago) or an ISO date/datetime -> epoch seconds."""
+    if not text:
+        return None
+    m = _DURATION_RE.match(text)
+    if m:
+        return time.time() - float(m.group(1)) * _UNIT_S[m.group(2).lower()]
+    return datetime.fromisoformat(text.strip()).timestamp()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Query / export saved pairings.")
+    ap.add_argument("--db", default=HISTORY_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("find", "export"):
+        p = sub.add_parser(name)
+        if name == "export":
+            p.add_argument("output", help="card file to append new cards to (e.g. pairings_output.txt)")
+        p.add_argument("--preset")
+        p.add_argument("--event", help="substring of the event name")
+        p.add_argument("--audience")
+        p.add_argument("--constraint")
+        p.add_argument("--since", help="'30d', '12h' or an ISO date")
+        p.add_argument("--until", help="'30d', '12h' or an ISO date")
+        p.add_argument("-n", "--limit", type=int, default=100 if name == "find" else 0)
+    args = ap.parse_args(argv)
+
+    store = HistoryStore(args.db)
+    rows = store.find(preset=args.preset, event=args.event, audience=args.audience,
+                      constraint=args.constraint, since=parse_when(args.since),
+                      until=parse_when(args.until), limit=args.limit or None)
+    if args.cmd == "export":
+        n = store.export_cards(args.output, rows)
+        skipped = f" ({len(rows) - n} already there)" if n < len(rows) else ""
+        print(f"{n} cards appended to {args.output}{skipped}")
+    else:
+        for rid, ts, r in rows:
+            when = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+            extra = ", ".join(filter(None, [r.audience, ", ".join(r.constraints),
+                                            f"{r.headcount} guests" if r.headcount else ""]))
+            print(f"#{rid:<6} {when}  {r.event}" + (f"  ({extra})" if extra else ""))
+        print(f"{len(rows)} matches", file=sys.stderr)
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,297 +1,630 @@
 # kb.py
-from typing import Dict, List
-
-PairingKB: Dict[str, Dict] = {
-    # Casual / Everyday
-    "pizza night": {
-        "food": {
-            "appetizers": [
-                "Garlic knots",
-                "Arancini (Sicilian rice balls)",
-                "House salad"
-            ],
-            "mains": [
-                "12–16\" Pizzas (Cheese, Pepperoni, Margherita)",
-                "Stromboli",
-                "Calzone"
-            ],
-            "sides": [
-                "Fried mozzarella",
-                "Roasted veggies"
-            ],
-            "desserts": [
-                "Cannoli (plain or chocolate-dipped)",
-                "Assorted Italian cookies"
-            ],
-        },
-        "drinks": {
-            "alcoholic": ["Light lager", "Italian pilsner", "Chianti (red)"],
-            "non_alcoholic": ["Cola", "Lemonade", "Sparkling water"],
-            "coffee": ["Espresso", "Cappuccino"]
-        },
-        "tags": ["casual", "shareable", "family-friendly", "pizza"],
-        "notes": "Pizzas & house specialties like Calzone/Stromboli are Scittino’s staples."
-    },
-
-    "italian family dinner": {
-        "food": {
-            "appetizers": [
-                "Burrata with prosciutto & tomatoes",
-                "Scittino’s homemade meatballs",
-                "Tomato & fresh mozzarella platter"
-            ],
-            "mains": [
-                "Lasagna (house)",
-                "Chicken Parmigiana",
-                "Penne alla Vodka or Bolognese"
-            ],
-            "sides": [
-                "Garlic bread",
-                "Caesar or Italian chopped salad"
-            ],
-            "desserts": [
-                "Tiramisu",
-                "Sfogliatelle",
-                "Cheesecake"
-            ],
-        },
-        "drinks": {
-            "alcoholic": ["Sangiovese", "Montepulciano d’Abruzzo"],
-            "non_alcoholic": ["Italian sodas", "Iced tea"],
-            "coffee": ["Espresso", "Macchiato"]
-        },
-        "tags": ["family-style", "comfort", "classic-italian"]
-    },
-
-    "game day / tailgate": {
-        "food": {
-            "appetizers": [
-                "Lascari wings (garlic lemon herb)",
-                "Frito Misto (fried calamari & shrimp)",
-                "Pepperoni rolls or Sausage Roll"
-            ],
-            "mains": [
-                "Stromboli (salami, mortadella, mozzarella)",
-                "The Sicilian sandwich (salumi, provolone, roasted peppers)",
-                "Meatball subs"
-            ],
-            "sides": [
-                "Potato wedges",
-                "Coleslaw"
-            ],
-            "desserts": [
-                "Brownies",
-                "Cookie tray"
-            ],
-        },
-        "drinks": {
-            "alcoholic": ["Pale ale", "Amber lager"],
-            "non_alcoholic": ["Cola", "Sports drinks", "Lemonade"]
-        },
-        "tags": ["casual", "shareable", "game-day"]
-    },
-
-    "office lunch / team meeting": {
-        "food": {
-            "appetizers": [
-                "Gourmet marinated antipasto platter",
-                "Tomato & fresh mozzarella platter"
-            ],
-            "mains": [
-                "Assorted Classic Italian cold cut sandwiches",
-                "Chicken Parm sandwich",
-                "Pasta tray (Baked ziti or Penne alla Vodka)"
-            ],
-            "sides": [
-                "House salad",
-                "Chips"
-            ],
-            "desserts": [
-                "Assorted Italian cookies",
-                "Mini cannoli"
-            ],
-        },
-        "drinks": {
-            "non_alcoholic": ["Bottled water", "Iced tea", "Lemonade"],
-            "coffee": ["Coffee urn", "Cappuccino (on request)"]
-        },
-        "tags": ["catering", "platter", "office-friendly"]
-    },
-
-    "kids birthday": {
-        "food": {
-            "appetizers": [
-                "Cheesy garlic bread",
-                "Fruit platter"
-            ],
-            "mains": [
-                "Cheese pizza",
-                "Chicken tenders",
-                "Mini meatball sliders"
-            ],
-            "sides": [
-                "Mac & cheese",
-                "Carrot sticks & ranch"
-            ],
-            "desserts": [
-                "Chocolate chip cookies",
-                "Mini cannoli",
-                "Cupcakes"
-            ],
-        },
-        "drinks": {
-            "non_alcoholic": ["Fruit punch", "Lemonade", "Water"],
-        },
-        "tags": ["kid-friendly", "nut-free-option", "shareable"]
-    },
-
-    "date night (italian)": {
-        "food": {
-            "appetizers": [
-                "Burrata with balsamic & EVOO",
-                "Arancini"
-            ],
-            "mains": [
-                "Chicken or Eggplant Parmigiana",
-                "Herb-crusted salmon (if featured) or Shrimp Fra Diavolo",
-                "Wild mushroom risotto (veg option)"
-            ],
-            "sides": [
-                "Grilled asparagus",
-                "Truffle mashed potatoes"
-            ],
-            "desserts": [
-                "Tiramisu",
-                "Chocolate cannoli"
-            ],
-        },
-        "drinks": {
-            "alcoholic": ["Pinot Noir", "Barbera", "Prosecco"],
-            "coffee": ["Espresso", "Cappuccino"]
-        },
-        "tags": ["elegant", "date-night"]
-    },
-
-    # Catering & Holidays
-    "holiday antipasto & dessert trays": {
-        "food": {
-            "appetizers": [
-                "Gourmet meat antipasto (prosciutto, sopressata, imported provolone)",
-                "Marinated artichokes, olives, mushrooms"
-            ],
-            "mains": [],
-            "sides": [],
-            "desserts": [
-                "Assorted biscotti & cookies",
-                "Pignoli & almond macaroons",
-                "Italian rum cake or Cannoli cake"
-            ],
-        },
-        "drinks": {
-            "alcoholic": ["Prosecco", "Moscato d’Asti"],
-            "coffee": ["Espresso", "Americano"]
-        },
-        "tags": ["holiday", "platter", "bakery"]
-    },
-
-    # Market / Butcher / DIY
-    "butcher grill pack": {
-        "food": {
-            "appetizers": [
-                "Caprese skewers"
-            ],
-            "mains": [
-                "House Italian sausage links (hot/sweet/fennel)",
-                "Marinated chicken cutlets",
-                "Homemade beef meatballs (for subs)"
-            ],
-            "sides": [
-                "Deli salads (pasta salad, potato salad)"
-            ],
-            "desserts": [
-                "Cookie tray"
-            ],
-        },
-        "drinks": {
-            "alcoholic": ["Italian lager", "Chianti for meatball subs"],
-            "non_alcoholic": ["Sparkling water", "Iced tea"]
-        },
-        "tags": ["butcher", "grill", "cook-at-home"]
-    },
-
-    "build-your-own pasta kit": {
-        "food": {
-            "appetizers": [
-                "Garlic bread",
-                "Antipasto cup (olives, artichokes)"
-            ],
-            "mains": [
-                "Fresh pasta (spaghetti/rigatoni/penne)",
-                "House sauces (marinara, vodka, pesto, bolognese)",
-                "Add-ons: meatballs, sausage, grilled chicken"
-            ],
-            "sides": [
-                "Caesar or house salad"
-            ],
-            "desserts": [
-                "Sfogliatelle",
-                "Biscotti assortment"
-            ],
-        },
-        "drinks": {
-            "alcoholic": ["Chianti", "Nero d’Avola"],
-            "coffee": ["Cappuccino"]
-        },
-        "tags": ["market", "DIY", "family-style"]
-    },
-
-    "coffee & pastry break": {
-        "food": {
-            "appetizers": [],
-            "mains": [],
-            "sides": [],
-            "desserts": [
-                "Cannoli (plain/chocolate/mini)",
-                "Eclairs",
-                "Cuccidati (fig cookies)",
-                "Bread pudding (Panettone-based, seasonal)"
-            ],
-        },
-        "drinks": {
-            "coffee": ["Espresso", "Cappuccino", "Latte"],
-            "non_alcoholic": ["Hot chocolate", "Bottled water"]
-        },
-        "tags": ["bakery", "coffee", "afternoon"]
-    },
-
-    # Sandwiches / Subs focus
-    "italian sub platter": {
-        "food": {
-            "appetizers": [
-                "Tomato & fresh mozzarella platter"
-            ],
-            "mains": [
-                "Scittino’s Classic Italian Cold Cut subs",
-                "The Sicilian sandwich",
-                "Chicken cutlet & eggplant parm subs (mix)"
-            ],
-            "sides": [
-                "Chips",
-                "Italian chopped salad"
-            ],
-            "desserts": [
-                "Mini cannoli",
-                "Assorted cookies"
-            ]
-        },
-        "drinks": {
-            "non_alcoholic": ["Soda cans", "Iced tea", "Water"]
-        },
-        "tags": ["catering", "sandwich", "office-friendly"]
-    }
-}
+# Scittino’s curated presets live in kb.json (presets, customer synonyms, per-item
+# dietary attributes and portion/price rows). At startup the file is compiled once into an
+# immutable KBStore snapshot: interned strings, the fuzzy lookup index, and inverted
+# indexes item/tag/course/drink-category -> presets, so lookups and filters stay
+# dict-lookups as the catalog grows. Long-running processes can watch the file and swap in
+# a recompiled store on edit (see "hot reload" below).
+import difflib
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
 
+KB_PATH = os.getenv("PAIRINGS_KB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb.json"))
 
+# ---------- text helpers ----------
+_PUNCT_RE = re.compile(r"[^\w&\s]")
+_WS_RE = re.compile(r"\s+")
+_SMART = str.maketrans({"’": "'", "‘": "'", "“": '"', "”": '"', "–": "-", "—": "-"})
+
+NEAR_EXACT_RATIO = 0.9
+
+
+def normalize_event(text: str) -> str:
+    """Lowercase, drop punctuation (keeping '&') and collapse whitespace."""
+    text = (text or "").translate(_SMART).lower()
+    text = _PUNCT_RE.sub(" ", text)
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _aliases(key: str) -> List[str]:
+    """'game day / tailgate' -> ['game day tailgate', 'game day', 'tailgate']."""
+    names = [key] + [part for part in key.split("/") if part.strip()]
+    # "date night (italian)" is also just "date night"
+    names += [re.sub(r"\(.*?\)", "", n) for n in names if "(" in n]
+    return list(dict.fromkeys(normalize_event(n) for n in names if normalize_event(n)))
+
+
+# ---------- fuzzy / alias lookup index ----------
+LOOKUP_MIN_SCORE = 0.5
+
+# weights by where a token came from
+_NAME_W, _SYN_W, _TAG_W = 1.0, 0.9, 0.6
+_FUZZY_MIN_SIM = 0.55
+
+_STOPWORDS = frozenset(
+    "a an and the for of to with in on at our my we i me us need needs want some "
+    "something please looking ideas idea plan event party people guests guest "
+    "about around like ish".split()
+)
+# Constraint / audience words: they refine a preset, they don't pick one
+_MODIFIER_WORDS = frozenset(
+    "vegetarian vegan nut nuts free gluten halal kosher dairy alcohol alcoholic non "
+    "no budget cheap adults adult mixed only option options".split()
+)
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+def _tokens(text: str) -> List[str]:
+    return [_stem(t) for t in normalize_event(text).replace("&", " ").split()
+            if not t.isdigit() and t not in _STOPWORDS]
+
+
+def _trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class _LookupIndex:
+    """
+    Precomputed token / alias / trigram index over the presets. A reload passes the previous
+    index and its parts, and only the entries of presets whose part changed are patched.
+    """
+
+    def __init__(self, parts: Dict[str, "_PresetPart"], base: Optional["_LookupIndex"] = None,
+                 base_parts: Optional[Dict[str, "_PresetPart"]] = None):
+        if base is None or base_parts is None:
+            self._build(parts)
+        else:
+            self._patch(parts, base, base_parts)
+
+    def _build(self, parts: Dict[str, "_PresetPart"]) -> None:
+        self.aliases: Dict[str, str] = {}
+        self.alias_grams: Dict[str, frozenset] = {}
+        self.token_weights: Dict[str, Dict[str, float]] = {}  # token -> {key: weight}
+        self.phrases: Dict[str, str] = {}                      # multi-word synonym -> key
+
+        for key, part in parts.items():
+            for alias, grams in part.aliases:
+                self.aliases[alias] = key
+                self.alias_grams[alias] = grams
+            for tok, weight in _token_map(part).items():
+                self.token_weights.setdefault(tok, {})[key] = weight
+            for phrase in part.phrases:
+                self.phrases[phrase] = key
+
+        self.vocab_grams: Dict[str, frozenset] = {t: _trigrams(t) for t in self.token_weights}
+        grams_to: Dict[str, set] = {}
+        for tok, grams in self.vocab_grams.items():
+            for g in grams:
+                grams_to.setdefault(g, set()).add(tok)
+        self._gram_to_tokens: Dict[str, frozenset] = {g: frozenset(toks) for g, toks in grams_to.items()}
+
+    def _patch(self, parts: Dict[str, "_PresetPart"], base: "_LookupIndex",
+               base_parts: Dict[str, "_PresetPart"]) -> None:
+        # shallow copies: the old index stays intact for requests pinned to the old store
+        self.aliases, self.alias_grams = dict(base.aliases), dict(base.alias_grams)
+        self.token_weights, self.phrases = dict(base.token_weights), dict(base.phrases)
+        self.vocab_grams, self._gram_to_tokens = dict(base.vocab_grams), dict(base._gram_to_tokens)
+
+        touched_aliases, touched_phrases, touched_tokens = set(), set(), set()
+        for key in _dirty_keys(parts, base_parts):
+            old, new = base_parts.get(key), parts.get(key)
+            touched_aliases |= _part_aliases(old) ^ _part_aliases(new)
+            touched_phrases |= set(old.phrases if old else ()) ^ set(new.phrases if new else ())
+            old_w, new_w = _token_map(old), _token_map(new)
+            for tok in old_w.keys() | new_w.keys():
+                if old_w.get(tok) == new_w.get(tok):
+                    continue
+                per_key = dict(self.token_weights.get(tok, {}))
+                if tok in new_w:
+                    per_key[key] = new_w[tok]
+                else:
+                    per_key.pop(key, None)
+                if per_key:
+                    self.token_weights[tok] = per_key
+                else:
+                    del self.token_weights[tok]
+                touched_tokens.add(tok)
+
+        # an alias / phrase two presets share goes to the later one, as in a full build
+        for alias in touched_aliases:
+            self.aliases.pop(alias, None)
+            self.alias_grams.pop(alias, None)
+        for phrase in touched_phrases:
+            self.phrases.pop(phrase, None)
+        if touched_aliases or touched_phrases:
+            for key, part in parts.items():
+                for alias, grams in part.aliases:
+                    if alias in touched_aliases:
+                        self.aliases[alias], self.alias_grams[alias] = key, grams
+                for phrase in part.phrases:
+                    if phrase in touched_phrases:
+                        self.phrases[phrase] = key
+
+        for tok in touched_tokens:
+            if tok in self.token_weights and tok not in self.vocab_grams:
+                self.vocab_grams[tok] = grams = _trigrams(tok)
+                for g in grams:
+                    self._gram_to_tokens[g] = self._gram_to_tokens.get(g, _EMPTY) | {tok}
+            elif tok not in self.token_weights and tok in self.vocab_grams:
+                for g in self.vocab_grams.pop(tok):
+                    rest = self._gram_to_tokens[g] - {tok}
+                    if rest:
+                        self._gram_to_tokens[g] = rest
+                    else:
+                        del self._gram_to_tokens[g]
+
+    def _fuzzy_token(self, token: str):
+        """Closest vocabulary token by trigram similarity (typos like 'tailgat')."""
+        grams = _trigrams(token)
+        seen = set()
+        for g in grams:
+            seen |= self._gram_to_tokens.get(g, set())
+        best, best_sim = None, 0.0
+        for cand in seen:
+            sim = _jaccard(grams, self.vocab_grams[cand])
+            if sim > best_sim:
+                best, best_sim = cand, sim
+        return (best, best_sim) if best_sim >= _FUZZY_MIN_SIM else (None, 0.0)
+
+    def event_tokens(self, text: str) -> List[str]:
+        """Tokens that pick a preset: stemmed, minus stopwords and constraint / audience words."""
+        return [t for t in _tokens(text) if t not in _MODIFIER_WORDS]
+
+    def unknown_tokens(self, text: str) -> List[str]:
+        """Event tokens the index has never seen, not even as a typo of a known one."""
+        return [t for t in self.event_tokens(text)
+                if t not in self.token_weights and self._fuzzy_token(t)[0] is None]
+
+    def rank(self, query: str, limit: int = 5) -> List[tuple]:
+        q = normalize_event(query)
+        if not q:
+            return []
+        if q in self.aliases:
+            return [(self.aliases[q], 1.0)]
+
+        scores: Dict[str, float] = {}
+        tokens = self.event_tokens(q)
+        if tokens:
+            for tok in tokens:
+                weights = self.token_weights.get(tok)
+                factor = 1.0
+                if weights is None:
+                    match, factor = self._fuzzy_token(tok)
+                    weights = self.token_weights.get(match, {}) if match else {}
+                for key, w in weights.items():
+                    scores[key] = scores.get(key, 0.0) + w * factor
+            scores = {k: v / len(tokens) for k, v in scores.items()}
+
+        for phrase, key in self.phrases.items():
+            if phrase in q:
+                scores[key] = max(scores.get(key, 0.0), _SYN_W)
+
+        q_grams = _trigrams(q)
+        for alias, grams in self.alias_grams.items():
+            key = self.aliases[alias]
+            scores[key] = max(scores.get(key, 0.0), _jaccard(q_grams, grams))
+
+        ranked = sorted(((k, round(min(v, 1.0), 3)) for k, v in scores.items() if v > 0),
+                        key=lambda kv: (-kv[1], kv[0]))
+        return ranked[:limit]
+
+
+# ---------- compiled store ----------
+_EMPTY: FrozenSet[str] = frozenset()
+
+
+def _intern_tree(obj):
+    if isinstance(obj, str):
+        return sys.intern(obj)
+    if isinstance(obj, list):
+        return [_intern_tree(v) for v in obj]
+    if isinstance(obj, dict):
+        return {sys.intern(k): _intern_tree(v) for k, v in obj.items()}
+    return obj
+
+
+class ItemInfo(NamedTuple):
+    has: FrozenSet[str]                              # e.g. {"pork", "gluten", "dairy"}
+    variants: Tuple[Tuple[str, FrozenSet[str]], ...]  # (lighter name, its attributes), best first
+
+
+def _item_info(raw: Dict) -> ItemInfo:
+    has = frozenset(sys.intern(a) for a in raw.get("has", []))
+    variants = tuple(
+        (sys.intern(v["name"]), frozenset(sys.intern(a) for a in v.get("has", [])))
+        for v in raw.get("variants", [])
+    )
+    return ItemInfo(has, variants)
+
+
+class Portion(NamedTuple):
+    unit: str      # "half tray", "pizza", "dozen", "bottle"...
+    serves: int    # guests one unit covers when it's the only item in its section
+    price: float   # USD per unit
+
+
+def _item_tokens(item: str) -> List[str]:
+    return [t for t in _tokens(item) if len(t) > 1]
+
+
+def _digest(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def _listed_items(data: Dict) -> List[str]:
+    return [i for section in ("food", "drinks") for lst in data.get(section, {}).values() for i in lst]
+
+
+class _PresetPart(NamedTuple):
+    """Everything one preset contributes to the store, compiled on its own so reloads can reuse it."""
+    fingerprint: str                              # preset + its synonyms + attributes of its items
+    data: Dict
+    aliases: Tuple[Tuple[str, frozenset], ...]    # (alias, trigrams)
+    lookup_tokens: Tuple[Tuple[str, float], ...]  # (token, weight) for the lookup index
+    phrases: Tuple[str, ...]                      # multi-word synonyms
+    item_tokens: FrozenSet[str]
+    tags: FrozenSet[str]
+    courses: FrozenSet[str]
+    drinks: FrozenSet[str]
+
+
+def _compile_preset(data: Dict, name: str, synonyms: List[str], fp: str) -> _PresetPart:
+    data = _intern_tree(data)
+    tokens = [(tok, _NAME_W) for tok in _tokens(name)]
+    tokens += [(tok, _SYN_W) for syn in synonyms for tok in _tokens(syn)]
+    tokens += [(tok, _TAG_W) for tag in data.get("tags", []) for tok in _tokens(tag.replace("-", " "))]
+    return _PresetPart(
+        fp, data,
+        tuple((alias, _trigrams(alias)) for alias in _aliases(name)),
+        tuple(tokens),
+        tuple(n for n in (normalize_event(syn) for syn in synonyms) if " " in n),
+        frozenset(tok for item in _listed_items(data) for tok in _item_tokens(item)),
+        frozenset(tag.lower() for tag in data.get("tags", [])),
+        frozenset(c for c, entries in data.get("food", {}).items() if entries),
+        frozenset(c for c, entries in data.get("drinks", {}).items() if entries),
+    )
+
+
+def _dirty_keys(parts: Dict[str, _PresetPart], base_parts: Dict[str, _PresetPart]) -> set:
+    """Presets added, removed or recompiled (unchanged presets reuse the very same part)."""
+    return {k for k in parts.keys() | base_parts.keys() if parts.get(k) is not base_parts.get(k)}
+
+
+def _part_aliases(part: Optional[_PresetPart]) -> set:
+    return {alias for alias, _ in part.aliases} if part else set()
+
+
+def _token_map(part: Optional[_PresetPart]) -> Dict[str, float]:
+    """token -> the preset's best weight for it."""
+    out: Dict[str, float] = {}
+    for tok, weight in (part.lookup_tokens if part else ()):
+        out[tok] = max(out.get(tok, 0.0), weight)
+    return out
+
+
+def _invert(parts: Dict[str, _PresetPart], field: str, base_index: Optional[Dict[str, FrozenSet[str]]] = None,
+            base_parts: Optional[Dict[str, _PresetPart]] = None) -> Dict[str, FrozenSet[str]]:
+    """value -> presets having it. Given the previous index, only changed presets' entries are patched."""
+    if base_index is None or base_parts is None:
+        out: Dict[str, set] = {}
+        for key, part in parts.items():
+            for value in getattr(part, field):
+                out.setdefault(value, set()).add(key)
+        return {sys.intern(k): frozenset(v) for k, v in out.items()}
+    index = dict(base_index)
+    for key in _dirty_keys(parts, base_parts):
+        old = getattr(base_parts[key], field) if key in base_parts else _EMPTY
+        new = getattr(parts[key], field) if key in parts else _EMPTY
+        for value in old ^ new:
+            found = index.get(value, _EMPTY)
+            found = found | {key} if value in new else found - {key}
+            if found:
+                index[sys.intern(value)] = found
+            else:
+                index.pop(value, None)
+    return index
+
+
+class KBStore:
+    """
+    One loaded KB snapshot. Treat as read-only; a reload builds a new one. Given the
+    previous store as `base`, presets whose fingerprint didn't change (and unchanged item
+    rows) are reused as-is, so only what an edit touched gets recompiled.
+    """
+
+    def __init__(self, presets: Dict[str, Dict], synonyms: Dict[str, List[str]],
+                 items: Optional[Dict[str, Dict]] = None, portions: Optional[Dict[str, list]] = None,
+                 version=None, base: Optional["KBStore"] = None):
+        self.version = version
+        items = items or {}
+        # content hash of the source data; derived artifacts (snapshot.py) are keyed on it
+        self.fingerprint = _digest([presets, synonyms, items, portions or {}])
+
+        old_parts = base._parts if base is not None else {}
+        self._parts: Dict[str, _PresetPart] = {}
+        for key, data in presets.items():
+            syns = synonyms.get(key, [])
+            fp = _digest([key, data, syns, {i: items[i] for i in _listed_items(data) if i in items}])
+            part = old_parts.get(key)
+            self._parts[sys.intern(key)] = part if part is not None and part.fingerprint == fp \
+                else _compile_preset(data, key, syns, fp)
+        self.presets: Dict[str, Dict] = {k: p.data for k, p in self._parts.items()}
+        self.preset_fps: Dict[str, str] = {k: p.fingerprint for k, p in self._parts.items()}
+        self.synonyms: Dict[str, List[str]] = _intern_tree(synonyms)
+
+        # per-item dietary attributes; items missing here are "unknown" to the diet filter
+        self._raw_items = items
+        old_raw = base._raw_items if base is not None else {}
+        old_items = base.items if base is not None else {}
+        self.items: Dict[str, ItemInfo] = {
+            sys.intern(k): old_items[k] if k in old_items and old_raw.get(k) == v else _item_info(v)
+            for k, v in items.items()
+        }
+        # keyed by casefolded item name so model-written "cheese pizza" still finds "Cheese pizza"
+        self.portions: Dict[str, Portion] = {
+            k.casefold(): Portion(sys.intern(u), int(n), float(p)) for k, (u, n, p) in (portions or {}).items()
+        }
+        # a reload patches the previous indexes for the presets that changed
+        prev = base._parts if base is not None else None
+        self.lookup = _LookupIndex(self._parts, base.lookup if base is not None else None, prev)
+        self.item_index: Dict[str, FrozenSet[str]] = _invert(
+            self._parts, "item_tokens", base.item_index if base is not None else None, prev)
+        self.tag_index: Dict[str, FrozenSet[str]] = _invert(
+            self._parts, "tags", base.tag_index if base is not None else None, prev)
+        self.course_index: Dict[str, FrozenSet[str]] = _invert(
+            self._parts, "courses", base.course_index if base is not None else None, prev)
+        self.drink_index: Dict[str, FrozenSet[str]] = _invert(
+            self._parts, "drinks", base.drink_index if base is not None else None, prev)
+
+    def event_tokens(self, text: str) -> List[str]:
+        return self.lookup.event_tokens(text)
+
+    def unknown_tokens(self, text: str) -> List[str]:
+        return self.lookup.unknown_tokens(text)
+
+    def dependency_tags(self, keys: Iterable[str]) -> List[str]:
+        """'key@fingerprint' per known preset: what a cached answer built on them depends on."""
+        return sorted(f"{k}@{self.preset_fps[k]}" for k in set(keys) if k in self.preset_fps)
+
+    def presets_with_item(self, item: str) -> FrozenSet[str]:
+        """Presets listing an item whose name contains every word of `item` ('meatballs')."""
+        toks = _item_tokens(item)
+        if not toks:
+            return _EMPTY
+        found = self.item_index.get(toks[0], _EMPTY)
+        for tok in toks[1:]:
+            found = found & self.item_index.get(tok, _EMPTY)
+        return found
+
+    def find(self, item: Optional[str] = None, tag: Optional[str] = None,
+             course: Optional[str] = None, drink: Optional[str] = None) -> List[str]:
+        """Presets matching every given filter (intersection of the inverted indexes)."""
+        sets: List[FrozenSet[str]] = []
+        if item:
+            sets.append(self.presets_with_item(item))
+        if tag:
+            sets.append(self.tag_index.get(tag.strip().lower(), _EMPTY))
+        if course:
+            sets.append(self.course_index.get(course.strip().lower(), _EMPTY))
+        if drink:
+            sets.append(self.drink_index.get(drink.strip().lower().replace("-", "_"), _EMPTY))
+        if not sets:
+            return []
+        found = sets[0].intersection(*sets[1:])
+        return sorted(found)
+
+    def items_matching(self, key: str, item: str) -> List[str]:
+        """The actual item strings in one preset that match an item query."""
+        toks = set(_item_tokens(item))
+        data = self.presets.get(key, {})
+        entries: Iterable[str] = [i for lst in data.get("food", {}).values() for i in lst]
+        entries = list(entries) + [i for lst in data.get("drinks", {}).values() for i in lst]
+        return [i for i in entries if toks <= set(_item_tokens(i))]
+
+
+def load_kb(path: str = KB_PATH, base: Optional[KBStore] = None) -> KBStore:
+    """Read the KB data file in one go and compile it (reusing `base` where nothing changed)."""
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    return KBStore(raw["presets"], raw.get("synonyms", {}), raw.get("items"), raw.get("portions"),
+                   raw.get("version"), base=base)
+
+
+_STORE = load_kb()
+# set per request by pinned_store(), so one request never sees two KB versions
+_PINNED: ContextVar[Optional[KBStore]] = ContextVar("pinned_kb_store", default=None)
+
+
+def current_store() -> KBStore:
+    return _PINNED.get() or _STORE
+
+
+@contextmanager
+def pinned_store():
+    """Every current_store() inside (tasks and executor threads included) sees the same KB."""
+    token = _PINNED.set(current_store())
+    try:
+        yield _PINNED.get()
+    finally:
+        _PINNED.reset(token)
+
+
+# ---------- hot reload ----------
+# Staff edit kb.json in place; a long-running process picks the edit up without a restart.
+# The new store is compiled next to the live one (unchanged presets reused), then swapped
+# in with one assignment: requests already running finish on the store they pinned.
+#
+#     PAIRINGS_KB_WATCH=0      the server / interactive CLI don't start the watcher
+#     PAIRINGS_KB_POLL_S=0.5   how often watch_kb() checks the file
+KB_WATCH = os.getenv("PAIRINGS_KB_WATCH", "1") != "0"
+KB_POLL_S = float(os.getenv("PAIRINGS_KB_POLL_S", "0.5"))
+
+KB_STATS: Counter = Counter()
+
+
+class KBDiff(NamedTuple):
+    added: Tuple[str, ...]
+    removed: Tuple[str, ...]
+    changed: Tuple[str, ...]   # the preset, its synonyms, or attributes of an item it lists
+
+    @property
+    def affected(self) -> Tuple[str, ...]:
+        return self.added + self.removed + self.changed
+
+
+def diff_stores(old: KBStore, new: KBStore) -> KBDiff:
+    return KBDiff(
+        tuple(sorted(set(new.preset_fps) - set(old.preset_fps))),
+        tuple(sorted(set(old.preset_fps) - set(new.preset_fps))),
+        tuple(sorted(k for k, fp in new.preset_fps.items() if k in old.preset_fps and old.preset_fps[k] != fp)),
+    )
+
+
+_RELOAD_LOCK = threading.Lock()
+_LISTENERS: List[Callable[[KBStore, KBStore, KBDiff], None]] = []
+
+
+def on_reload(fn: Callable[[KBStore, KBStore, KBDiff], None]) -> Callable:
+    """Register fn(old, new, diff), called after each swap (e.g. to drop cached answers)."""
+    _LISTENERS.append(fn)
+    return fn
+
+
+def reload_kb(path: str = KB_PATH) -> Optional[KBDiff]:
+    """Recompile the KB file and swap it in. None if unchanged or unreadable (old store kept)."""
+    global _STORE
+    with _RELOAD_LOCK:
+        old = _STORE
+        t0 = time.perf_counter()
+        try:
+            new = load_kb(path, base=old)
+        except (OSError, ValueError, KeyError, TypeError) as ex:
+            # most likely a half-saved file; the next write triggers another try
+            KB_STATS["errors"] += 1
+            print(f"kb: reload of {path} failed, keeping version {old.version}: {ex}", file=sys.stderr)
+            return None
+        if new.fingerprint == old.fingerprint:
+            KB_STATS["unchanged"] += 1
+            return None
+        diff = diff_stores(old, new)
+        _STORE = new
+        KB_STATS["reloads"] += 1
+        KB_STATS["presets_recompiled"] += len(diff.added) + len(diff.changed)
+        KB_STATS["last_reload_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        for fn in _LISTENERS:
+            try:
+                fn(old, new, diff)
+            except Exception as ex:  # a listener bug must not undo the swap
+                KB_STATS["listener_errors"] += 1
+                print(f"kb: reload listener {getattr(fn, '__name__', fn)} failed: {ex}", file=sys.stderr)
+        return diff
+
+
+def _file_state(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+_WATCHER: Optional[threading.Thread] = None
+
+
+def watch_kb(path: str = KB_PATH, interval: float = KB_POLL_S) -> threading.Thread:
+    """Poll the KB file in a daemon thread and reload on change; one watcher per process."""
+    global _WATCHER
+    if _WATCHER is not None and _WATCHER.is_alive():
+        return _WATCHER
+
+    def run():
+        seen = _file_state(path)
+        while True:
+            time.sleep(interval)
+            state = _file_state(path)
+            if state is not None and state != seen:
+                seen = state
+                reload_kb(path)
+
+    _WATCHER = threading.Thread(target=run, name="kb-watch", daemon=True)
+    _WATCHER.start()
+    return _WATCHER
+
+
+def kb_summary() -> str:
+    store = current_store()
+    stats = ", ".join(f"{k}={v}" for k, v in sorted(KB_STATS.items()))
+    out = f"kb: version {store.version}, {len(store.presets)} presets ({store.fingerprint})"
+    return out + (f", {stats}" if stats else "")
+
+
+# Back-compat names for the preset dict and synonyms, resolved on the current store so they
+# follow reloads (kb.PairingKB, from kb import Synonyms)
+_CURRENT_NAMES = {"PairingKB": lambda store: store.presets, "Synonyms": lambda store: store.synonyms}
+
+
+def __getattr__(name: str):
+    if name in _CURRENT_NAMES:
+        return _CURRENT_NAMES[name](current_store())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ---------- lookups ----------
 def lookup_pairings(event: str) -> Dict:
+    """Exact preset key first, then the best fuzzy candidate if it scores well enough."""
+    presets = current_store().presets
     key = event.strip().lower()
-    return PairingKB.get(key, {})
+    if key in presets:
+        return presets[key]
+    ranked = rank_pairings(event, limit=1)
+    if ranked and ranked[0][1] >= LOOKUP_MIN_SCORE:
+        return presets[ranked[0][0]]
+    return {}
+
+
+def rank_pairings(query: str, limit: int = 5) -> List[tuple]:
+    """Ranked (preset key, score in [0, 1]) candidates for a free-text event query."""
+    return current_store().lookup.rank(query, limit)
+
+
+def find_presets(item: Optional[str] = None, tag: Optional[str] = None,
+                 course: Optional[str] = None, drink: Optional[str] = None) -> List[str]:
+    """e.g. find_presets(item="meatballs"), find_presets(tag="office-friendly", course="desserts")."""
+    return current_store().find(item=item, tag=tag, course=course, drink=drink)
+
+
+def resolve_preset(query: str) -> Optional[str]:
+    """
+    Map a query straight onto a preset key when it is the preset name (or an
+    alias of it) give or take casing, punctuation and small typos.
+    Returns None when the query needs more than a preset lookup.
+    """
+    q = normalize_event(query)
+    if not q:
+        return None
+    store = current_store()
+    if q in store.lookup.aliases:
+        return store.lookup.aliases[q]
+    best_key, best_ratio = None, 0.0
+    for alias, key in store.lookup.aliases.items():
+        ratio = difflib.SequenceMatcher(None, q, alias).ratio()
+        if ratio > best_ratio:
+            best_key, best_ratio = key, ratio
+    return best_key if best_ratio >= NEAR_EXACT_RATIO else None
@@ -1,50 +1,68 @@
 # main.py
+# Startup is kept lazy: LangChain, the Anthropic client, pydantic and tabulate are only
+# imported (and the agent only built) the first time something needs them, so KB-only
+# commands start fast. Only kb / query / diet load at import time; the cache, repair,
+# metrics, routing, snapshot and card modules are imported where they are used.
+# Check with `python main.py --startup-check` or `python -X importtime main.py`.
+from __future__ import annotations
+
+import time
+
+_IMPORT_T0 = time.perf_counter()
+
 import os
+import re
 import shutil
+import sys
 import textwrap
-import unicodedata
-from dotenv import load_dotenv
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
-from langchain_anthropic import ChatAnthropic
-from langchain.output_parsers import PydanticOutputParser, OutputFixingParser
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.agents import create_tool_calling_agent, AgentExecutor
-from tools import search_tool, wiki_tool, pairing_kb_tool
-from tabulate import tabulate
-
-
-
-load_dotenv()  # expects ANTHROPIC_API_KEY in .env
-
-# ---------- schema ----------
-class MenuSection(BaseModel):
-    appetizers: List[str] = Field(default_factory=list)
-    mains: List[str] = Field(default_factory=list)
-    sides: List[str] = Field(default_factory=list)
-    desserts: List[str] = Field(default_factory=list)
-
-class DrinkSection(BaseModel):
-    alcoholic: List[str] = Field(default_factory=list)
-    non_alcoholic: List[str] = Field(default_factory=list)
-
-class PairingResponse(BaseModel):
-    event: str
-    audience: Optional[str] = None      # "adults", "kids", "mixed", "21+"
-    constraints: List[str] = Field(default_factory=list)  # e.g., ["vegetarian","nut-free","budget:$"]
-    cuisine_pref: Optional[str] = None  # e.g., "italian"
-    menu: MenuSection
-    drinks: DrinkSection
-    rationale: str
-    sources: List[str] = Field(default_factory=list)
-    tools_used: List[str] = Field(default_factory=list)
+from collections import Counter
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Sequence, Tuple
+from kb import (KB_WATCH, KBDiff, KBStore, LOOKUP_MIN_SCORE, current_store, on_reload, pinned_store,
+                rank_pairings, resolve_preset, watch_kb)
+from query import parse_query, strip_audience
+from diet import FilteredPreset, filter_preset
+
+if TYPE_CHECKING:
+    from cache import DiskCache
+    from schema import MenuSection, DrinkSection, PairingResponse
+
+
+@lru_cache(maxsize=None)
+def _load_env() -> None:
+    from dotenv import load_dotenv
+    load_dotenv()  # expects ANTHROPIC_API_KEY in .env
+
 
 # ---------- LLM ----------
-llm = ChatAnthropic(model="claude-3-5-sonnet-20241022", temperature=0.2)
+# One client per tier (see routing.py); "smart" is the model custom plans get. Calls queue on
+# the tier's scheduler (scheduler.py), which also owns retries on 429 / overload.
+@lru_cache(maxsize=None)
+def get_llm(tier: str = "smart"):
+    _load_env()
+    from langchain_anthropic import ChatAnthropic
+    from routing import TIERS
+    from scheduler import SCHEDULER_ENABLED, scheduled
+    t = TIERS[tier]
+    llm = ChatAnthropic(model=t.model, temperature=0.2, timeout=t.timeout_s,
+                        max_retries=0 if SCHEDULER_ENABLED else 2)
+    return scheduled(llm, tier)
+
 
 # ---------- parsers ----------
-target_parser = PydanticOutputParser(pydantic_object=PairingResponse)
-fixing_parser = OutputFixingParser.from_llm(llm=llm, parser=target_parser)
+@lru_cache(maxsize=None)
+def get_target_parser():
+    from langchain.output_parsers import PydanticOutputParser
+    from schema import PairingResponse
+    return PydanticOutputParser(pydantic_object=PairingResponse)
+
+
+@lru_cache(maxsize=None)
+def get_fixing_parser():
+    from langchain.output_parsers import OutputFixingParser
+    # JSON repair doesn't need the top model
+    return OutputFixingParser.from_llm(llm=get_llm("fast"), parser=get_target_parser())
+
 
 # ---------- prompt ----------
 SYSTEM = """
@@ -53,11 +71,14 @@ Recommend food & drink pairings tailored to an EVENT and optional AUDIENCE/CONST
 
 STRICT SOURCE POLICY (in order of truth):
 1) Use the curated Scittino’s presets via the `pairing_kb` tool (source tag: "Scittino’s KB").
+   Lookups for the likeliest presets may already be answered at the start of the turn; use
+   those results instead of repeating the same `pairing_kb` call.
 2) If the preset is missing or incomplete, you may use web search **only** with domain restriction
    to Scittino’s owned sites (use `search` with 'site:' queries and cite the page):
    - scittinosdeli.com (house specialties, subs/sandwiches, small plates)
    - scittinositalianmarketplace.com (catering platters, antipasti, bakery/desserts)
-   Add exact pages you referenced to `sources`.
+   Add exact pages you referenced to `sources`. Independent `search` / `wikipedia` lookups can be
+   requested in the same turn; they run in parallel.
 3) If still needed, generate a Scittino’s-inspired custom plan limited to classic Italian deli/market/butcher items
    (e.g., fresh pasta, sauces, pesto, sausage links, meatballs, salumi, antipasti, cannoli, biscotti, espresso bar).
    Tag source as "Scittino’s-inspired custom plan". DO NOT invent exotic items outside an Italian deli/butcher scope.
@@ -92,23 +113,127 @@ User: "I need a build-your-own pasta kit for 6, nut-free."
 Assistant (thinking): Use pairing_kb('build-your-own pasta kit'); ensure nut-free sauce choices; include cappuccino optional.
 """
 
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", SYSTEM),
-        ("system", FEWSHOT),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{query}"),
-        MessagesPlaceholder("agent_scratchpad"),
-    ]
-).partial(format_instructions=target_parser.get_format_instructions())
+def system_message():
+    """
+    SYSTEM + FEWSHOT as one pre-formatted system message. It is byte-identical on every
+    turn, so it carries an Anthropic cache_control breakpoint: the tool definitions and
+    this prefix are served from the provider's prompt cache instead of re-processed.
+    """
+    from langchain_core.messages import SystemMessage
+    system_text = SYSTEM.replace("{format_instructions}", get_target_parser().get_format_instructions())
+    return SystemMessage(content=[
+        {"type": "text", "text": system_text},
+        {"type": "text", "text": FEWSHOT, "cache_control": {"type": "ephemeral"}},
+    ])
+
+
+@lru_cache(maxsize=None)
+def get_prompt():
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    # Not a template: format instructions contain JSON braces and are filled in above
+    return ChatPromptTemplate.from_messages(
+        [
+            system_message(),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{query}"),
+            MessagesPlaceholder("agent_scratchpad"),
+        ]
+    )
+
 
 # ---------- tools ----------
-# Keep wiki_tool only if you want general food background; otherwise the source policy above will keep it unused.
-tools = [pairing_kb_tool, search_tool, wiki_tool]
+def get_tools():
+    from tools import pairing_kb_tool, search_tool, wiki_tool
+    # Keep wiki_tool only if you want general food background; otherwise the source policy above will keep it unused.
+    return [pairing_kb_tool, search_tool, wiki_tool]
+
 
 # ---------- agent ----------
-agent = create_tool_calling_agent(llm=llm, prompt=prompt, tools=tools)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+def _scratchpad(inputs: Dict[str, Any]) -> list:
+    # prefetched pairing_kb calls (prefetch.py) come first, as if the model had made them
+    from langchain.agents.format_scratchpad.tools import format_to_tool_messages
+    return list(inputs.get("prefetched") or []) + format_to_tool_messages(inputs["intermediate_steps"])
+
+
+def build_agent_executor(llm=None, tools=None, prompt=None, verbose: bool = True,
+                         max_execution_time: Optional[float] = None):
+    """
+    Build an AgentExecutor; defaults to the shared Claude model, prompt and tools. Same
+    chain as create_tool_calling_agent, except the scratchpad starts with any prefetched
+    tool results passed in as the "prefetched" input.
+    """
+    from langchain.agents import AgentExecutor
+    from langchain.agents.output_parsers.tools import ToolsAgentOutputParser
+    from langchain_core.runnables import RunnablePassthrough
+    llm = llm or get_llm()
+    tools = tools or get_tools()
+    agent = (
+        RunnablePassthrough.assign(agent_scratchpad=_scratchpad)
+        | (prompt or get_prompt())
+        | llm.bind_tools(tools)
+        | ToolsAgentOutputParser()
+    )
+    return AgentExecutor(agent=agent, tools=tools, verbose=verbose, max_execution_time=max_execution_time,
+                         return_intermediate_steps=True)
+
+
+@lru_cache(maxsize=None)
+def get_agent_executor(tier: str = "smart"):
+    from routing import TIERS
+    return build_agent_executor(llm=get_llm(tier), max_execution_time=TIERS[tier].timeout_s)
+
+
+# ---------- response cache ----------
+# A prompt or schema edit changes the fingerprint, which drops every old row. KB edits only drop the
+# rows whose presets changed: each row lists the presets it was built on ("key@fp").
+@lru_cache(maxsize=None)
+def prompt_fingerprint() -> str:
+    """SYSTEM, FEWSHOT and the response schema behind {format_instructions}."""
+    from cache import fingerprint
+    from schema import PairingResponse
+    return fingerprint(SYSTEM, FEWSHOT, PairingResponse.model_json_schema())
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> DiskCache:
+    from cache import DiskCache
+    _load_env()
+    cache = DiskCache(os.getenv("PAIRINGS_CACHE", "pairings_cache.sqlite3"))
+    cache.drop_stale(prompt_fingerprint())
+    # presets edited while nothing was running
+    current = set(current_store().dependency_tags(current_store().presets))
+    cache.drop_deps(cache.dependencies() - current)
+    return cache
+
+
+@on_reload
+def _drop_cached_answers(old: KBStore, new: KBStore, diff: KBDiff) -> None:
+    if get_response_cache.cache_info().currsize:
+        get_response_cache().drop_deps(old.dependency_tags(diff.removed + diff.changed))
+
+
+# Old module-level names still work, they are just built on first access.
+_LAZY = {
+    "llm": get_llm,
+    "target_parser": get_target_parser,
+    "fixing_parser": get_fixing_parser,
+    "prompt": get_prompt,
+    "tools": get_tools,
+    "agent_executor": get_agent_executor,
+    "response_cache": get_response_cache,
+    "PROMPT_FP": prompt_fingerprint,
+    "MODEL_NAME": lambda: __import__("routing").TIERS["smart"].model,
+}
+_SCHEMA_NAMES = {"MenuSection", "DrinkSection", "PairingResponse"}
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        return _LAZY[name]()
+    if name in _SCHEMA_NAMES:
+        import schema
+        return getattr(schema, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # NEW: small helpers for professional-looking output
@@ -120,19 +245,10 @@ def _kv_summary(pairs):
     # pairs: list[tuple[str, str]]
     left_width = max((len(k) for k, _ in pairs), default=0)
     return "\n".join([f"{k:<{left_width}}  : {v}" for k, v in pairs if v])
-def _normalize_text(s: str) -> str:
-    """Replace smart quotes/dashes with ASCII so widths render predictably."""
-    if not isinstance(s, str):
-        return s
-    s = unicodedata.normalize("NFKC", s)
-    replacements = {
-        "“": '"', "”": '"', "‘": "'", "’": "'",
-        "–": "-", "—": "-", "−": "-",
-        "…": "...",
-    }
-    for k, v in replacements.items():
-        s = s.replace(k, v)
-    return s
+def _normalize_text(text: str) -> str:
+    from cards import normalize_text  # str.translate-based
+    return normalize_text(text)
+
 
 def _bulleted(items):
     """Turn a list into a neat multi-line bullet list."""
@@ -148,10 +264,12 @@ def _wrap_cell(text: str, width: int) -> str:
     return "\n".join(lines)
 
 
-def _render_menu_and_drinks(menu, drinks):
+def _render_menu_and_drinks(menu, drinks, only=None, width: Optional[int] = None):
     """
-    Returns a string with two tables (Menu, Drinks), wrapped to terminal width.
-    Uses 'tabulate' if available; otherwise neat plain text.
+    Returns a string with two tables (Menu, Drinks), wrapped to `width` (default: the
+    terminal width). Uses 'tabulate' if available; otherwise neat plain text.
+    `only` limits output to the given row labels (e.g. {"Mains"}) for streaming.
+    Bulk / printable output goes through cards.py instead.
     """
     # Make each cell a multi-line bullet list instead of one long comma string
     menu_rows = [
@@ -164,9 +282,12 @@ def _render_menu_and_drinks(menu, drinks):
         ["Alcoholic",     _bulleted(drinks.alcoholic)],
         ["Non-Alcoholic", _bulleted(drinks.non_alcoholic)],
     ]
+    if only is not None:
+        menu_rows = [r for r in menu_rows if r[0] in only]
+        drink_rows = [r for r in drink_rows if r[0] in only]
 
     # Determine a safe width for the right column
-    term_width = shutil.get_terminal_size((100, 20)).columns
+    term_width = width or shutil.get_terminal_size((100, 20)).columns
     # Leave space for borders/left column; clamp for narrow terminals
     rec_col_width = max(24, min(80, term_width - 26))
 
@@ -176,19 +297,24 @@ def _render_menu_and_drinks(menu, drinks):
     for r in drink_rows:
         r[1] = _wrap_cell(r[1], rec_col_width)
 
+    try:
+        from tabulate import tabulate
+    except ImportError:
+        tabulate = None
+
     if tabulate:
         # Prefer ASCII grid on very narrow terminals to avoid box-drawing glitches
         tablefmt = "github" if term_width < 90 else "fancy_grid"
 
         # Newer tabulate supports maxcolwidths; if your version is older, wrapping above already handles it.
         try:
-            menu_txt = tabulate(menu_rows,
+            menu_txt = menu_rows and tabulate(menu_rows,
                                 headers=["Course", "Recommendations"],
                                 tablefmt=tablefmt,
                                 maxcolwidths=[12, rec_col_width],
                                 stralign="left",
                                 disable_numparse=True)
-            drink_txt = tabulate(drink_rows,
+            drink_txt = drink_rows and tabulate(drink_rows,
                                  headers=["Drinks", "Suggestions"],
                                  tablefmt=tablefmt,
                                  maxcolwidths=[12, rec_col_width],
@@ -196,11 +322,11 @@ def _render_menu_and_drinks(menu, drinks):
                                  disable_numparse=True)
         except TypeError:
             # Fallback if tabulate doesn’t have maxcolwidths
-            menu_txt = tabulate(menu_rows, headers=["Course", "Recommendations"],
+            menu_txt = menu_rows and tabulate(menu_rows, headers=["Course", "Recommendations"],
                                 tablefmt=tablefmt, stralign="left", disable_numparse=True)
-            drink_txt = tabulate(drink_rows, headers=["Drinks", "Suggestions"],
+            drink_txt = drink_rows and tabulate(drink_rows, headers=["Drinks", "Suggestions"],
                                  tablefmt=tablefmt, stralign="left", disable_numparse=True)
-        return f"{menu_txt}\n\n{drink_txt}"
+        return "\n\n".join(t for t in (menu_txt, drink_txt) if t)
 
     # Plain-text fallback with wrapping
     def as_lines(rows, header_left, header_right):
@@ -216,81 +342,647 @@ def _render_menu_and_drinks(menu, drinks):
                     lines.append(f"{'':<{left_width}} | {ln}")
         return "\n".join(lines)
 
-    menu_txt  = as_lines(menu_rows,  "Course", "Recommendations")
-    drink_txt = as_lines(drink_rows, "Drinks", "Suggestions")
-    return f"{menu_txt}\n\n{drink_txt}"
+    menu_txt  = menu_rows and as_lines(menu_rows,  "Course", "Recommendations")
+    drink_txt = drink_rows and as_lines(drink_rows, "Drinks", "Suggestions")
+    return "\n\n".join(t for t in (menu_txt, drink_txt) if t)
 
 
-# ---------- simple in-memory chat loop ----------
-def run_cli():
-    print("🍽️ Pairings Assistant — type 'exit' to quit.")
-    chat_history: List[Dict[str, Any]] = []
+# ---------- KB fast path ----------
+KB_SOURCE = "Scittino’s KB"
+
+
+def kb_response(key: str, constraints: Sequence[str] = (), audience: Optional[str] = None,
+                filtered: Optional[FilteredPreset] = None) -> PairingResponse:
+    """Build a PairingResponse straight from a KB preset (no LLM), optionally diet-filtered."""
+    from schema import MenuSection, DrinkSection, PairingResponse
+    data = current_store().presets[key]
+    food = filtered.food if filtered else data.get("food", {})
+    drinks = filtered.drinks if filtered else data.get("drinks", {})
+    tags = data.get("tags", [])
+    if filtered:
+        rationale = (
+            f"Scittino’s curated '{key}' preset, filtered locally for "
+            + ", ".join(list(constraints) + ([f"{audience} audience"] if audience else []))
+            + "."
+        )
+        if filtered.swapped:
+            rationale += " Swapped: " + "; ".join(f"{a} → {b}" for a, b in filtered.swapped) + "."
+        if filtered.removed:
+            rationale += " Left out: " + "; ".join(filtered.removed) + "."
+    else:
+        rationale = data.get("notes") or (
+            f"Scittino’s curated '{key}' preset"
+            + (f" ({', '.join(tags)})" if tags else "")
+            + ", served as-is from the house KB."
+        )
+    return PairingResponse(
+        event=key,
+        audience=audience,
+        constraints=list(constraints),
+        menu=MenuSection(**{k: list(v) for k, v in food.items() if k in MenuSection.model_fields}),
+        drinks=DrinkSection(
+            alcoholic=list(drinks.get("alcoholic", [])),
+            # DrinkSection has no coffee bar; espresso drinks are non-alcoholic
+            non_alcoholic=list(drinks.get("non_alcoholic", [])) + list(drinks.get("coffee", [])),
+        ),
+        rationale=rationale,
+        sources=[KB_SOURCE],
+        tools_used=["pairing_kb"],
+    )
+
+
+def _precompiled(key: str) -> Optional[PairingResponse]:
+    from metrics import mark_path
+    from snapshot import MISSING, lookup as snapshot_lookup
+    hit = snapshot_lookup(key)
+    if hit is MISSING or hit is None:
+        return None
+    mark_path("kb:snapshot")
+    return hit
+
+
+def kb_fast_path(query: str) -> Optional[PairingResponse]:
+    """
+    Answer preset requests locally: exact / near-exact preset names (headcount aside), and
+    presets with dietary constraints or a kids audience the diet filter can satisfy.
+    Combinations in the precompiled snapshot (snapshot.py) are served from it. None means
+    ask the agent.
+    """
+    from metrics import mark_path
+    from snapshot import MISSING, lookup as snapshot_lookup
+    key = resolve_preset(query)
+    if key:
+        return _precompiled(key) or kb_response(key)
+    parsed = parse_query(query)
+    key = resolve_preset(parsed.event) or resolve_preset(strip_audience(parsed.event))
+    if not key:
+        return None
+    if not (parsed.constraints or parsed.audience):
+        return _precompiled(key) or kb_response(key)  # "office lunch for 80": headcount only
+    hit = snapshot_lookup(key, parsed.constraints, parsed.audience)
+    if hit is not MISSING:
+        if hit is not None:
+            mark_path("kb:snapshot")
+        return hit
+    filtered = filter_preset(key, parsed.constraints, parsed.audience)
+    if filtered is None:
+        return None
+    mark_path("kb:filtered")
+    return kb_response(key, parsed.constraints, parsed.audience, filtered)
+
+
+# ---------- composed plans ----------
+# Events with no preset ("baby shower brunch") assembled from KB items; PAIRINGS_COMPOSE=0
+# sends them to the agent instead.
+COMPOSE_LOCALLY = os.getenv("PAIRINGS_COMPOSE", "1") != "0"
+
+
+def composed_response(plan, constraints: Sequence[str] = (), audience: Optional[str] = None) -> PairingResponse:
+    """PairingResponse for a composer.ComposedPlan (no LLM)."""
+    from composer import CUSTOM_SOURCE
+    from schema import MenuSection, DrinkSection, PairingResponse
+    rationale = (f"No Scittino’s preset covers '{plan.event}', so this plan is put together from KB "
+                 f"items that fit {', '.join(plan.matched)}")
+    if plan.closest:
+        rationale += f", leaning on the '{plan.closest[0]}' preset"
+    rationale += "; 3–6 picks per course, no repeats."
+    if constraints or audience:
+        wanted = list(constraints) + ([f"{audience} audience"] if audience else [])
+        rationale += " Filtered for " + ", ".join(wanted) + "."
+    if plan.swapped:
+        rationale += " Swapped: " + "; ".join(f"{a} → {b}" for a, b in plan.swapped) + "."
+    return PairingResponse(
+        event=plan.event,
+        audience=audience,
+        constraints=list(constraints),
+        menu=MenuSection(**plan.food),
+        drinks=DrinkSection(**plan.drinks),
+        rationale=rationale,
+        sources=[CUSTOM_SOURCE],
+        tools_used=["pairing_kb"],
+    )
+
+
+def compose_fast_path(query: str) -> Optional[PairingResponse]:
+    """Compose a plan from KB items when the event is understood but has no preset; None otherwise."""
+    if not COMPOSE_LOCALLY:
+        return None
+    from composer import compose
+    parsed = parse_query(query)
+    plan = compose(strip_audience(parsed.event), parsed.constraints, parsed.audience)
+    if plan is None:
+        return None
+    return composed_response(plan, parsed.constraints, parsed.audience)
+
+
+def _print_result(result: PairingResponse) -> None:
+    _print_header(result)
+    print()  # spacing
+    print(_render_menu_and_drinks(result.menu, result.drinks))
+    _print_footer(result)
+
+
+def _print_header(result: PairingResponse) -> None:
+    print(_banner(result.event))
+
+    meta_lines = []
+    meta_lines.append(("Audience",     result.audience or "—"))
+    meta_lines.append(("Cuisine",      result.cuisine_pref or "Italian"))
+    meta_lines.append(("Constraints",  ", ".join(result.constraints) if result.constraints else "—"))
+    print(_kv_summary(meta_lines))
+
+
+def _print_footer(result: PairingResponse) -> None:
+    print("\nWHY THIS WORKS")
+    print("-" * 16)
+    print(result.rationale.strip())
+
+    if result.sources:
+        print("\nSOURCES")
+        print("-" * 7)
+        print("\n".join(f"• {s}" for s in result.sources))
+
+    print("\nTOOLS")
+    print("-" * 5)
+    print(", ".join(result.tools_used) if result.tools_used else "—")
+
+    if getattr(result, "quote", None):
+        from quantities import format_quote
+        print()
+        print(format_quote(result.quote))
+
+    # A short footer summary (tweak to taste)
+    guests_hint = "Great for family-style sharing."
+    scope_hint = "Grounded in Scittino’s menu & market."
+    print(f"\n✅ {guests_hint}  •  {scope_hint}")
+
+
+class PairingError(Exception):
+    """The agent answered but we couldn't turn it into a PairingResponse."""
+
+    def __init__(self, message: str, model_text: str = ""):
+        super().__init__(message)
+        self.model_text = model_text
+
+
+def _cacheable(parsed, chat_history) -> bool:
+    # Follow-ups like "make it vegetarian" depend on the conversation, not just the text
+    if not chat_history:
+        return True
+    ranked = rank_pairings(parsed.event, limit=1)
+    return bool(ranked) and ranked[0][1] >= LOOKUP_MIN_SCORE
+
+
+def _local_answer(query: str, chat_history) -> Tuple[Optional[PairingResponse], Optional[str]]:
+    """KB fast path, the response cache, then a composed plan. Returns (result, cache key to fill on a miss)."""
+    from cache import response_cache_key
+    from metrics import mark_path, stage
+    from routing import TIERS, classify
+    # Plain preset requests never need the model
+    with stage("kb"):
+        result = kb_fast_path(query)
+    if result is not None:
+        mark_path("kb")
+        return result, None
+
+    with stage("cache"):
+        parsed = parse_query(query)
+        if not _cacheable(parsed, chat_history):
+            return None, None
+        # keyed on the routed tier's model: entries for fast-tier requests were answered by the
+        # fast tier (or smart, after a fallback) and are never served to a smart-tier request
+        model = TIERS[classify(query, chat_history).tier].model
+        cache_key = response_cache_key(parsed, model, prompt_fingerprint())
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            from schema import PairingResponse
+            mark_path("cache")
+            return PairingResponse.model_validate_json(cached), None
 
-    while True:
-        user_in = input("\nWhat event + any constraints? ")
-        if user_in.strip().lower() in {"exit", "quit"}:
-            print("Goodbye!")
-            break
+    # No preset, nothing cached: a standalone event the KB items can cover is composed locally
+    if not chat_history:
+        with stage("compose"):
+            result = compose_fast_path(query)
+        if result is not None:
+            mark_path("composed")
+            return result, None
+    return None, cache_key
 
-        raw = agent_executor.invoke({"query": user_in, "chat_history": chat_history})
 
-        # Normalize Anthropic output to string for parsing
-        model_text = fix_output(raw.get("output", ""))
-        if not model_text:
-            print("No output from model; raw:", raw)
-            continue
+def _model_text(raw) -> str:
+    # Normalize Anthropic output to string for parsing
+    model_text = fix_output(raw.get("output", ""))
+    if not model_text:
+        raise PairingError(f"No output from model; raw: {raw}")
+    return model_text
 
+
+def _parse_locally(model_text: str) -> Optional[PairingResponse]:
+    from metrics import stage
+    from repair import local_repair
+    with stage("parse"):
         try:
-            result = target_parser.parse(model_text)
+            return get_target_parser().parse(model_text)
         except Exception:
-            try:
-                result = fixing_parser.parse(model_text)
-            except Exception as ex:
-                print("Parsing failed. Raw model output:\n", model_text)
-                print("Error:", ex)
-                continue
+            pass
+    with stage("repair"):
+        from schema import PairingResponse
+        return local_repair(model_text, PairingResponse)
+
+
+def parse_model_output(model_text: str) -> PairingResponse:
+    """Pydantic parse, then local JSON repair, and only then an LLM fix. Raises PairingError."""
+    from metrics import stage
+    from repair import REPAIR_STATS
+    result = _parse_locally(model_text)
+    if result is not None:
+        return result
+    try:
+        with stage("fix"):
+            result = get_fixing_parser().parse(model_text)
+    except Exception as ex:
+        REPAIR_STATS["llm_fix_failed"] += 1
+        raise PairingError(str(ex), model_text) from ex
+    REPAIR_STATS["llm_fix"] += 1
+    return result
+
+
+async def aparse_model_output(model_text: str) -> PairingResponse:
+    from metrics import stage
+    from repair import REPAIR_STATS
+    result = _parse_locally(model_text)
+    if result is not None:
+        return result
+    try:
+        with stage("fix"):
+            result = await get_fixing_parser().aparse(model_text)
+    except Exception as ex:
+        REPAIR_STATS["llm_fix_failed"] += 1
+        raise PairingError(str(ex), model_text) from ex
+    REPAIR_STATS["llm_fix"] += 1
+    return result
+
+
+def _cache_deps(query: str, result: PairingResponse) -> List[str]:
+    """Presets a cached answer leans on: the ones shown to the model up front, plus the one it names."""
+    from prefetch import candidate_lookups
+    return current_store().dependency_tags(candidate_lookups(query) + [result.event])
+
+
+def _remember(result: PairingResponse, cache_key: Optional[str], query: str = "") -> PairingResponse:
+    if cache_key is not None:
+        get_response_cache().put(cache_key, result.model_dump_json(), tag=prompt_fingerprint(),
+                                 deps=_cache_deps(query, result))
+    return result
+
+
+# ---------- model tiers ----------
+def _agent_attempts(query: str, chat_history, executor=None) -> List[Tuple[Optional[str], Any, Optional[float]]]:
+    """(tier, executor, timeout) in fallback order for one agent-bound request."""
+    from metrics import current_trace
+    from routing import classify, fallback_chain, record
+    if executor is not None and not isinstance(executor, dict):
+        return [(None, executor, None)]
+    decision = classify(query, chat_history)
+    record(decision, current_trace())
+    return [(t.name, executor[t.name] if executor else get_agent_executor(t.name), t.timeout_s)
+            for t in fallback_chain(decision.tier)]
+
+
+def _agent_inputs(query: str, chat_history) -> Dict[str, Any]:
+    """Agent input with speculative pairing_kb results for the likeliest presets."""
+    from metrics import stage
+    from prefetch import prefetched_messages
+    with stage("prefetch"):
+        prefetched = prefetched_messages(query, chat_history)
+    return {"query": query, "chat_history": chat_history, "prefetched": prefetched}
+
+
+def _agent_output(raw, inputs: Dict[str, Any]) -> str:
+    if inputs["prefetched"]:
+        from prefetch import record_outcome
+        record_outcome(raw)
+    return _model_text(raw)
+
+
+def _raise_final(ex: Exception) -> None:
+    """Out of tiers: timeouts and rate limits become a PairingError the CLI can print."""
+    from scheduler import is_retryable
+    if isinstance(ex, TimeoutError):
+        raise PairingError(str(ex)) from ex
+    if is_retryable(ex):
+        raise PairingError("The model service is busy (rate limited / overloaded); try again in a moment.") from ex
+    raise ex
+
+
+def _invoke_within(agent, inputs, config, timeout: Optional[float], tier: Optional[str] = None):
+    """
+    agent.invoke, given up on after `timeout` seconds. A sync run can't be interrupted, so it
+    runs on its own daemon thread; at the deadline it is cancelled (metrics.cancellable), so
+    it stops at its next model or tool call instead of spending more upstream calls.
+    """
+    if not timeout:
+        return agent.invoke(inputs, config=config)
+    import contextvars
+    import threading
+    from concurrent.futures import Future, TimeoutError as FutureTimeout
+    from metrics import bind_cancel, cancellable
+    fut: Future = Future()
+    cancel = threading.Event()
+    ctx = contextvars.copy_context()   # trace, pinned KB store, scheduler priority
+    ctx.run(bind_cancel, cancel)
+    config = cancellable(config, cancel)
+
+    def run():
+        try:
+            fut.set_result(ctx.run(agent.invoke, inputs, config=config))
+        except BaseException as ex:
+            fut.set_exception(ex)
+
+    threading.Thread(target=run, daemon=True, name="agent").start()
+    try:
+        return fut.result(timeout=timeout)
+    except FutureTimeout:
+        cancel.set()
+        raise TimeoutError(f"{tier} tier took over {timeout:g}s") from None
+
+
+def _run_agent(query: str, chat_history, executor=None) -> PairingResponse:
+    """Agent on the routed tier; a timeout, error or unparseable answer moves up a tier."""
+    from metrics import callbacks_config, current_trace, stage
+    from routing import record_fallback
+    attempts = _agent_attempts(query, chat_history, executor)
+    inputs = _agent_inputs(query, chat_history)
+    for i, (tier, agent, timeout) in enumerate(attempts):
+        try:
+            with stage("agent", tier):
+                t0 = time.perf_counter()
+                raw = _invoke_within(agent, inputs, callbacks_config(), timeout, tier)
+                # AgentExecutor's max_execution_time stops the loop with a placeholder answer
+                if timeout and time.perf_counter() - t0 >= timeout:
+                    raise TimeoutError(f"{tier} tier took over {timeout:g}s")
+            return parse_model_output(_agent_output(raw, inputs))
+        except Exception as ex:
+            if i == len(attempts) - 1:
+                _raise_final(ex)
+            record_fallback(tier, ex, current_trace())
+
+
+async def _arun_agent(query: str, chat_history, executor=None, run=None) -> PairingResponse:
+    """
+    Async twin of _run_agent. `run(tier, agent, inputs)` replaces agent.ainvoke for one
+    tier (streaming.py streams through it); it gets the same timeout and fallback.
+    """
+    import asyncio
+    from metrics import callbacks_config, current_trace, stage
+    from routing import record_fallback
+    attempts = _agent_attempts(query, chat_history, executor)
+    inputs = _agent_inputs(query, chat_history)
+    for i, (tier, agent, timeout) in enumerate(attempts):
+        try:
+            with stage("agent", tier):
+                call = run(tier, agent, inputs) if run else agent.ainvoke(inputs, config=callbacks_config())
+                try:
+                    raw = await asyncio.wait_for(call, timeout)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"{tier} tier took over {timeout:g}s") from None
+            return await aparse_model_output(_agent_output(raw, inputs))
+        except Exception as ex:
+            if i == len(attempts) - 1:
+                _raise_final(ex)
+            record_fallback(tier, ex, current_trace())
+
+
+# ---------- deadline ----------
+# No request waits longer than PAIRINGS_DEADLINE_S (default 25s; 0 = no deadline). When it
+# expires, or the model service stays busy past its retries, the agent run is cancelled
+# (model calls, queued scheduler slots, async tool calls; a sync tool already running in a
+# thread finishes unobserved) and the customer gets the best local answer instead, marked
+# degraded in sources and rationale. Degraded answers are never cached.
+DEADLINE_S = float(os.getenv("PAIRINGS_DEADLINE_S", "25"))
+DEGRADED_SOURCE = "Quick local answer (degraded: assistant timed out)"
+DEGRADED_STATS: Counter = Counter()
 
-        # NEW: Professional output
-        print(_banner(result.event))
 
-        meta_lines = []
-        meta_lines.append(("Audience",     result.audience or "—"))
-        meta_lines.append(("Cuisine",      result.cuisine_pref or "Italian"))
-        meta_lines.append(("Constraints",  ", ".join(result.constraints) if result.constraints else "—"))
-        print(_kv_summary(meta_lines))
+def degraded_response(query: str, chat_history=None, reason: str = "") -> PairingResponse:
+    """
+    Best answer without the model: the closest preset filtered for the request, else a
+    composed plan, else the closest preset as-is with the unchecked constraints called out.
+    """
+    from query import with_last_request
+    parsed = parse_query(with_last_request(query, chat_history))
+    event = strip_audience(parsed.event) or parsed.event
+    keys = [k for k, _ in rank_pairings(event or query, limit=3)] or [next(iter(current_store().presets))]
+    key = keys[0]
+    wanted = list(parsed.constraints) + ([f"{parsed.audience} audience"] if parsed.audience else [])
+
+    result, what, unchecked = None, f"the closest Scittino’s preset ('{key}')", False
+    if not wanted:
+        result = kb_response(key)
+    else:
+        for k in keys:
+            filtered = filter_preset(k, parsed.constraints, parsed.audience)
+            if filtered is not None:
+                result = kb_response(k, parsed.constraints, parsed.audience, filtered)
+                what = f"the closest Scittino’s preset that fits ('{k}')"
+                break
+        if result is None and COMPOSE_LOCALLY:
+            from composer import compose
+            plan = compose(event, parsed.constraints, parsed.audience)
+            if plan is not None:
+                result = composed_response(plan, parsed.constraints, parsed.audience)
+                what = "a plan put together from KB items"
+    if result is None:
+        result, unchecked = kb_response(key), bool(wanted)
+
+    note = f"Quick answer: {reason}, so this is {what} rather than a full recommendation."
+    if unchecked:
+        note += f" It has NOT been checked for {', '.join(wanted)}; please confirm with staff."
+    return result.model_copy(update={
+        "rationale": f"{note} {result.rationale}",
+        "sources": list(result.sources) + [DEGRADED_SOURCE],
+        "constraints": list(parsed.constraints),
+    })
+
+
+def is_degraded(result: PairingResponse) -> bool:
+    return DEGRADED_SOURCE in result.sources
+
+
+def _degrade(query: str, chat_history, kind: str, reason: str) -> PairingResponse:
+    from metrics import current_trace, stage
+    DEGRADED_STATS[kind] += 1
+    trace = current_trace()
+    if trace is not None:
+        trace.degraded = kind
+    with stage("degrade"):
+        return degraded_response(query, chat_history, reason)
+
 
-        print()  # spacing
-        print(_render_menu_and_drinks(result.menu, result.drinks))
+async def _agent_within_deadline(run, query: str, chat_history, deadline_s: float,
+                                 started: float) -> Tuple[PairingResponse, bool]:
+    """(agent answer, False), or (degraded local answer, True) once the deadline passes."""
+    import asyncio
+    from scheduler import is_retryable
+    if not deadline_s:
+        return await run, False
+    try:
+        return await asyncio.wait_for(run, max(0.0, started + deadline_s - time.monotonic())), False
+    except asyncio.TimeoutError:
+        if time.monotonic() < started + deadline_s:
+            raise
+        return _degrade(query, chat_history, "deadline", f"no answer within {deadline_s:g}s"), True
+    except PairingError as ex:
+        if not (is_retryable(ex) or isinstance(ex.__cause__, TimeoutError)):
+            raise
+        return _degrade(query, chat_history, "busy", "the model service is slow or overloaded right now"), True
 
-        print("\nWHY THIS WORKS")
-        print("-" * 16)
-        print(result.rationale.strip())
 
-        if result.sources:
-            print("\nSOURCES")
-            print("-" * 7)
-            print("\n".join(f"• {s}" for s in result.sources))
+def degraded_summary() -> str:
+    if not DEGRADED_STATS:
+        return "deadline: no degraded answers"
+    return f"deadline: {sum(DEGRADED_STATS.values())} degraded answers (" + \
+        ", ".join(f"{k}={v}" for k, v in sorted(DEGRADED_STATS.items())) + ")"
 
-        print("\nTOOLS")
-        print("-" * 5)
-        print(", ".join(result.tools_used) if result.tools_used else "—")
 
-        # A short footer summary (tweak to taste)
-        guests_hint = "Great for family-style sharing."
-        scope_hint = "Grounded in Scittino’s menu & market."
-        print(f"\n✅ {guests_hint}  •  {scope_hint}")
+def _quoted(result: PairingResponse, query: str) -> PairingResponse:
+    """Attach the local quantity/cost quote when the request names a headcount."""
+    headcount = parse_query(query).headcount
+    if not headcount:
+        return result
+    from metrics import stage
+    from quantities import with_quote
+    with stage("quote"):
+        return with_quote(result, headcount)
 
 
-        # Optional save
-        save = input("Save this to pairings_output.txt? [y/n] ").strip().lower()
-        if save == "y":
-            from tools import save_to_txt
-            save_msg = save_to_txt(model_text)
-            print(save_msg)
+def plan_pairing(query: str, chat_history: Optional[List[Dict[str, Any]]] = None,
+                 quote: bool = True) -> PairingResponse:
+    """
+    KB fast path, the response cache, a composed plan, then the agent. Raises PairingError.
+    Only the per-tier timeouts apply here (a hung tier is abandoned, not waited out); the
+    request deadline needs aplan_pairing.
+    """
+    from metrics import mark_path, trace_request
+    chat_history = chat_history or []
+    with trace_request(query), pinned_store():
+        result, cache_key = _local_answer(query, chat_history)
+        if result is None:
+            mark_path("agent")
+            result = _remember(_run_agent(query, chat_history), cache_key, query)
+        return _quoted(result, query) if quote else result
+
 
-        # Chat history for context
-        chat_history.append({"role": "user", "content": user_in})
-        chat_history.append({"role": "assistant", "content": model_text})
+async def aplan_pairing(query: str, chat_history: Optional[List[Dict[str, Any]]] = None,
+                        quote: bool = True, executor=None, deadline_s: Optional[float] = None) -> PairingResponse:
+    """
+    Async twin of plan_pairing (uses the agent's ainvoke). `executor` overrides the shared
+    agent: one executor skips routing, a {tier: executor} dict (stub models) keeps it.
+    Past `deadline_s` (default DEADLINE_S; 0 = none) the answer is degraded_response().
+    """
+    from metrics import mark_path, trace_request
+    started = time.monotonic()
+    chat_history = chat_history or []
+    deadline_s = DEADLINE_S if deadline_s is None else deadline_s
+    with trace_request(query), pinned_store():
+        result, cache_key = _local_answer(query, chat_history)
+        if result is None:
+            mark_path("agent")
+            result, degraded = await _agent_within_deadline(
+                _arun_agent(query, chat_history, executor), query, chat_history, deadline_s, started)
+            if not degraded:
+                _remember(result, cache_key, query)
+        return _quoted(result, query) if quote else result
+
+
+@lru_cache(maxsize=None)
+def get_history():
+    from history import HistoryStore
+    return HistoryStore()
+
+
+# ---------- simple in-memory chat loop ----------
+_REQUOTE_RE = re.compile(r"^\s*(?:re-?quote|quote|for)?\s*(\d{1,5})\s*(?:people|guests|ppl|pax)?\s*$", re.I)
+
+
+def run_cli(stream: bool = False):
+    import asyncio
+    from metrics import get_recorder, stage, trace_request
+    from repair import repair_summary
+    from routing import routing_summary
+    from session import DEFAULT_MAX_TURNS, SessionHistory
+    from snapshot import snapshot_summary
+
+    print("🍽️ Pairings Assistant — type 'exit' to quit, or a headcount ('quote 120') to re-size the last plan.")
+    # Compact summaries of the last few pairings, not the full JSON of every answer
+    session = SessionHistory(int(os.getenv("PAIRINGS_HISTORY_TURNS", DEFAULT_MAX_TURNS)))
+    if KB_WATCH:
+        watch_kb()
+
+    # One event loop for the whole session: the cached model clients keep async HTTP
+    # connections bound to the loop they were first used on.
+    with asyncio.Runner() as runner:
+        last = None
+        while True:
+            user_in = input("\nWhat event + any constraints? ")
+            m = _REQUOTE_RE.match(user_in)
+            if m and last is not None:
+                # "quote 120" / "for 120": re-size the last plan locally, no agent round trip
+                from quantities import format_quote, with_quote
+                last = with_quote(last, int(m.group(1)))
+                if getattr(last, "quote", None):
+                    print(format_quote(last.quote))
+                continue
+            if user_in.strip().lower() in {"exit", "quit"}:
+                print(get_response_cache().summary())
+                if "tools" in sys.modules:
+                    print(sys.modules["tools"].tool_summary())
+                print(repair_summary())
+                print(routing_summary())
+                from prefetch import prefetch_summary
+                print(prefetch_summary())
+                print(snapshot_summary())
+                from scheduler import scheduler_summary
+                print(scheduler_summary())
+                print(degraded_summary())
+                print(get_recorder().summary())
+                print("Goodbye!")
+                break
+
+            chat_history = session.messages()
+            with trace_request(user_in) as trace:
+                try:
+                    if stream:
+                        # Sections print as they arrive
+                        from streaming import stream_and_print
+                        with stage("stream"):
+                            result = runner.run(stream_and_print(user_in, chat_history))
+                    else:
+                        # async path: tool calls from one model turn run concurrently
+                        result = runner.run(aplan_pairing(user_in, chat_history))
+                except PairingError as ex:
+                    trace.error = f"PairingError: {ex}"
+                    if ex.model_text:
+                        print("Parsing failed. Raw model output:\n", ex.model_text)
+                    print("Error:", ex)
+                    continue
+
+                # NEW: Professional output
+                if not stream:
+                    with stage("render"):
+                        _print_result(result)
+
+            # Optional save (export cards later with `python history.py export pairings_output.txt`)
+            save = input("Save this pairing to history? [y/n] ").strip().lower()
+            if save == "y":
+                history = get_history()
+                history.add(result, query=user_in)
+                history.flush()
+                print(f"✅ Pairing saved to {history.path}")
+
+            # Chat history for context
+            session.add(user_in, result)
+            last = result
 
 def fix_output(output):
     """
@@ -316,5 +1008,46 @@ def fix_output(output):
     return str(output)
 
 
+# ---------- startup budget ----------
+IMPORT_MS = (time.perf_counter() - _IMPORT_T0) * 1000
+STARTUP_BUDGET_MS = float(os.getenv("PAIRINGS_STARTUP_BUDGET_MS", "50"))
+_HEAVY_MODULES = ("langchain", "langchain_core", "langchain_anthropic", "langchain_community",
+                  "anthropic", "pydantic", "tabulate", "duckduckgo_search", "ddgs", "wikipedia", "numpy")
+
+
+def startup_report(budget_ms: float = STARTUP_BUDGET_MS) -> bool:
+    """Print how long importing this module took and which heavy deps got pulled in."""
+    loaded = [m for m in _HEAVY_MODULES if m in sys.modules]
+    print(f"main.py import: {IMPORT_MS:.1f} ms (budget {budget_ms:.0f} ms)")
+    print("heavy modules loaded:", ", ".join(loaded) if loaded else "none")
+    return IMPORT_MS <= budget_ms and not loaded
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Scittino’s pairing assistant.")
+    ap.add_argument("--startup-check", action="store_true",
+                    help="report import time / heavy modules and exit non-zero if over budget")
+    ap.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    ap.add_argument("--kb", metavar="EVENT",
+                    help="answer one request from the KB only: a preset, or a plan composed from KB items (no model)")
+    ap.add_argument("--stream", action="store_true", help="print menu sections as the model streams them")
+    args = ap.parse_args(argv)
+
+    if args.startup_check:
+        return 0 if startup_report(args.budget_ms) else 1
+    if args.kb:
+        result = kb_fast_path(args.kb) or compose_fast_path(args.kb)
+        if result is None:
+            print(f"No KB preset for {args.kb!r}. Closest:",
+                  ", ".join(k for k, _ in rank_pairings(args.kb, limit=3)) or "—")
+            return 1
+        result = _quoted(result, args.kb)
+        _print_result(result)
+        return 0
+    run_cli(stream=args.stream)
+    return 0
+
+
 if __name__ == "__main__":
-    run_cli()
+    sys.exit(main())
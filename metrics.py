@@ -0,0 +1,341 @@
+# metrics.py
+# Per-request timing / token instrumentation. Every pairing request gets a RequestTrace
+# with wall-clock time per stage (kb, cache, llm calls, tool calls, parse, fix, render),
+# token counts and the tools that ran. Finished traces are appended to a JSONL file and
+# aggregated in memory for p50/p95 summaries or a Prometheus-style text dump.
+#
+#     python metrics.py pairings_metrics.jsonl          # p50/p95 per stage from a log
+#     python metrics.py pairings_metrics.jsonl --prom   # same, Prometheus text format
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+MAX_SAMPLES = 10000  # per stage, for in-memory percentiles
+
+_current: contextvars.ContextVar = contextvars.ContextVar("pairing_trace", default=None)
+
+
+class RequestTrace:
+    def __init__(self, query: str):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.query = query
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.tools: List[str] = []
+        self.path: Optional[str] = None   # "kb", "cache" or "agent"; later stages may add more
+        self.route: Optional[str] = None  # "<route>/<tier>" for agent requests (routing.py)
+        self.fallbacks: List[str] = []    # tiers that failed over, "fast:timeout"
+        self.degraded: Optional[str] = None  # "deadline" / "busy": answered locally instead
+        self.error: Optional[str] = None
+        self.total_ms = 0.0
+
+    def add_stage(self, stage: str, ms: float, name: Optional[str] = None, **extra) -> None:
+        rec = {"stage": stage, "ms": round(ms, 3)}
+        if name:
+            rec["name"] = name
+        rec.update(extra)
+        self.stages.append(rec)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "ts": round(self.started, 3),
+            "query": self.query,
+            "path": self.path,
+            "route": self.route,
+            "fallbacks": self.fallbacks,
+            "degraded": self.degraded,
+            "total_ms": round(self.total_ms, 3),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "tools": self.tools,
+            "stages": self.stages,
+            "error": self.error,
+        }
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str, label: Optional[str] = None):
+    """Time a block as a stage of the current request (no-op outside a request)."""
+    trace = _current.get()
+    t0 = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        if trace is not None:
+            trace.add_stage(name, (time.perf_counter() - t0) * 1000, label)
+
+
+def mark_path(path: str) -> None:
+    trace = _current.get()
+    if trace is not None and trace.path is None:
+        trace.path = path
+
+
+# ---------- aggregation ----------
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile; q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+class MetricsRecorder:
+    """Collects finished traces: JSONL sink plus rolling per-stage samples."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.tokens = {"input": 0, "output": 0}
+
+    def record(self, trace: RequestTrace) -> None:
+        with self._lock:
+            self._aggregate(trace.to_dict())
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+
+    def _aggregate(self, rec: Dict[str, Any]) -> None:
+        self.counts["requests"] += 1
+        self.counts[f"path:{rec.get('path') or 'unknown'}"] += 1
+        if rec.get("route"):
+            self.counts[f"route:{rec['route']}"] += 1
+        for f in rec.get("fallbacks") or []:
+            self.counts[f"fallback:{f}"] += 1
+        if rec.get("degraded"):
+            self.counts[f"degraded:{rec['degraded']}"] += 1
+        if rec.get("error"):
+            self.counts["errors"] += 1
+        self.samples["total"].append(rec.get("total_ms", 0.0))
+        for s in rec.get("stages", []):
+            key = s["stage"] if not s.get("name") else f"{s['stage']}:{s['name']}"
+            self.samples[key].append(s["ms"])
+        for tool in rec.get("tools", []):
+            self.counts[f"tool:{tool}"] += 1
+        self.tokens["input"] += rec.get("input_tokens", 0)
+        self.tokens["output"] += rec.get("output_tokens", 0)
+
+    def load(self, records: Iterable[Dict[str, Any]]) -> "MetricsRecorder":
+        for rec in records:
+            self._aggregate(rec)
+        return self
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<28} {'n':>6} {'p50 ms':>10} {'p95 ms':>10}"]
+        for key in sorted(self.samples, key=lambda k: (k != "total", k)):
+            vals = list(self.samples[key])
+            lines.append(f"{key:<28} {len(vals):>6} {percentile(vals, 50):>10.1f} {percentile(vals, 95):>10.1f}")
+        lines.append(f"tokens: {self.tokens['input']} in / {self.tokens['output']} out; "
+                     + ", ".join(f"{k}={v}" for k, v in sorted(self.counts.items())))
+        return "\n".join(lines)
+
+    def prometheus_text(self) -> str:
+        out = ["# TYPE pairing_stage_ms summary"]
+        for key, vals in sorted(self.samples.items()):
+            vals = list(vals)
+            label = key.replace('"', "'")
+            for q in (0.5, 0.95):
+                out.append(f'pairing_stage_ms{{stage="{label}",quantile="{q}"}} {percentile(vals, q * 100):.3f}')
+            out.append(f'pairing_stage_ms_sum{{stage="{label}"}} {sum(vals):.3f}')
+            out.append(f'pairing_stage_ms_count{{stage="{label}"}} {len(vals)}')
+        out.append("# TYPE pairing_tokens_total counter")
+        for kind, n in self.tokens.items():
+            out.append(f'pairing_tokens_total{{kind="{kind}"}} {n}')
+        out.append("# TYPE pairing_events_total counter")
+        for key, n in sorted(self.counts.items()):
+            out.append(f'pairing_events_total{{event="{key}"}} {n}')
+        return "\n".join(out) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_recorder() -> MetricsRecorder:
+    # Empty PAIRINGS_METRICS disables the JSONL sink but keeps in-memory stats
+    return MetricsRecorder(os.getenv("PAIRINGS_METRICS", "pairings_metrics.jsonl") or None)
+
+
+@contextmanager
+def trace_request(query: str):
+    """
+    Open a trace for one request, or join the one already open (run_cli wraps
+    planning + rendering; plan_pairing opens its own when called directly).
+    """
+    existing = _current.get()
+    if existing is not None:
+        yield existing
+        return
+    trace = RequestTrace(query)
+    token = _current.set(trace)
+    try:
+        yield trace
+    except BaseException as ex:
+        trace.error = f"{type(ex).__name__}: {ex}"
+        raise
+    finally:
+        _current.reset(token)
+        trace.total_ms = (time.perf_counter() - trace._t0) * 1000
+        get_recorder().record(trace)
+
+
+# ---------- LangChain callbacks ----------
+@lru_cache(maxsize=None)
+def _handler_class():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TraceCallbackHandler(BaseCallbackHandler):
+        """Times LLM and tool runs of one agent invocation into a RequestTrace."""
+
+        def __init__(self, trace: RequestTrace):
+            self.trace = trace
+            self._starts: Dict[Any, tuple] = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            name = (kwargs.get("invocation_params") or {}).get("model") or (serialized or {}).get("name")
+            self._starts[run_id] = (time.perf_counter(), name)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._starts[run_id] = (time.perf_counter(), (serialized or {}).get("name"))
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            t0, name = self._starts.pop(run_id, (time.perf_counter(), None))
+            tin, tout = _usage(response)
+            self.trace.input_tokens += tin
+            self.trace.output_tokens += tout
+            extra = {"input_tokens": tin, "output_tokens": tout}
+            cached = _cache_read_tokens(response)
+            if cached:
+                extra["cache_read_tokens"] = cached
+            self.trace.add_stage("llm", (time.perf_counter() - t0) * 1000, name, **extra)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            t0, name = self._starts.pop(run_id, (time.perf_counter(), None))
+            self.trace.add_stage("llm", (time.perf_counter() - t0) * 1000, name, error=type(error).__name__)
+
+        def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+            self._starts[run_id] = (time.perf_counter(), (serialized or {}).get("name") or kwargs.get("name"))
+
+        def on_tool_end(self, output, *, run_id, **kwargs):
+            t0, name = self._starts.pop(run_id, (time.perf_counter(), None))
+            self.trace.tools.append(name or "tool")
+            self.trace.add_stage("tool", (time.perf_counter() - t0) * 1000, name)
+
+        def on_tool_error(self, error, *, run_id, **kwargs):
+            t0, name = self._starts.pop(run_id, (time.perf_counter(), None))
+            self.trace.tools.append(name or "tool")
+            self.trace.add_stage("tool", (time.perf_counter() - t0) * 1000, name, error=type(error).__name__)
+
+    return TraceCallbackHandler
+
+
+def _usage(response) -> tuple:
+    """(input, output) tokens from an LLMResult, Anthropic-style or usage_metadata."""
+    usage = (getattr(response, "llm_output", None) or {}).get("usage") or {}
+    tin = usage.get("input_tokens") or 0
+    tout = usage.get("output_tokens") or 0
+    if not (tin or tout):
+        for gens in getattr(response, "generations", []) or []:
+            for g in gens:
+                meta = getattr(getattr(g, "message", None), "usage_metadata", None) or {}
+                tin += meta.get("input_tokens", 0)
+                tout += meta.get("output_tokens", 0)
+    return int(tin), int(tout)
+
+
+def _cache_read_tokens(response) -> int:
+    """Prompt-cache hits reported by Anthropic (the static system prefix)."""
+    usage = (getattr(response, "llm_output", None) or {}).get("usage") or {}
+    return int(usage.get("cache_read_input_tokens") or 0)
+
+
+def callbacks_config() -> Dict[str, Any]:
+    """RunnableConfig that feeds LLM/tool timings into the current trace."""
+    trace = _current.get()
+    if trace is None:
+        return {}
+    return {"callbacks": [_handler_class()(trace)]}
+
+
+# ---------- cancellation ----------
+# A sync agent run that overshoots its deadline can't be interrupted, only abandoned on its
+# thread. The caller sets the run's Event instead: the run's next model or tool call raises
+# RunCancelled, and tools.py neither starts client calls nor caches results for it.
+_cancel: contextvars.ContextVar = contextvars.ContextVar("pairing_cancel", default=None)
+
+
+class RunCancelled(Exception):
+    """The caller gave up on this agent run."""
+
+
+def cancelled() -> bool:
+    event = _cancel.get()
+    return event is not None and event.is_set()
+
+
+def bind_cancel(event: threading.Event) -> None:
+    """Tie the current context (a copied one, for an agent thread) to `event`."""
+    _cancel.set(event)
+
+
+@lru_cache(maxsize=None)
+def _cancel_handler_class():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class CancelCallbackHandler(BaseCallbackHandler):
+        """Stops an abandoned run at its next model / tool call."""
+        raise_error = True   # LangChain swallows callback errors otherwise
+
+        def __init__(self, event: threading.Event):
+            self.event = event
+
+        def _check(self, *args, **kwargs):
+            if self.event.is_set():
+                raise RunCancelled("agent run abandoned by its caller")
+
+        on_chat_model_start = on_llm_start = on_tool_start = _check
+
+    return CancelCallbackHandler
+
+
+def cancellable(config: Optional[Dict[str, Any]], event: threading.Event) -> Dict[str, Any]:
+    """`config` plus a callback that raises RunCancelled once `event` is set."""
+    config = dict(config or {})
+    config["callbacks"] = list(config.get("callbacks") or []) + [_cancel_handler_class()(event)]
+    return config
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Summarize a pairings metrics JSONL log.")
+    ap.add_argument("log", nargs="?", default="pairings_metrics.jsonl")
+    ap.add_argument("--prom", action="store_true", help="Prometheus text exposition format")
+    args = ap.parse_args(argv)
+
+    with open(args.log, encoding="utf-8") as f:
+        recorder = MetricsRecorder().load(json.loads(line) for line in f if line.strip())
+    if args.prom:
+        print(recorder.prometheus_text(), end="")
+    else:
+        print(recorder.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,68 @@
+# prefetch.py
+# Speculative KB lookups. Before the first model call, `pairing_kb` runs locally for the
+# likeliest presets and the results go into the agent scratchpad as an already-answered
+# tool call, so the model can usually answer in one completion instead of spending a
+# turn on asking for them. A request is a hit when the model never calls pairing_kb
+# itself; every hit saves one model turn.
+#
+#     PAIRINGS_PREFETCH=0   off
+import os
+from collections import Counter
+from typing import Any, Dict, List
+
+from kb import rank_pairings, resolve_preset
+from query import parse_query, strip_audience, with_last_request
+
+PREFETCH_ENABLED = os.getenv("PAIRINGS_PREFETCH", "1") != "0"
+MAX_PRESETS = 2
+MIN_SCORE = 0.3   # below LOOKUP_MIN_SCORE on purpose: near misses are worth showing too
+
+PREFETCH_STATS: Counter = Counter()
+
+
+def candidate_lookups(query: str, chat_history=None) -> List[str]:
+    """pairing_kb inputs worth running up front: the top preset names, else the event itself."""
+    parsed = parse_query(with_last_request(query, chat_history))
+    event = strip_audience(parsed.event) or parsed.event
+    key = resolve_preset(event)
+    if key:
+        return [key]
+    keys = [k for k, score in rank_pairings(event, limit=MAX_PRESETS) if score >= MIN_SCORE]
+    # nothing close: the NO_MATCH + closest-presets answer is what the model would get anyway
+    return keys or [event or query]
+
+
+def prefetched_messages(query: str, chat_history=None) -> List[Any]:
+    """[AIMessage(pairing_kb calls), ToolMessage...] for the scratchpad; [] when disabled."""
+    if not PREFETCH_ENABLED:
+        return []
+    from langchain_core.messages import AIMessage, ToolMessage
+    from tools import pairing_kb
+
+    lookups = candidate_lookups(query, chat_history)
+    calls = [{"name": "pairing_kb", "args": {"__arg1": arg}, "id": f"prefetch_{i}"}
+             for i, arg in enumerate(lookups)]
+    out: List[Any] = [AIMessage(content="", tool_calls=calls)]
+    out += [ToolMessage(content=pairing_kb(c["args"]["__arg1"]), tool_call_id=c["id"], name="pairing_kb")
+            for c in calls]
+    PREFETCH_STATS["requests"] += 1
+    PREFETCH_STATS["lookups"] += len(calls)
+    return out
+
+
+def record_outcome(raw: Dict[str, Any]) -> bool:
+    """Count a hit (model answered without its own pairing_kb call) from the agent output."""
+    steps = raw.get("intermediate_steps") or []
+    hit = not any(getattr(action, "tool", None) == "pairing_kb" for action, _ in steps)
+    PREFETCH_STATS["hits" if hit else "misses"] += 1
+    if hit:
+        PREFETCH_STATS["turns_saved"] += 1
+    return hit
+
+
+def prefetch_summary() -> str:
+    n = PREFETCH_STATS["hits"] + PREFETCH_STATS["misses"]
+    if not n:
+        return "prefetch: no agent requests"
+    return (f"prefetch: {PREFETCH_STATS['hits']}/{n} hits ({PREFETCH_STATS['hits'] / n:.0%}), "
+            f"{PREFETCH_STATS['turns_saved']} model turns saved, {PREFETCH_STATS['lookups']} lookups")
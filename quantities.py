@@ -0,0 +1,140 @@
+# quantities.py
+# Headcount -> trays, pizzas, pounds and drink counts, priced from the portion table in
+# kb.json. Every guest gets one portion per food section (split evenly over that section's
+# items) and DRINKS_PER_GUEST drinks. The math runs on NumPy arrays, so a whole batch of
+# orders, or one menu at many headcounts, is sized in a single pass.
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from kb import KBStore, Portion, current_store
+
+OVERAGE = 1.1            # a little extra so the last guests in line still eat
+DRINKS_PER_GUEST = 2.0
+
+# used when the model suggests something that has no portion row
+SECTION_DEFAULTS = {
+    "appetizers": Portion("half tray", 10, 45.0),
+    "mains": Portion("half tray", 10, 65.0),
+    "sides": Portion("half tray", 12, 35.0),
+    "desserts": Portion("dozen", 12, 30.0),
+    "alcoholic": Portion("bottle", 4, 18.0),
+    "non_alcoholic": Portion("bottle", 1, 2.0),
+}
+FOOD_SECTIONS = ("appetizers", "mains", "sides", "desserts")
+DRINK_SECTIONS = ("alcoholic", "non_alcoholic")
+
+
+class _Lines(NamedTuple):
+    """Flattened menu rows of one or more orders, ready for array math."""
+    order: np.ndarray      # order index per row
+    share: np.ndarray      # servings per guest this row has to cover
+    serves: np.ndarray
+    price: np.ndarray
+    items: List[str]
+    sections: List[str]
+    units: List[str]
+    estimated: List[bool]
+
+
+def _rows(result, store: KBStore):
+    """(section, item, portion, estimated, share) for every item of one PairingResponse."""
+    menu = result.menu.model_dump()
+    drinks = result.drinks.model_dump()
+    n_drinks = sum(len(drinks.get(s) or []) for s in DRINK_SECTIONS)
+    for section in FOOD_SECTIONS + DRINK_SECTIONS:
+        items = (menu if section in FOOD_SECTIONS else drinks).get(section) or []
+        share = 1.0 / max(1, len(items)) if section in FOOD_SECTIONS else DRINKS_PER_GUEST / max(1, n_drinks)
+        for item in items:
+            portion = store.portions.get(item.casefold())
+            yield section, item, portion or SECTION_DEFAULTS[section], portion is None, share
+
+
+def _flatten(results: Sequence, store: KBStore) -> _Lines:
+    order, share, serves, price = [], [], [], []
+    items, sections, units, estimated = [], [], [], []
+    for i, result in enumerate(results):
+        for section, item, portion, est, s in _rows(result, store):
+            order.append(i)
+            share.append(s)
+            serves.append(portion.serves)
+            price.append(portion.price)
+            items.append(item)
+            sections.append(section)
+            units.append(portion.unit)
+            estimated.append(est)
+    return _Lines(np.asarray(order, dtype=np.intp), np.asarray(share, dtype=float),
+                  np.asarray(serves, dtype=float), np.asarray(price, dtype=float),
+                  items, sections, units, estimated)
+
+
+def _quantities(headcounts: np.ndarray, share: np.ndarray, serves: np.ndarray) -> np.ndarray:
+    # guests each row has to cover / guests per unit, rounded up to whole units
+    return np.ceil(headcounts * share * OVERAGE / serves - 1e-9).astype(np.int64)
+
+
+def quote_many(results: Sequence, headcounts: Sequence[int], store: Optional[KBStore] = None) -> list:
+    """One Quote per (result, headcount) pair, all sized in one vectorized pass."""
+    from schema import Quote, QuoteLine
+
+    store = store or current_store()
+    lines = _flatten(results, store)
+    heads = np.asarray(headcounts, dtype=float)
+    qty = _quantities(heads[lines.order], lines.share, lines.serves)
+    subtotal = np.round(qty * lines.price, 2)
+    totals = np.bincount(lines.order, weights=subtotal, minlength=len(results))
+    # rows are grouped by order, so each order is one contiguous slice
+    ends = np.cumsum(np.bincount(lines.order, minlength=len(results)))
+    qty_l, sub_l, price_l = qty.tolist(), subtotal.tolist(), lines.price.tolist()
+
+    quotes = []
+    for i, (n, total) in enumerate(zip(headcounts, totals)):
+        rows = range(ends[i - 1] if i else 0, ends[i])
+        quotes.append(Quote(
+            headcount=int(n),
+            lines=[QuoteLine(item=lines.items[r], section=lines.sections[r], unit=lines.units[r],
+                             qty=qty_l[r], unit_price=price_l[r],
+                             subtotal=sub_l[r], estimated=lines.estimated[r])
+                   for r in rows],
+            total=round(float(total), 2),
+            per_guest=round(float(total) / n, 2) if n else 0.0,
+        ))
+    return quotes
+
+
+def quote(result, headcount: int, store: Optional[KBStore] = None):
+    return quote_many([result], [headcount], store)[0]
+
+
+def attach_quote(result, q):
+    """QuotedPairing: the answer's fields plus q and its headcount (result is not copied)."""
+    from schema import QuotedPairing
+    return QuotedPairing.model_construct(**{**dict(result), "headcount": q.headcount, "quote": q})
+
+
+def with_quote(result, headcount: Optional[int]):
+    """QuotedPairing with headcount + quote filled in (result unchanged if no headcount)."""
+    if not headcount:
+        return result
+    return attach_quote(result, quote(result, headcount))
+
+
+def total_curve(result, headcounts: Sequence[int], store: Optional[KBStore] = None) -> np.ndarray:
+    """Order totals for one menu across many headcounts (rows x headcounts matrix, summed)."""
+    lines = _flatten([result], store or current_store())
+    heads = np.asarray(headcounts, dtype=float)[:, None]
+    qty = _quantities(heads, lines.share[None, :], lines.serves[None, :])
+    return np.round(qty * lines.price[None, :], 2).sum(axis=1)
+
+
+def format_quote(q) -> str:
+    width = max([len(line.item) for line in q.lines] + [4])
+    out = [f"QUOTE for {q.headcount} guests", "-" * (width + 34)]
+    for line in q.lines:
+        mark = "*" if line.estimated else " "
+        out.append(f"{line.item:<{width}} {line.qty:>4} × {line.unit:<10} ${line.subtotal:>9,.2f}{mark}")
+    out.append("-" * (width + 34))
+    out.append(f"{'Total':<{width}} {'':>17} ${q.total:>9,.2f}  (${q.per_guest:,.2f}/guest)")
+    if any(line.estimated for line in q.lines):
+        out.append("* no portion row for this item; priced at the section default")
+    return "\n".join(out)
@@ -0,0 +1,96 @@
+# query.py
+import re
+from typing import List, NamedTuple, Optional
+
+from kb import normalize_event
+
+# canonical constraint -> phrases customers actually type
+ConstraintPhrases = {
+    "vegetarian": [r"vegetarian", r"veggie", r"meatless", r"no meat"],
+    "vegan": [r"vegan", r"plant[- ]based"],
+    "nut-free": [r"nut[- ]free", r"no nuts?", r"nut allerg(?:y|ies)", r"peanut[- ]free"],
+    "gluten-free": [r"gluten[- ]free", r"no gluten", r"celiac", r"\bgf\b"],
+    "dairy-free": [r"dairy[- ]free", r"no dairy", r"lactose[- ]free"],
+    "halal": [r"halal"],
+    "kosher": [r"kosher"],
+    "non-alcoholic": [r"non[- ]?alcoholic", r"no alcohol", r"alcohol[- ]free", r"\bdry\b", r"no booze"],
+    "budget:$": [r"cheap", r"on a budget", r"low budget", r"inexpensive", r"(?<!\$)\$(?!\$)"],
+    "budget:$$": [r"moderate(?:ly[- ]priced)?", r"mid[- ]?range", r"mid[- ]?priced", r"(?<!\$)\$\$(?!\$)"],
+    "budget:$$$": [r"premium", r"upscale", r"high[- ]end", r"\$\$\$"],
+}
+
+AudiencePhrases = {
+    "kids": [r"kids?", r"children", r"child", r"toddlers?", r"teens?", r"minors?"],
+    "21+": [r"21\+", r"adults? only", r"grown[- ]ups? only"],
+    "adults": [r"adults?", r"grown[- ]ups?"],
+    "mixed": [r"mixed(?: ages)?", r"all ages", r"families", r"family"],
+}
+
+_CONSTRAINT_RES = {c: re.compile("|".join(p), re.I) for c, p in ConstraintPhrases.items()}
+# First match wins, so "adults only" is tried before plain "adults"
+_AUDIENCE_RES = [(a, re.compile(r"\b(?:" + "|".join(p) + r")(?!\w)", re.I)) for a, p in AudiencePhrases.items()]
+_UNITS = r"(?:people|persons|guests|ppl|pax|folks|adults|kids|heads)"
+_HEADCOUNT_RE = re.compile(
+    r"\b(?:for|feeds?|serves?|serving|x)\s*(\d{1,4})\b(?:\s*" + _UNITS + r"\b)?"
+    r"|\b(\d{1,4})\s*" + _UNITS + r"\b",
+    re.I,
+)
+# audience qualifiers that aren't part of any event name
+_AUDIENCE_STRIP_RE = re.compile(r"21\+|\b(?:adults?|grown[- ]ups?) only\b|\b(?:mixed|all) ages\b", re.I)
+
+# explicit field, e.g. from batch.row_to_query: overrides audience words in the event name
+# ("kids birthday, audience: mixed"); left in place when the value isn't a known audience
+_AUDIENCE_FIELD_RE = re.compile(r"\baudience\s*[:=]\s*([^,;]*)", re.I)
+
+
+class ParsedQuery(NamedTuple):
+    event: str                  # normalized event words, constraints/headcount stripped
+    audience: Optional[str]
+    constraints: List[str]      # canonical, sorted
+    headcount: Optional[int]
+
+
+def parse_query(text: str) -> ParsedQuery:
+    """Pull audience, dietary/budget constraints and headcount out of a free-text request."""
+    text = text or ""
+    constraints = sorted(c for c, rx in _CONSTRAINT_RES.items() if rx.search(text))
+    if "vegan" in constraints and "vegetarian" not in constraints:
+        constraints = sorted(constraints + ["vegetarian"])
+
+    audience = None
+    field = _AUDIENCE_FIELD_RE.search(text)
+    if field:
+        hit = next(((a, m) for a, rx in _AUDIENCE_RES if (m := rx.search(field.group(1)))), None)
+        if hit:
+            audience, m = hit
+            text = f"{text[:field.start()]} {text[field.start(1) + m.end():]}"
+    audience = audience or next((a for a, rx in _AUDIENCE_RES if rx.search(text)), None)
+
+    headcount = None
+    m = _HEADCOUNT_RE.search(text)
+    if m:
+        headcount = int(m.group(1) or m.group(2))
+
+    rest = _AUDIENCE_STRIP_RE.sub(" ", _HEADCOUNT_RE.sub(" ", text))
+    for rx in _CONSTRAINT_RES.values():
+        rest = rx.sub(" ", rest)
+    return ParsedQuery(normalize_event(rest), audience, constraints, headcount)
+
+
+_AUDIENCE_WORDS_RE = re.compile(
+    r"\b(?:for|with)?\s*(?:the\s+)?(?:" + "|".join(p for ps in AudiencePhrases.values() for p in ps) + r")(?!\w)",
+    re.I,
+)
+
+
+def strip_audience(event: str) -> str:
+    """'pizza night for kids' -> 'pizza night' (only used when the full event didn't resolve)."""
+    return normalize_event(_AUDIENCE_WORDS_RE.sub(" ", event))
+
+
+def with_last_request(query: str, chat_history) -> str:
+    """'make it vegetarian' -> 'pizza night, make it vegetarian' given the session's last request."""
+    for msg in reversed(chat_history or []):
+        if isinstance(msg, dict) and msg.get("role") == "user":
+            return f"{msg.get('content', '')}, {query}"
+    return query
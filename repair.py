@@ -0,0 +1,196 @@
+# repair.py
+# Local, no-LLM repair of almost-JSON model output. Runs before OutputFixingParser so a
+# stray trailing comma or smart quote doesn't cost a second Claude round trip.
+import ast
+import json
+import re
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+# "parsed:<strategy>", "coerced", "failed", "llm_fix", "llm_fix_failed" -> count
+REPAIR_STATS: Counter = Counter()
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.S)
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "‘": "'", "’": "'"})
+
+MENU_KEYS = ("appetizers", "mains", "sides", "desserts")
+
+
+def extract_json_span(text: str) -> Optional[str]:
+    """First balanced {...} in text, ignoring braces inside strings (unlike a greedy regex)."""
+    m = _FENCE_RE.search(text)
+    if m and "{" in m.group(1):
+        text = m.group(1)
+    start = text.find("{")
+    while start != -1:
+        depth, in_str, esc, quote = 0, False, False, ""
+        for i in range(start, len(text)):
+            c = text[i]
+            if in_str:
+                if esc:
+                    esc = False
+                elif c == "\\":
+                    esc = True
+                elif c == quote:
+                    in_str = False
+            elif c in "\"'":
+                in_str, quote = True, c
+            elif c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        # unbalanced from here; try the next opening brace
+        start = text.find("{", start + 1)
+    first, last = text.find("{"), text.rfind("}")
+    return text[first:last + 1] if first != -1 and last > first else None
+
+
+def _strip_trailing_commas(text: str) -> str:
+    out, in_str, esc = [], False, False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == ",":
+            j = i + 1
+            while j < len(text) and text[j] in " \t\r\n":
+                j += 1
+            if j < len(text) and text[j] in "}]":
+                i += 1
+                continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def _python_literal(text: str) -> Any:
+    # pairing_kb returns a Python repr; models sometimes echo it back verbatim
+    return ast.literal_eval(text)
+
+
+# Applied cumulatively; the name of the step that made the text parse is what gets counted
+_STEPS = (
+    ("extract_span", lambda t: extract_json_span(t) or t),
+    ("trailing_commas", _strip_trailing_commas),
+    ("smart_quotes", lambda t: t.translate(_SMART_QUOTES)),
+)
+
+
+def repair_json(text: str) -> Tuple[Optional[Any], Optional[str]]:
+    """Best-effort decode of model text. Returns (object, strategy) or (None, None)."""
+    if not isinstance(text, str) or not text.strip():
+        return None, None
+    candidate = text.strip()
+    try:
+        return json.loads(candidate), "direct"
+    except ValueError:
+        pass
+    for name, step in _STEPS:
+        candidate = step(candidate)
+        try:
+            return json.loads(candidate), name
+        except ValueError:
+            continue
+    try:
+        return _python_literal(extract_json_span(text) or candidate), "python_literal"
+    except (ValueError, SyntaxError):
+        return None, None
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in re.split(r"[;\n]|,(?![^()]*\))", value) if v.strip()]
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v not in (None, "")]
+    return [str(value)]
+
+
+def _has_items(section) -> bool:
+    if isinstance(section, dict):
+        return any(_as_list(v) for v in section.values())
+    return bool(_as_list(section))
+
+
+def coerce_pairing(obj: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Reshape KB-style / loosely-shaped dicts into the PairingResponse layout:
+    `food` -> `menu`, `drinks.coffee` folded into non-alcoholic, strings -> lists.
+    None unless the dict names an event (or preset) and lists at least one item; anything
+    else (an error payload, an empty plan) is left for the LLM fixer.
+    """
+    event = obj.get("event") or obj.get("preset")
+    menu = obj.get("menu") or obj.get("food") or {}
+    drinks = obj.get("drinks") or {}
+    if not (isinstance(event, str) and event.strip()) or not (_has_items(menu) or _has_items(drinks)):
+        return None
+
+    obj = dict(obj)
+    obj.pop("food", None)
+    if not isinstance(menu, dict):
+        menu = {}
+    obj["menu"] = {k: _as_list(menu.get(k)) for k in MENU_KEYS}
+
+    if isinstance(drinks, list):
+        drinks = {"non_alcoholic": drinks}
+    if not isinstance(drinks, dict):
+        drinks = {}
+    non_alc = _as_list(drinks.get("non_alcoholic") or drinks.get("non-alcoholic"))
+    non_alc += _as_list(drinks.get("coffee"))
+    obj["drinks"] = {"alcoholic": _as_list(drinks.get("alcoholic")), "non_alcoholic": non_alc}
+
+    for key in ("constraints", "sources", "tools_used"):
+        if key in obj:
+            obj[key] = _as_list(obj[key])
+    obj["event"] = event.strip()
+    if not obj.get("rationale"):
+        notes = obj.get("notes")
+        obj["rationale"] = str(notes) if notes else "Built from Scittino’s curated pairings."
+    return obj
+
+
+def local_repair(text: str, model_cls):
+    """
+    Decode + reshape + validate against `model_cls` (PairingResponse) without any LLM.
+    Returns the model or None; outcomes are tallied in REPAIR_STATS.
+    """
+    obj, strategy = repair_json(text)
+    if not isinstance(obj, dict):
+        REPAIR_STATS["failed"] += 1
+        return None
+    try:
+        result = model_cls.model_validate(obj)
+        REPAIR_STATS[f"parsed:{strategy}"] += 1
+        return result
+    except Exception:
+        pass
+    coerced = coerce_pairing(obj)
+    if coerced is None:
+        REPAIR_STATS["failed"] += 1
+        return None
+    try:
+        result = model_cls.model_validate(coerced)
+    except Exception:
+        REPAIR_STATS["failed"] += 1
+        return None
+    REPAIR_STATS[f"parsed:{strategy}"] += 1
+    REPAIR_STATS["coerced"] += 1
+    return result
+
+
+def repair_summary() -> str:
+    if not REPAIR_STATS:
+        return "local repair: not needed yet"
+    parts = ", ".join(f"{k}={v}" for k, v in sorted(REPAIR_STATS.items()))
+    return f"local repair: {parts}"
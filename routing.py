@@ -0,0 +1,205 @@
+# routing.py
+# Model tiering. Every request that reaches the agent is classified locally (no model
+# call) and runs on the tier its route calls for: the fast model for preset picks, preset
+# + constraint tweaks and site lookups, the top model only for fully custom plans. A tier
+# that times out, errors, or returns something unparseable hands the request to the next
+# tier up. Decisions land in ROUTE_STATS and on the request trace (route, fallbacks);
+# per-tier latency is the "agent:<tier>" stage in metrics.py.
+#
+#     PAIRINGS_FAST_MODEL / PAIRINGS_SMART_MODEL          model per tier
+#     PAIRINGS_FAST_TIMEOUT_S / PAIRINGS_SMART_TIMEOUT_S  per-tier budget for one agent run
+#     PAIRINGS_ROUTING=0                                  everything on the smart tier
+#
+#     python routing.py "office lunch, vegetarian" "sushi night"   # show the decisions
+#     python routing.py --stub --fast-fails                         # samples on fake models
+import os
+import re
+import sys
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from kb import LOOKUP_MIN_SCORE, current_store, rank_pairings, resolve_preset
+from query import parse_query, strip_audience, with_last_request
+
+
+class Tier(NamedTuple):
+    name: str
+    model: str
+    timeout_s: float
+
+
+TIERS: Dict[str, Tier] = {
+    "fast": Tier("fast", os.getenv("PAIRINGS_FAST_MODEL", "claude-3-5-haiku-20241022"),
+                 float(os.getenv("PAIRINGS_FAST_TIMEOUT_S", "20"))),
+    "smart": Tier("smart", os.getenv("PAIRINGS_SMART_MODEL", "claude-3-5-sonnet-20241022"),
+                  float(os.getenv("PAIRINGS_SMART_TIMEOUT_S", "60"))),
+}
+TIER_ORDER = ("fast", "smart")   # fallback goes left to right
+
+# route -> tier that answers it
+ROUTES: Dict[str, str] = {
+    "kb": "fast",               # fuzzy preset hit the fast path couldn't vouch for
+    "kb+constraints": "fast",   # preset plus dietary / audience / budget tweaks
+    "search": "fast",           # Scittino's site lookups (menu pages, specials...)
+    "custom": "smart",          # nothing in the KB fits: a real custom plan
+}
+ROUTING_ENABLED = os.getenv("PAIRINGS_ROUTING", "1") != "0"
+
+ROUTE_STATS: Counter = Counter()
+
+_SEARCH_RE = re.compile(
+    r"site:|scittino|\b(?:menu|website|web site|page|specials?|in stock|hours|address|location|"
+    r"order online|catering menu|do you (?:have|carry|sell))\b",
+    re.I,
+)
+
+
+class RouteDecision(NamedTuple):
+    route: str
+    tier: str
+    reason: str
+
+
+def _unfamiliar(event: str) -> List[str]:
+    """
+    Event words the preset index has never seen (typos aside), when they are at least half
+    the event: 'sushi night' is not a date night, 'game day spread' is still game day.
+    """
+    store = current_store()
+    words = store.event_tokens(event)
+    unknown = store.unknown_tokens(event)
+    return unknown if unknown and 2 * len(unknown) >= len(words) else []
+
+
+def classify(query: str, chat_history=None) -> RouteDecision:
+    """Route + tier for one agent-bound request; local heuristics only."""
+    if not ROUTING_ENABLED:
+        return RouteDecision("custom", "smart", "routing disabled")
+    # follow-ups ('make it vegetarian') are classified together with the last request
+    text = with_last_request(query, chat_history)
+    if _SEARCH_RE.search(query):
+        return RouteDecision("search", ROUTES["search"], "asks about Scittino’s own menu / pages")
+    parsed = parse_query(text)
+    event = strip_audience(parsed.event) or parsed.event
+    unknown = _unfamiliar(event)
+    if unknown:
+        return RouteDecision("custom", ROUTES["custom"], "unfamiliar: " + ", ".join(unknown))
+    key = resolve_preset(event)
+    if key is None:
+        ranked = rank_pairings(event, limit=1)
+        key = ranked[0][0] if ranked and ranked[0][1] >= LOOKUP_MIN_SCORE else None
+    if key is None:
+        return RouteDecision("custom", ROUTES["custom"], "no preset fits")
+    if parsed.constraints or parsed.audience:
+        tweaks = ", ".join(parsed.constraints + ([parsed.audience] if parsed.audience else []))
+        return RouteDecision("kb+constraints", ROUTES["kb+constraints"], f"'{key}' + {tweaks}")
+    return RouteDecision("kb", ROUTES["kb"], f"'{key}'")
+
+
+def fallback_chain(tier: str) -> List[Tier]:
+    """The routed tier, then every tier above it."""
+    return [TIERS[name] for name in TIER_ORDER[TIER_ORDER.index(tier):]]
+
+
+def record(decision: RouteDecision, trace=None) -> None:
+    ROUTE_STATS[f"route:{decision.route}"] += 1
+    ROUTE_STATS[f"tier:{decision.tier}"] += 1
+    if trace is not None:
+        trace.route = f"{decision.route}/{decision.tier}"
+
+
+def record_fallback(tier: str, error: BaseException, trace=None) -> None:
+    kind = "timeout" if isinstance(error, TimeoutError) else type(error).__name__
+    ROUTE_STATS[f"fallback:{tier}:{kind}"] += 1
+    if trace is not None:
+        trace.fallbacks.append(f"{tier}:{kind}")
+
+
+def routing_summary() -> str:
+    if not ROUTE_STATS:
+        return "routing: no agent requests"
+    return "routing: " + ", ".join(f"{k}={v}" for k, v in sorted(ROUTE_STATS.items()))
+
+
+# ---------- stub models ----------
+SAMPLE_QUERIES = [
+    "pizza night",                               # local, never routed
+    "office lunch, budget $",
+    "kids birthday on a budget",
+    "game day spread for the playoffs, gluten-free",
+    "do you have rainbow cookies this week",
+    "vegan wedding for 150",
+    "sushi night",
+]
+
+class _DownExecutor:
+    """A tier whose API is unreachable."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def invoke(self, *args, **kwargs):
+        raise ConnectionError(f"{self.name} tier unavailable (stub)")
+
+    async def ainvoke(self, *args, **kwargs):
+        raise ConnectionError(f"{self.name} tier unavailable (stub)")
+
+
+def stub_tier_executors(latency_ms: Optional[Dict[str, float]] = None, down=()) -> Dict[str, Any]:
+    """{tier: agent executor} on bench.py's fake model; tiers in `down` always fail."""
+    from bench import make_fake_llm, make_offline_tools
+    from main import build_agent_executor
+
+    latency_ms = latency_ms or {"fast": 150.0, "smart": 600.0}
+    out: Dict[str, Any] = {}
+    for name in TIER_ORDER:
+        if name in down:
+            out[name] = _DownExecutor(name)
+        else:
+            llm = make_fake_llm(latency_ms=latency_ms.get(name, 0.0))
+            out[name] = build_agent_executor(llm=llm, tools=make_offline_tools(), verbose=False)
+    return out
+
+
+def main(argv=None):
+    import argparse
+    import asyncio
+
+    ap = argparse.ArgumentParser(description="Show model-tier routing decisions.")
+    ap.add_argument("queries", nargs="*", help="default: SAMPLE_QUERIES")
+    ap.add_argument("--stub", action="store_true", help="also run them on fake per-tier models")
+    ap.add_argument("--fast-fails", action="store_true", help="with --stub: the fast tier is down")
+    args = ap.parse_args(argv)
+
+    from main import compose_fast_path, kb_fast_path
+    queries = args.queries or SAMPLE_QUERIES
+    for q in queries:
+        if kb_fast_path(q) or compose_fast_path(q):
+            print(f"{q:<45} local (no model)")
+            continue
+        d = classify(q)
+        print(f"{q:<45} {d.route:<15} {d.tier:<6} {d.reason}")
+    if not args.stub:
+        return 0
+
+    os.environ["PAIRINGS_CACHE"] = ":memory:"   # keep fake answers out of the real cache
+    from main import PairingError, aplan_pairing
+    from metrics import get_recorder
+    executors = stub_tier_executors(down=("fast",) if args.fast_fails else ())
+
+    async def run():
+        for q in queries:
+            try:
+                await aplan_pairing(q, executor=executors)
+            except PairingError as ex:
+                print(f"{q}: {ex}", file=sys.stderr)
+
+    asyncio.run(run())
+    print()
+    print(get_recorder().summary())
+    print(routing_summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,559 @@
+# scheduler.py
+# Every upstream model call (agent turns, the fixing parser) goes through one scheduler per
+# model tier. A call waits until the tier's token buckets (requests / minute and tokens /
+# minute) have room. Waiting calls are served by priority class: an "interactive" counter
+# request goes ahead of a queued bulk "batch" import, FIFO within a class. A 429 / 529 /
+# overloaded answer pauses the whole tier for Retry-After (or a jittered backoff), then the
+# call queues again in its old place. Queue wait is the "queue:<tier>/<class>" stage in
+# metrics.py; depth, retries and wait percentiles are in scheduler_summary(). Streamed calls
+# are admitted the same way and only retried if they fail before the first chunk.
+#
+#     PAIRINGS_SCHEDULER=0                         call the provider directly
+#     PAIRINGS_FAST_RPM / PAIRINGS_FAST_TPM        limits per tier (requests, tokens per minute)
+#     PAIRINGS_SMART_RPM / PAIRINGS_SMART_TPM
+#     PAIRINGS_MAX_RETRIES=4                       per model call, on 429 / overload
+#
+#     python scheduler.py --simulate               batch + counter traffic on a rate-limited stub
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from metrics import MAX_SAMPLES, percentile, stage
+
+SCHEDULER_ENABLED = os.getenv("PAIRINGS_SCHEDULER", "1") != "0"
+MAX_RETRIES = int(os.getenv("PAIRINGS_MAX_RETRIES", "4"))
+BURST_S = 60.0              # a full minute of budget may go at once, like the provider's own buckets
+OUTPUT_TOKENS_GUESS = 700   # reserved per call until the real usage is known
+
+PRIORITIES = ("interactive", "batch")   # served in this order
+RETRY_STATUS = {429, 500, 502, 503, 529}  # rate limited / overloaded
+
+
+class Limits(NamedTuple):
+    rpm: float
+    tpm: float
+
+
+LIMITS: Dict[str, Limits] = {
+    "fast": Limits(float(os.getenv("PAIRINGS_FAST_RPM", "50")), float(os.getenv("PAIRINGS_FAST_TPM", "50000"))),
+    "smart": Limits(float(os.getenv("PAIRINGS_SMART_RPM", "50")), float(os.getenv("PAIRINGS_SMART_TPM", "40000"))),
+}
+
+
+# ---------- retry policy ----------
+def is_retryable(ex: BaseException) -> bool:
+    """Anthropic rate-limit / overload errors (or a PairingError caused by one), without importing the SDK."""
+    status = getattr(ex, "status_code", None) or getattr(getattr(ex, "response", None), "status_code", None)
+    if status in RETRY_STATUS:
+        return True
+    if type(ex).__name__ in {"RateLimitError", "OverloadedError", "APITimeoutError", "APIConnectionError"}:
+        return True
+    return ex.__cause__ is not None and is_retryable(ex.__cause__)
+
+
+def retry_after(ex: BaseException) -> Optional[float]:
+    headers = getattr(getattr(ex, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# ---------- priority ----------
+_PRIORITY: ContextVar[str] = ContextVar("pairing_priority", default="interactive")
+
+
+def current_priority() -> str:
+    return _PRIORITY.get()
+
+
+@contextmanager
+def priority(name: str):
+    """Model calls made inside (tasks started inside included) queue under this class."""
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown priority class {name!r}; one of {', '.join(PRIORITIES)}")
+    token = _PRIORITY.set(name)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+# ---------- token buckets ----------
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_s: float = BURST_S):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_s)
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_for(self, n: float, now: float) -> float:
+        """Seconds until `n` fits (a request bigger than the bucket waits for a full one)."""
+        self._refill(now)
+        short = min(n, self.capacity) - self.level
+        return short / self.rate if short > 0 else 0.0
+
+    def take(self, n: float, now: float) -> None:
+        """Spend n (negative refunds); the level may go below zero after an underestimate."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level - n)
+
+
+class _Waiter:
+    __slots__ = ("rank", "seq", "tokens", "grant", "cancelled")
+
+    def __init__(self, rank: int, seq: int, tokens: float, grant: Callable[[], None]):
+        self.rank, self.seq, self.tokens, self.grant = rank, seq, tokens, grant
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class Scheduler:
+    """Admission control for one model tier; safe to share between threads and event loops."""
+
+    def __init__(self, name: str, rpm: float, tpm: float, burst_s: float = BURST_S):
+        self.name = name
+        self.requests = TokenBucket(rpm, burst_s)
+        self.tokens = TokenBucket(tpm, burst_s)
+        self.paused_until = 0.0
+        self.stats: Counter = Counter()
+        self.waits: Dict[str, deque] = {p: deque(maxlen=MAX_SAMPLES) for p in PRIORITIES}
+        self.max_depth = 0
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def depth(self) -> int:
+        return sum(not w.cancelled for w in self._queue)
+
+    # -- admission --
+    def _enqueue(self, waiter: _Waiter) -> None:
+        with self._lock:
+            heapq.heappush(self._queue, waiter)
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._pump()
+
+    def _pump(self) -> None:
+        """Grant the head of the queue while the buckets allow it; otherwise wake up when they will."""
+        while self._queue:
+            head = self._queue[0]
+            if head.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            wait = max(self.paused_until - now, self.requests.wait_for(1, now),
+                       self.tokens.wait_for(head.tokens, now))
+            if wait > 0:
+                self._wake_in(wait)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1, now)
+            self.tokens.take(head.tokens, now)
+            head.grant()
+
+    def _wake_in(self, seconds: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(seconds, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._pump()
+
+    def acquire(self, tokens: float, prio: str, seq: Optional[int] = None) -> None:
+        done = threading.Event()
+        self._enqueue(_Waiter(PRIORITIES.index(prio), next(self._seq) if seq is None else seq, tokens, done.set))
+        done.wait()
+
+    async def aacquire(self, tokens: float, prio: str, seq: Optional[int] = None) -> None:
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = _Waiter(PRIORITIES.index(prio), next(self._seq) if seq is None else seq, tokens, grant)
+        self._enqueue(waiter)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            with self._lock:
+                waiter.cancelled = True   # a slot already granted is simply spent
+            raise
+
+    def settle(self, estimated: float, actual: Optional[float]) -> None:
+        """Correct the token bucket once the real usage is known."""
+        if actual is None:
+            return
+        with self._lock:
+            self.tokens.take(actual - estimated, time.monotonic())
+            self._pump()
+
+    def pause(self, seconds: float) -> None:
+        """The provider pushed back: nobody on this tier goes for `seconds`."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    # -- calls --
+    def _record_wait(self, prio: str, seconds: float) -> None:
+        self.stats[f"calls:{prio}"] += 1
+        self.waits[prio].append(seconds * 1000)
+
+    def _retry_delay(self, ex: BaseException, attempt: int) -> Optional[float]:
+        if attempt >= MAX_RETRIES or not is_retryable(ex):
+            return None
+        self.stats["retries"] += 1
+        self.stats[f"error:{getattr(ex, 'status_code', None) or type(ex).__name__}"] += 1
+        return retry_after(ex) or backoff_delay(attempt)
+
+    def call(self, fn: Callable[[], Any], tokens: float, prio: Optional[str] = None) -> Any:
+        prio = prio or current_priority()
+        seq = next(self._seq)
+        for attempt in itertools.count():
+            t0 = time.monotonic()
+            with stage("queue", f"{self.name}/{prio}"):
+                self.acquire(tokens, prio, seq)
+            self._record_wait(prio, time.monotonic() - t0)
+            try:
+                result = fn()
+            except Exception as ex:
+                delay = self._retry_delay(ex, attempt)
+                if delay is None:
+                    raise
+                self.pause(delay)
+                continue
+            self.settle(tokens, _usage(result))
+            return result
+
+    async def acall(self, fn: Callable[[], Any], tokens: float, prio: Optional[str] = None) -> Any:
+        prio = prio or current_priority()
+        seq = next(self._seq)
+        for attempt in itertools.count():
+            t0 = time.monotonic()
+            with stage("queue", f"{self.name}/{prio}"):
+                await self.aacquire(tokens, prio, seq)
+            self._record_wait(prio, time.monotonic() - t0)
+            try:
+                result = await fn()
+            except Exception as ex:
+                delay = self._retry_delay(ex, attempt)
+                if delay is None:
+                    raise
+                self.pause(delay)
+                continue
+            self.settle(tokens, _usage(result))
+            return result
+
+    def stream(self, fn: Callable[[], Any], tokens: float, prio: Optional[str] = None):
+        """call() for a streaming call: admitted once, retried only if it fails before the first chunk."""
+        prio = prio or current_priority()
+        seq = next(self._seq)
+        for attempt in itertools.count():
+            t0 = time.monotonic()
+            with stage("queue", f"{self.name}/{prio}"):
+                self.acquire(tokens, prio, seq)
+            self._record_wait(prio, time.monotonic() - t0)
+            started, used = False, None
+            try:
+                for chunk in fn():
+                    started, used = True, _chunk_usage(chunk, used)
+                    yield chunk
+            except Exception as ex:
+                delay = None if started else self._retry_delay(ex, attempt)
+                if delay is None:
+                    raise
+                self.pause(delay)
+                continue
+            self.settle(tokens, used)
+            return
+
+    async def astream(self, fn: Callable[[], Any], tokens: float, prio: Optional[str] = None):
+        prio = prio or current_priority()
+        seq = next(self._seq)
+        for attempt in itertools.count():
+            t0 = time.monotonic()
+            with stage("queue", f"{self.name}/{prio}"):
+                await self.aacquire(tokens, prio, seq)
+            self._record_wait(prio, time.monotonic() - t0)
+            started, used = False, None
+            try:
+                async for chunk in fn():
+                    started, used = True, _chunk_usage(chunk, used)
+                    yield chunk
+            except Exception as ex:
+                delay = None if started else self._retry_delay(ex, attempt)
+                if delay is None:
+                    raise
+                self.pause(delay)
+                continue
+            self.settle(tokens, used)
+            return
+
+    def summary(self) -> str:
+        waits = ", ".join(f"{p} wait p50/p95 {percentile(list(v), 50):.0f}/{percentile(list(v), 95):.0f} ms"
+                          for p, v in self.waits.items() if v)
+        counts = ", ".join(f"{k}={v}" for k, v in sorted(self.stats.items()))
+        return f"{self.name}: depth {self.depth} (max {self.max_depth}); {waits or 'no calls'}" + \
+            (f"; {counts}" if counts else "")
+
+
+def _usage(result) -> Optional[float]:
+    """Total tokens reported on a ChatResult (usage_metadata), if any."""
+    try:
+        meta = result.generations[0].message.usage_metadata
+    except (AttributeError, IndexError):
+        return None
+    return float(meta["total_tokens"]) if meta else None
+
+
+def _chunk_usage(chunk, total: Optional[float]) -> Optional[float]:
+    """Running token total over streamed chunks (usage arrives split across start / delta)."""
+    meta = getattr(getattr(chunk, "message", None), "usage_metadata", None)
+    if not meta:
+        return total
+    return (total or 0.0) + float(meta["total_tokens"])
+
+
+def estimate_tokens(messages) -> float:
+    chars = sum(len(str(getattr(m, "content", m))) + len(str(getattr(m, "tool_calls", "") or "")) for m in messages)
+    return chars / 4 + OUTPUT_TOKENS_GUESS
+
+
+_SCHEDULERS: Dict[str, Scheduler] = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_scheduler(tier: str) -> Scheduler:
+    with _SCHEDULERS_LOCK:
+        if tier not in _SCHEDULERS:
+            limits = LIMITS.get(tier) or LIMITS["smart"]
+            _SCHEDULERS[tier] = Scheduler(tier, limits.rpm, limits.tpm)
+        return _SCHEDULERS[tier]
+
+
+def configure(tier: str, rpm: float, tpm: float, burst_s: float = BURST_S) -> Scheduler:
+    """Replace a tier's scheduler (new limits; simulations)."""
+    with _SCHEDULERS_LOCK:
+        _SCHEDULERS[tier] = Scheduler(tier, rpm, tpm, burst_s)
+        return _SCHEDULERS[tier]
+
+
+def scheduler_summary() -> str:
+    if not _SCHEDULERS:
+        return "scheduler: no model calls"
+    return "scheduler: " + " | ".join(s.summary() for _, s in sorted(_SCHEDULERS.items()))
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    """Per tier: queue depth, retries/errors, wait p50/p95 per priority class (for /healthz)."""
+    out = {}
+    for name, s in sorted(_SCHEDULERS.items()):
+        row: Dict[str, Any] = {"depth": s.depth, "max_depth": s.max_depth, **s.stats}
+        for p, v in s.waits.items():
+            if v:
+                row[f"wait_ms_p50:{p}"] = round(percentile(list(v), 50), 1)
+                row[f"wait_ms_p95:{p}"] = round(percentile(list(v), 95), 1)
+        out[name] = row
+    return out
+
+
+def prometheus_text() -> str:
+    out = ["# TYPE pairing_scheduler_queue_depth gauge"]
+    out += [f'pairing_scheduler_queue_depth{{tier="{n}"}} {s.depth}' for n, s in sorted(_SCHEDULERS.items())]
+    out.append("# TYPE pairing_scheduler_wait_ms summary")
+    for n, s in sorted(_SCHEDULERS.items()):
+        for p, v in s.waits.items():
+            vals = list(v)
+            for q in (0.5, 0.95):
+                out.append(f'pairing_scheduler_wait_ms{{tier="{n}",priority="{p}",quantile="{q}"}} '
+                           f'{percentile(vals, q * 100):.3f}')
+            out.append(f'pairing_scheduler_wait_ms_count{{tier="{n}",priority="{p}"}} {len(vals)}')
+    out.append("# TYPE pairing_scheduler_events_total counter")
+    for n, s in sorted(_SCHEDULERS.items()):
+        out += [f'pairing_scheduler_events_total{{tier="{n}",event="{k}"}} {v}' for k, v in sorted(s.stats.items())]
+    return "\n".join(out) + "\n"
+
+
+# ---------- chat model wrapper ----------
+@lru_cache(maxsize=None)
+def _scheduled_class():
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+    class ScheduledChatModel(BaseChatModel):
+        """Any chat model behind its tier's Scheduler (rate limits, priority, retry on 429)."""
+
+        inner: Any
+        tier: str = "smart"
+
+        @property
+        def _llm_type(self) -> str:
+            return f"scheduled-{self.inner._llm_type}"
+
+        def bind_tools(self, tools, **kwargs):
+            # provider-specific tool formatting, but bound to the wrapper so turns still queue
+            bound = self.inner.bind_tools(tools, **kwargs)
+            return self.bind(**getattr(bound, "kwargs", {}))
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            return get_scheduler(self.tier).call(
+                lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                estimate_tokens(messages))
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            return await get_scheduler(self.tier).acall(
+                lambda: self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                estimate_tokens(messages))
+
+        # streaming (astream_events, main.py --stream) queues the same way; chunks pass straight through
+        def _should_stream(self, *, async_api, run_manager=None, **kwargs):
+            return self.inner._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            yield from get_scheduler(self.tier).stream(
+                lambda: self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+                estimate_tokens(messages))
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            async for chunk in get_scheduler(self.tier).astream(
+                    lambda: self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+                    estimate_tokens(messages)):
+                yield chunk
+
+    return ScheduledChatModel
+
+
+def scheduled(llm, tier: str):
+    """Wrap a chat model so its calls queue on `tier`'s scheduler (unchanged if disabled)."""
+    if not SCHEDULER_ENABLED:
+        return llm
+    return _scheduled_class()(inner=llm, tier=tier)
+
+
+# ---------- simulated provider ----------
+class SimulatedRateLimit(Exception):
+    """What the stub raises past its limits: status 429 with a Retry-After header."""
+
+    def __init__(self, retry_s: float, status_code: int = 429):
+        super().__init__(f"{status_code} from simulated provider (retry after {retry_s:.2f}s)")
+        self.status_code = status_code
+        self.response = type("_Response", (), {"status_code": status_code,
+                                               "headers": {"retry-after": f"{retry_s:.3f}"}})()
+
+
+def make_rate_limited_llm(rpm: float, tpm: float, latency_ms: float = 0.0, overload_rate: float = 0.0,
+                          burst_s: float = 2.0, seed: int = 7):
+    """bench.py's fake model behind provider-side buckets: 429 past rpm/tpm, random 529s."""
+    from bench import _fake_model_class
+
+    requests, tokens = TokenBucket(rpm, burst_s), TokenBucket(tpm, burst_s)
+    lock, rng = threading.Lock(), random.Random(seed)
+
+    class RateLimitedStub(_fake_model_class()):
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            need = estimate_tokens(messages) - OUTPUT_TOKENS_GUESS
+            with lock:
+                now = time.monotonic()
+                wait = max(requests.wait_for(1, now), tokens.wait_for(need, now))
+                if wait > 0:
+                    raise SimulatedRateLimit(wait)
+                if rng.random() < overload_rate:
+                    raise SimulatedRateLimit(0.2, status_code=529)
+                requests.take(1, now)
+                tokens.take(need, now)
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    return RateLimitedStub(recordings={}, latency_s=latency_ms / 1000)
+
+
+SIM_BATCH = ["office lunch, budget $", "game day spread for the playoffs, gluten-free", "vegan wedding for 150",
+             "sushi night", "retirement party at the firehouse", "kids birthday on a budget"]
+SIM_COUNTER = ["anniversary dinner for two, premium", "do you have rainbow cookies this week",
+               "book club night, nut-free", "quinceanera buffet"]
+
+
+def simulate(batch_n: int = 30, counter_n: int = 6, rpm: float = 240, tpm: float = 200000,
+             provider_rpm: float = 180, latency_ms: float = 80, overload_rate: float = 0.03) -> str:
+    """Bulk import + walk-in traffic on stub models; returns the scheduler summary."""
+    os.environ["PAIRINGS_CACHE"] = ":memory:"   # keep fake answers out of the real cache
+    from bench import make_offline_tools
+    from main import aplan_pairing, build_agent_executor
+    from routing import TIER_ORDER
+
+    executors = {}
+    for tier in TIER_ORDER:
+        configure(tier, rpm, tpm, burst_s=2.0)
+        llm = scheduled(make_rate_limited_llm(provider_rpm, tpm, latency_ms, overload_rate), tier)
+        executors[tier] = build_agent_executor(llm=llm, tools=make_offline_tools(), verbose=False)
+
+    async def counter(i: int):
+        await asyncio.sleep(0.5 + i * 0.4)   # walk-ins arrive while the import is queued up
+        t0 = time.perf_counter()
+        await aplan_pairing(SIM_COUNTER[i % len(SIM_COUNTER)] + f" #{i}", executor=executors)
+        return time.perf_counter() - t0
+
+    async def bulk():
+        with priority("batch"):
+            return await asyncio.gather(*(aplan_pairing(SIM_BATCH[i % len(SIM_BATCH)] + f" #{i}", executor=executors)
+                                          for i in range(batch_n)), return_exceptions=True)
+
+    async def run():
+        t0 = time.perf_counter()
+        done = await asyncio.gather(bulk(), *(counter(i) for i in range(counter_n)), return_exceptions=True)
+        failed = sum(isinstance(r, BaseException) for r in list(done[0]) + list(done[1:]))
+        walk_ins = [d for d in done[1:] if isinstance(d, float)]
+        return time.perf_counter() - t0, walk_ins, failed
+
+    wall, walk_ins, failed = asyncio.run(run())
+    return (f"{batch_n} batch + {counter_n} counter requests in {wall:.1f}s, {failed} failed; counter request "
+            f"worst {max(walk_ins, default=0):.2f}s\n{scheduler_summary()}")
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Model-call scheduler (rate limits + priority classes).")
+    ap.add_argument("--simulate", action="store_true", help="run batch + counter traffic on a rate-limited stub")
+    ap.add_argument("--batch", type=int, default=30)
+    ap.add_argument("--counter", type=int, default=6)
+    ap.add_argument("--rpm", type=float, default=240, help="scheduler limit per tier")
+    ap.add_argument("--provider-rpm", type=float, default=180, help="stub's real limit (below --rpm forces 429s)")
+    ap.add_argument("--overload-rate", type=float, default=0.03, help="share of stub calls answered 529")
+    args = ap.parse_args(argv)
+
+    if not args.simulate:
+        for tier, lim in LIMITS.items():
+            print(f"{tier}: {lim.rpm:g} requests/min, {lim.tpm:g} tokens/min")
+        return 0
+    print(simulate(args.batch, args.counter, rpm=args.rpm, provider_rpm=args.provider_rpm,
+                   overload_rate=args.overload_rate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+# schema.py
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class MenuSection(BaseModel):
+    appetizers: List[str] = Field(default_factory=list)
+    mains: List[str] = Field(default_factory=list)
+    sides: List[str] = Field(default_factory=list)
+    desserts: List[str] = Field(default_factory=list)
+
+class DrinkSection(BaseModel):
+    alcoholic: List[str] = Field(default_factory=list)
+    non_alcoholic: List[str] = Field(default_factory=list)
+
+class QuoteLine(BaseModel):
+    item: str
+    section: str                 # "mains", "alcoholic"...
+    unit: str
+    qty: int
+    unit_price: float
+    subtotal: float
+    estimated: bool = False      # no portion row for this item; section default used
+
+class Quote(BaseModel):
+    headcount: int
+    lines: List[QuoteLine] = Field(default_factory=list)
+    total: float
+    per_guest: float
+
+class PairingResponse(BaseModel):
+    event: str
+    audience: Optional[str] = None      # "adults", "kids", "mixed", "21+"
+    constraints: List[str] = Field(default_factory=list)  # e.g., ["vegetarian","nut-free","budget:$"]
+    cuisine_pref: Optional[str] = None  # e.g., "italian"
+    menu: MenuSection
+    drinks: DrinkSection
+    rationale: str
+    sources: List[str] = Field(default_factory=list)
+    tools_used: List[str] = Field(default_factory=list)
+
+# What the model returns is PairingResponse; the quote is sized locally after parsing
+# (quantities.with_quote), so it stays out of the parser's format instructions.
+class QuotedPairing(PairingResponse):
+    headcount: Optional[int] = None
+    quote: Optional[Quote] = None
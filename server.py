@@ -0,0 +1,337 @@
+# server.py
+"""
+Long-running HTTP service for counter tablets and the web form. One process builds the
+model client, parsers and agent once and serves every terminal.
+
+    python server.py --port 8080                 # real Claude (needs ANTHROPIC_API_KEY)
+    python server.py --port 8080 --stub          # offline: bench.py's replaying fake model
+
+    POST /pairings        {"query": "office lunch for 40", "session_id": "..."}  (session optional)
+    GET  /sessions/<id>   recent turns of a session
+    DELETE /sessions/<id>
+    GET  /healthz         GET /metrics  (Prometheus text)
+
+Identical requests that arrive while one is already being planned share its result
+(single-flight). Sessions (bounded chat history) live server-side and expire after
+SESSION_TTL_S of inactivity.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from cache import fingerprint
+from kb import KB_STATS, KB_WATCH, current_store, watch_kb
+from snapshot import prerendered
+
+MAX_BODY = 64 * 1024
+MAX_HEADERS = 100
+SESSION_TTL_S = 30 * 60
+MAX_SESSIONS = 2000
+KEEPALIVE_S = 15.0
+
+_REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 422: "Unprocessable Entity",
+            431: "Request Header Fields Too Large", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------- sessions ----------
+class _Session:
+    __slots__ = ("history", "lock", "seen", "last")
+
+    def __init__(self, max_turns: int):
+        from session import SessionHistory
+        self.history = SessionHistory(max_turns)
+        self.lock = asyncio.Lock()   # one request at a time per terminal
+        self.seen = time.monotonic()
+        self.last = None
+
+
+class SessionStore:
+    """session id -> _Session, LRU-bounded, idle sessions expire."""
+
+    def __init__(self, max_turns: int, ttl: float = SESSION_TTL_S, max_sessions: int = MAX_SESSIONS):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+
+    def get(self, sid: Optional[str], create: bool = True) -> Tuple[Optional[str], Optional[_Session]]:
+        self._expire()
+        if sid and sid in self._sessions:
+            self._sessions.move_to_end(sid)
+            s = self._sessions[sid]
+            s.seen = time.monotonic()
+            return sid, s
+        if not create:
+            return sid, None
+        sid = sid or uuid.uuid4().hex
+        s = self._sessions[sid] = _Session(self.max_turns)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return sid, s
+
+    def drop(self, sid: str) -> bool:
+        return self._sessions.pop(sid, None) is not None
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            sid, s = next(iter(self._sessions.items()))
+            if s.seen >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# ---------- service ----------
+class PairingService:
+    def __init__(self, executor=None, max_inflight: int = 32, max_turns: Optional[int] = None):
+        from session import DEFAULT_MAX_TURNS
+        self.executor = executor  # None: main's shared agent (ChatAnthropic client reused)
+        self.sessions = SessionStore(max_turns if max_turns is not None
+                                     else int(os.getenv("PAIRINGS_HISTORY_TURNS", DEFAULT_MAX_TURNS)))
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.limit = asyncio.Semaphore(max(1, max_inflight))
+        self.stats: Counter = Counter()
+        self.started = time.time()
+
+    def warm(self) -> None:
+        """Build the model client, parsers and agent up front instead of on the first request."""
+        from main import get_agent_executor, get_fixing_parser, get_response_cache, get_target_parser
+        from routing import TIER_ORDER
+        from snapshot import _snapshot
+        get_target_parser()
+        get_response_cache()
+        _snapshot()   # one read of the precompiled answers, if there is a current file
+        if self.executor is None:
+            for tier in TIER_ORDER:
+                get_agent_executor(tier)
+            get_fixing_parser()
+
+    async def _plan(self, query: str, chat_history) -> Any:
+        from main import aplan_pairing
+        async with self.limit:
+            return await aplan_pairing(query, chat_history, executor=self.executor)
+
+    async def plan(self, query: str, chat_history) -> Any:
+        """Single-flight: identical (query, history) requests in flight share one pipeline run."""
+        key = fingerprint(" ".join(query.split()).lower(), chat_history)
+        fut = self.inflight.get(key)
+        if fut is not None:
+            self.stats["single_flight_joined"] += 1
+            return await asyncio.shield(fut)
+        fut = asyncio.ensure_future(self._plan(query, chat_history))
+        self.inflight[key] = fut
+        fut.add_done_callback(lambda _: self.inflight.pop(key, None))
+        self.stats["planned"] += 1
+        return await asyncio.shield(fut)
+
+    async def pairings(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        from main import PairingError
+        query = str(body.get("query") or "").strip()
+        if not query:
+            raise HttpError(400, "missing 'query'")
+        sid, sess = self.sessions.get(body.get("session_id"))
+        async with sess.lock:
+            try:
+                result = await self.plan(query, sess.history.messages())
+            except PairingError as ex:
+                self.stats["pairing_errors"] += 1
+                raise HttpError(422, str(ex))
+            sess.history.add(query, result)
+            sess.last = result
+        entry = prerendered(result)
+        pairing = entry.payload if entry is not None else json.loads(result.model_dump_json())
+        return {"session_id": sid, "pairing": pairing}
+
+    def session_info(self, sid: str) -> Dict[str, Any]:
+        _, sess = self.sessions.get(sid, create=False)
+        if sess is None:
+            raise HttpError(404, "unknown session")
+        return {"session_id": sid, "turns": [{"query": q, "summary": s} for q, s in sess.history.turns]}
+
+    def health(self) -> Dict[str, Any]:
+        from main import DEGRADED_STATS
+        from prefetch import PREFETCH_STATS
+        from routing import ROUTE_STATS
+        from scheduler import scheduler_stats
+        from snapshot import SNAPSHOT_STATS
+        store = current_store()
+        return {"ok": True, "uptime_s": round(time.time() - self.started, 1), "sessions": len(self.sessions),
+                "in_flight": len(self.inflight), **self.stats, "routing": dict(ROUTE_STATS),
+                "prefetch": dict(PREFETCH_STATS), "snapshot": dict(SNAPSHOT_STATS),
+                "kb": {"version": store.version, "fingerprint": store.fingerprint, **KB_STATS},
+                "scheduler": scheduler_stats(), "degraded": dict(DEGRADED_STATS)}
+
+
+# ---------- HTTP plumbing ----------
+async def _readline(reader: asyncio.StreamReader, status: int, what: str) -> bytes:
+    # readline raises ValueError once a line outgrows the stream limit (64 KiB)
+    try:
+        return await reader.readline()
+    except ValueError:
+        raise HttpError(status, f"{what} too long")
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    line = await _readline(reader, 400, "request line")
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "bad request line")
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADERS + 1):
+        h = await _readline(reader, 431, "header")
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+    else:
+        raise HttpError(431, "too many headers")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "bad Content-Length")
+    if length < 0:
+        raise HttpError(400, "bad Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], version, headers, body
+
+
+def _response(status: int, payload: Any, keep_alive: bool, content_type: str = "application/json") -> bytes:
+    if isinstance(payload, (bytes, str)):
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
+    else:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: {content_type}; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + data
+
+
+async def _route(service: PairingService, method: str, path: str, body: bytes):
+    if path == "/pairings":
+        if method != "POST":
+            raise HttpError(405, "POST only")
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(400, "body must be JSON")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "body must be a JSON object")
+        return 200, await service.pairings(payload)
+    if path.startswith("/sessions/"):
+        sid = path[len("/sessions/"):]
+        if method == "GET":
+            return 200, service.session_info(sid)
+        if method == "DELETE":
+            if not service.sessions.drop(sid):
+                raise HttpError(404, "unknown session")
+            return 200, {"session_id": sid, "deleted": True}
+        raise HttpError(405, "GET or DELETE")
+    if path == "/healthz":
+        return 200, service.health()
+    if path == "/metrics":
+        from metrics import get_recorder
+        from scheduler import prometheus_text
+        return 200, get_recorder().prometheus_text() + prometheus_text()
+    raise HttpError(404, "not found")
+
+
+async def handle_connection(service: PairingService, reader, writer) -> None:
+    try:
+        while True:
+            try:
+                req = await asyncio.wait_for(_read_request(reader), KEEPALIVE_S)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                break
+            except HttpError as ex:
+                writer.write(_response(ex.status, {"error": str(ex)}, keep_alive=False))
+                break
+            if req is None:
+                break
+            method, path, version, headers, body = req
+            keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+            content_type = "application/json"
+            try:
+                status, payload = await _route(service, method, path, body)
+                if path == "/metrics":
+                    content_type = "text/plain"
+            except HttpError as ex:
+                status, payload = ex.status, {"error": str(ex)}
+            except Exception as ex:  # keep serving other terminals
+                service.stats["server_errors"] += 1
+                status, payload = 500, {"error": f"{type(ex).__name__}: {ex}"}
+            writer.write(_response(status, payload, keep_alive, content_type))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int, service: PairingService) -> None:
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port,
+                                        backlog=256)
+    addrs = ", ".join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+    print(f"Pairings service on {addrs}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def stub_executor(latency_ms: float = 0.0):
+    """bench.py's replaying fake model + offline tools behind the real agent, one per tier."""
+    from routing import TIER_ORDER, stub_tier_executors
+    return stub_tier_executors({tier: latency_ms for tier in TIER_ORDER})
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="HTTP service for Scittino’s pairing assistant.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--max-inflight", type=int, default=32, help="agent runs in flight at once")
+    ap.add_argument("--stub", action="store_true", help="offline fake model (no API key, no network)")
+    ap.add_argument("--stub-latency-ms", type=float, default=0.0, help="simulated model latency per call")
+    args = ap.parse_args(argv)
+
+    if args.stub:
+        # keep fake answers out of the real response / tool caches
+        os.environ["PAIRINGS_CACHE"] = ":memory:"
+
+    async def run():
+        service = PairingService(stub_executor(args.stub_latency_ms) if args.stub else None,
+                                 max_inflight=args.max_inflight)
+        service.warm()
+        if KB_WATCH:
+            watch_kb()   # kb.json edits are picked up without a restart
+        await serve(args.host, args.port, service)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# session.py
+# Bounded chat history for a counter session. Instead of resending every prior full JSON
+# answer, each turn is kept as a one-line summary (event, audience, constraints, what was
+# planned), and only the last few turns are kept, so per-turn prompt size stays flat.
+from collections import deque
+from typing import Any, Dict, List
+
+DEFAULT_MAX_TURNS = 4
+_MAX_ITEMS = 3   # items per section quoted in a summary
+
+
+def summarize_pairing(result) -> str:
+    """One compact line describing a PairingResponse, enough context for follow-ups."""
+    parts = [f"Planned '{result.event}'"]
+    if result.audience:
+        parts.append(f"audience={result.audience}")
+    if result.constraints:
+        parts.append("constraints=" + ",".join(result.constraints))
+    mains = result.menu.mains[:_MAX_ITEMS] or result.menu.appetizers[:_MAX_ITEMS] or result.menu.desserts[:_MAX_ITEMS]
+    if mains:
+        parts.append("mains: " + "; ".join(mains))
+    if result.sources:
+        parts.append("source: " + result.sources[0])
+    return " | ".join(parts)
+
+
+class SessionHistory:
+    """Last `max_turns` (request, summary) pairs, rendered as chat messages."""
+
+    def __init__(self, max_turns: int = DEFAULT_MAX_TURNS):
+        self.turns: deque = deque(maxlen=max(0, max_turns))
+
+    def add(self, query: str, result) -> None:
+        self.turns.append((query.strip(), summarize_pairing(result)))
+
+    def messages(self) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for query, summary in self.turns:
+            out.append({"role": "user", "content": query})
+            out.append({"role": "assistant", "content": summary})
+        return out
+
+    def clear(self) -> None:
+        self.turns.clear()
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def __bool__(self) -> bool:
+        return bool(self.turns)
@@ -0,0 +1,272 @@
+# siteindex.py
+"""
+Offline full-text index of Scittino’s own sites, used by the `search` tool instead of
+live DuckDuckGo when it exists.
+
+    python siteindex.py import saved_pages/          # .html/.htm/.txt/.md, re-runnable
+    python siteindex.py import saved_pages/ --keep-missing   # don't drop pages gone from DIR
+    python siteindex.py search "cannoli cake"        # BM25-ranked titles + URLs
+    python siteindex.py stats
+
+Save pages with their site layout (saved_pages/scittinosdeli.com/menu/index.html) or keep
+the canonical / og:url tag in the HTML; either gives the page its URL for `sources`.
+Only the domains in ALLOWED_DOMAINS are imported. A re-import mirrors the directory:
+pages that are no longer in it are dropped from the index, so it never cites dead URLs.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from html.parser import HTMLParser
+from typing import List, NamedTuple, Optional, Tuple
+
+SITE_INDEX_PATH = os.getenv("PAIRINGS_SITE_INDEX", "pairings_site.sqlite3")
+ALLOWED_DOMAINS = ("scittinosdeli.com", "scittinositalianmarketplace.com")
+PAGE_EXTS = (".html", ".htm", ".txt", ".md")
+
+_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5("
+    "url UNINDEXED, title, body, tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TABLE IF NOT EXISTS docs (url TEXT PRIMARY KEY, sha TEXT NOT NULL, imported REAL NOT NULL)",
+)
+
+
+# ---------- HTML -> text ----------
+class _TextExtractor(HTMLParser):
+    _SKIP = {"script", "style", "noscript", "svg", "template"}
+    _BLOCK = {"p", "div", "li", "br", "h1", "h2", "h3", "h4", "tr", "section", "article"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.title = ""
+        self.h1 = ""
+        self.url: Optional[str] = None
+        self._skip = 0
+        self._in_title = False
+        self._in_h1 = False
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag in self._SKIP:
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "h1":
+            self._in_h1 = True
+        elif tag == "link" and (a.get("rel") or "").lower() == "canonical" and a.get("href"):
+            self.url = a["href"]
+        elif tag == "meta" and a.get("property") == "og:url" and a.get("content") and not self.url:
+            self.url = a["content"]
+        if tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skip:
+            self._skip -= 1
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "h1":
+            self._in_h1 = False
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title += data
+            return
+        if self._in_h1:
+            self.h1 += data
+        self.parts.append(data)
+
+
+def _squash(text: str) -> str:
+    lines = (re.sub(r"[ \t\r\f\v]+", " ", ln).strip() for ln in text.splitlines())
+    return "\n".join(ln for ln in lines if ln)
+
+
+class Page(NamedTuple):
+    url: str
+    title: str
+    body: str
+
+
+def _url_from_path(root: str, path: str) -> Optional[str]:
+    rel = os.path.relpath(path, root).replace(os.sep, "/")
+    first, _, rest = rel.partition("/")
+    domain = first.lower().removeprefix("www.")
+    if domain not in ALLOWED_DOMAINS:
+        return None
+    rest = re.sub(r"(^|/)index\.(html?|txt|md)$", r"\1", rest)
+    rest = re.sub(r"\.(html?|txt|md)$", "", rest)
+    return f"https://{domain}/{rest}"
+
+
+def _allowed(url: str) -> bool:
+    host = re.sub(r"^[a-z]+://", "", url.lower()).split("/", 1)[0].removeprefix("www.")
+    return host in ALLOWED_DOMAINS
+
+
+def read_page(root: str, path: str) -> Optional[Page]:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        raw = f.read()
+    if path.lower().endswith((".html", ".htm")):
+        ex = _TextExtractor()
+        ex.feed(raw)
+        url = ex.url or _url_from_path(root, path)
+        body = _squash("".join(ex.parts))
+        title = _squash(ex.title) or _squash(ex.h1)
+    else:
+        url = _url_from_path(root, path)
+        body = _squash(raw)
+        title = ""
+    if not url or not _allowed(url) or not body:
+        return None
+    if not title:
+        title = body.split("\n", 1)[0][:120]
+    return Page(url, title, body)
+
+
+# ---------- index ----------
+class SiteIndex:
+    def __init__(self, path: str = SITE_INDEX_PATH, readonly: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            for stmt in _SCHEMA:
+                self._conn.execute(stmt)
+            self._conn.commit()
+
+    def import_dir(self, root: str, prune: bool = True) -> Tuple[int, int, int, int]:
+        """
+        (added or changed, unchanged, skipped, removed) pages under root. With `prune`,
+        indexed URLs not found under root this time are removed.
+        """
+        added = unchanged = skipped = removed = 0
+        seen = set()
+        with self._lock:
+            for dirpath, _, files in os.walk(root):
+                for name in sorted(files):
+                    if not name.lower().endswith(PAGE_EXTS):
+                        continue
+                    page = read_page(root, os.path.join(dirpath, name))
+                    if page is None:
+                        skipped += 1
+                        continue
+                    seen.add(page.url)
+                    sha = hashlib.sha256((page.title + "\0" + page.body).encode("utf-8")).hexdigest()
+                    row = self._conn.execute("SELECT sha FROM docs WHERE url = ?", (page.url,)).fetchone()
+                    if row and row[0] == sha:
+                        unchanged += 1
+                        continue
+                    self._conn.execute("DELETE FROM pages WHERE url = ?", (page.url,))
+                    self._conn.execute("INSERT INTO pages (url, title, body) VALUES (?, ?, ?)", page)
+                    self._conn.execute("INSERT OR REPLACE INTO docs (url, sha, imported) VALUES (?, ?, ?)",
+                                       (page.url, sha, time.time()))
+                    added += 1
+            if prune:
+                gone = [url for (url,) in self._conn.execute("SELECT url FROM docs") if url not in seen]
+                self._conn.executemany("DELETE FROM pages WHERE url = ?", [(u,) for u in gone])
+                self._conn.executemany("DELETE FROM docs WHERE url = ?", [(u,) for u in gone])
+                removed = len(gone)
+            self._conn.execute("INSERT INTO pages(pages) VALUES ('optimize')")
+            self._conn.commit()
+        return added, unchanged, skipped, removed
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[str, str, str, float]]:
+        """[(title, url, snippet, bm25)] best first; `site:` operators restrict the domain."""
+        match, domains = _fts_query(query)
+        if not match:
+            return []
+        sql = ("SELECT title, url, snippet(pages, 2, '', '', '…', 16), bm25(pages, 0.0, 4.0, 1.0) AS rank "
+               "FROM pages WHERE pages MATCH ?")
+        args: list = [match]
+        if domains:
+            hosts = [h for d in domains for h in (d, "www." + d)]
+            # a page on the host, or the bare host itself ("https://scittinosdeli.com")
+            sql += " AND (" + " OR ".join("url LIKE ? OR url LIKE ?" for _ in hosts) + ")"
+            args += [pat for h in hosts for pat in (f"%://{h}/%", f"%://{h}")]
+        sql += " ORDER BY rank LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            try:
+                return self._conn.execute(sql, args).fetchall()
+            except sqlite3.OperationalError:
+                return []
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_SITE_RE = re.compile(r"\bsite:(\S+)", re.I)
+_WORD_RE = re.compile(r"\w+", re.U)
+
+
+def _fts_query(query: str) -> Tuple[str, List[str]]:
+    """Free text -> FTS5 MATCH string (any word, quoted) plus requested site: domains."""
+    domains = [d.lower().removeprefix("www.").rstrip("/") for d in _SITE_RE.findall(query)]
+    words = _WORD_RE.findall(_SITE_RE.sub(" ", query).lower())
+    words = [w for w in dict.fromkeys(words) if len(w) > 1]
+    return " OR ".join(f'"{w}"' for w in words), [d for d in domains if d in ALLOWED_DOMAINS]
+
+
+def index_available(path: str = SITE_INDEX_PATH) -> bool:
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+def format_results(rows) -> str:
+    if not rows:
+        return "NO_RESULTS in the Scittino’s site snapshot."
+    out = []
+    for title, url, snippet, _ in rows:
+        out.append(f"{title} — {url}\n  {snippet.replace(chr(10), ' ')}")
+    return "\n".join(out)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline index of Scittino’s own sites.")
+    ap.add_argument("--db", default=SITE_INDEX_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import", help="ingest saved pages from a directory")
+    p.add_argument("root")
+    p.add_argument("--keep-missing", action="store_true",
+                   help="keep indexed pages that are no longer under root (default: drop them)")
+    p = sub.add_parser("search", help="query the index")
+    p.add_argument("query")
+    p.add_argument("-n", "--limit", type=int, default=5)
+    sub.add_parser("stats", help="pages in the index")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "import":
+        index = SiteIndex(args.db)
+        added, unchanged, skipped, removed = index.import_dir(args.root, prune=not args.keep_missing)
+        print(f"{added} pages added/updated, {unchanged} unchanged, {skipped} skipped, {removed} removed "
+              f"-> {args.db} ({len(index)} pages)")
+        return 0
+    if not index_available(args.db):
+        print(f"No site index at {args.db}; run `python siteindex.py import DIR` first.", file=sys.stderr)
+        return 1
+    index = SiteIndex(args.db, readonly=True)
+    if args.cmd == "search":
+        t0 = time.perf_counter()
+        rows = index.search(args.query, args.limit)
+        print(format_results(rows))
+        print(f"({(time.perf_counter() - t0) * 1000:.1f} ms)", file=sys.stderr)
+    else:
+        print(f"{len(index)} pages in {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+# snapshot.py
+# Precompiled KB answers. "kids birthday, nut-free" or "office lunch, vegetarian" come out
+# the same every time, so a build step runs every preset x audience x common dietary
+# combination through the KB fast path once (kb_response + the diet filter), and writes
+# each answer's JSON payload and printable card to one zlib'd JSON file. It is plain data,
+# never unpickled: loading it is one read, and each payload is validated back into a
+# PairingResponse. After that a hit is a dict lookup with no filtering or rendering.
+#
+# The file carries a hash of the code (and pydantic version) that produced it; a mismatch
+# ignores the whole file. It also carries each preset's fingerprint, so after a KB edit or
+# hot reload only the edited presets fall back to the live path until the next build.
+#
+#     PAIRINGS_SNAPSHOT=path   default pairings_snapshot.bin next to this file; empty to disable
+#
+#     python snapshot.py build
+#     python snapshot.py stats
+#     python snapshot.py show "office lunch, vegetarian"
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from kb import KBStore, current_store
+
+SNAPSHOT_PATH = os.getenv("PAIRINGS_SNAPSHOT", str(Path(__file__).resolve().parent / "pairings_snapshot.bin"))
+MAGIC = b"PAIRSNAP"
+FORMAT = 3
+
+# audiences and dietary constraints worth precomputing (budget asks always go to the agent)
+AUDIENCES = (None, "kids", "adults", "21+", "mixed")
+MAX_CONSTRAINTS = 2
+# modules whose output is baked into the file; editing any of them makes it stale
+_SOURCES = ("main.py", "diet.py", "schema.py", "cards.py", "snapshot.py")
+
+SNAPSHOT_STATS: Counter = Counter()
+
+MISSING = object()   # combination not in the snapshot: take the live path
+
+SnapshotKey = Tuple[str, Optional[str], Tuple[str, ...]]
+
+
+class Entry(NamedTuple):
+    response: Any            # PairingResponse, shared: treat as read-only (model_copy to change)
+    payload: Dict[str, Any]  # its JSON form, what the HTTP service sends
+    card: Tuple[str, ...]    # cards.card_lines at DEFAULT_WIDTH
+
+
+def code_fingerprint() -> str:
+    import pydantic
+    h = hashlib.sha256(pydantic.VERSION.encode("ascii"))
+    here = Path(__file__).resolve().parent
+    for name in _SOURCES:
+        h.update((here / name).read_bytes())
+    return h.hexdigest()[:16]
+
+
+def snapshot_key(key: str, audience: Optional[str], constraints) -> SnapshotKey:
+    return key, audience, tuple(sorted(constraints))
+
+
+def constraint_sets() -> List[Tuple[str, ...]]:
+    """(), every enforceable constraint, and every pair; 'vegan' always implies 'vegetarian' like parse_query."""
+    from diet import FORBIDDEN
+    out = set()
+    for n in range(MAX_CONSTRAINTS + 1):
+        for combo in combinations(sorted(FORBIDDEN), n):
+            cs = set(combo)
+            if "vegan" in cs:
+                cs.add("vegetarian")
+            out.add(tuple(sorted(cs)))
+    return sorted(out, key=lambda cs: (len(cs), cs))
+
+
+# ---------- build ----------
+def build(path: str = SNAPSHOT_PATH, store: Optional[KBStore] = None) -> Dict[str, int]:
+    """Enumerate, validate and render every combination, then write the snapshot file."""
+    from cards import card_lines
+    from diet import filter_preset
+    from main import kb_response
+
+    store = store or current_store()
+    entries: List[list] = []   # [key, audience, constraints, payload or None, card lines]
+    counts: Counter = Counter()
+    for key in sorted(store.presets):
+        for audience in AUDIENCES:
+            for cs in constraint_sets():
+                if not (cs or audience):
+                    result = kb_response(key)
+                else:
+                    filtered = filter_preset(key, cs, audience, store)
+                    if filtered is None:
+                        entries.append([key, audience, list(cs), None, []])   # known escalation
+                        counts["escalate"] += 1
+                        continue
+                    result = kb_response(key, list(cs), audience, filtered)
+                entries.append([key, audience, list(cs), result.model_dump(mode="json"), card_lines(result)])
+                counts["answers"] += 1
+
+    payload = {"preset_fps": dict(store.preset_fps), "entries": entries}
+    blob = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+    header = (MAGIC + FORMAT.to_bytes(2, "big")
+              + store.fingerprint.encode("ascii") + code_fingerprint().encode("ascii"))
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header + blob)
+    os.replace(tmp, path)
+    _snapshot.cache_clear()
+    counts["bytes"] = len(header) + len(blob)
+    return dict(counts)
+
+
+# ---------- load / lookup ----------
+class Snapshot(NamedTuple):
+    kb_fingerprint: str
+    preset_fps: Dict[str, str]
+    entries: Dict[SnapshotKey, Optional[Entry]]
+    by_id: Dict[int, Entry]
+
+
+_HEADER = len(MAGIC) + 2 + 16 + 16
+
+
+@lru_cache(maxsize=1)
+def _snapshot(path: str = SNAPSHOT_PATH) -> Optional[Snapshot]:
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if data[:len(MAGIC)] != MAGIC or int.from_bytes(data[len(MAGIC):len(MAGIC) + 2], "big") != FORMAT:
+        SNAPSHOT_STATS["unreadable"] += 1
+        return None
+    kb_fp = data[len(MAGIC) + 2:len(MAGIC) + 18].decode("ascii")
+    if data[len(MAGIC) + 18:_HEADER].decode("ascii") != code_fingerprint():
+        SNAPSHOT_STATS["stale_code"] += 1
+        return None
+    from schema import PairingResponse
+    try:
+        payload = json.loads(zlib.decompress(data[_HEADER:]))
+        entries = {snapshot_key(key, audience, cs): body and Entry(PairingResponse.model_validate(body), body,
+                                                                   tuple(card))
+                   for key, audience, cs, body, card in payload["entries"]}
+    except Exception:   # truncated / hand-edited: ignore it like a stale one
+        SNAPSHOT_STATS["unreadable"] += 1
+        return None
+    by_id = {id(e.response): e for e in entries.values() if e is not None}
+    return Snapshot(kb_fp, payload["preset_fps"], entries, by_id)
+
+
+def lookup(key: str, constraints=(), audience: Optional[str] = None, store: Optional[KBStore] = None):
+    """
+    Precompiled PairingResponse for a preset combination, None if it's a known escalation,
+    MISSING if the snapshot doesn't cover it (or is absent / stale).
+    """
+    snap = _snapshot()
+    if snap is None:
+        return MISSING
+    if snap.preset_fps.get(key) != (store or current_store()).preset_fps.get(key):
+        SNAPSHOT_STATS["stale_preset"] += 1
+        return MISSING
+    entry = snap.entries.get(snapshot_key(key, audience, constraints), MISSING)
+    if entry is MISSING:
+        SNAPSHOT_STATS["misses"] += 1
+        return MISSING
+    SNAPSHOT_STATS["hits"] += 1
+    return None if entry is None else entry.response
+
+
+def prerendered(result) -> Optional[Entry]:
+    """The snapshot entry `result` came from, if it is that exact (unmodified) object."""
+    snap = _snapshot.cache_info().currsize and _snapshot()
+    if not snap:
+        return None
+    entry = snap.by_id.get(id(result))
+    return entry if entry is not None and entry.response is result else None
+
+
+def snapshot_summary() -> str:
+    if not SNAPSHOT_STATS:
+        return "snapshot: unused"
+    return "snapshot: " + ", ".join(f"{k}={v}" for k, v in sorted(SNAPSHOT_STATS.items()))
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Precompiled preset x audience x constraint answers.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build", help="(re)build the snapshot file")
+    sub.add_parser("stats", help="what's in it, and whether it's current")
+    show = sub.add_parser("show", help="print the snapshot card for a request")
+    show.add_argument("query")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        t0 = time.perf_counter()
+        counts = build()
+        print(f"{SNAPSHOT_PATH}: {counts.get('answers', 0)} answers, {counts.get('escalate', 0)} escalations, "
+              f"{counts['bytes'] / 1024:.1f} KiB in {time.perf_counter() - t0:.1f}s")
+        return 0
+
+    import schema  # noqa: F401  (load_ms is the file, not pydantic's import)
+    t0 = time.perf_counter()
+    snap = _snapshot()
+    load_ms = (time.perf_counter() - t0) * 1000
+    if snap is None:
+        print(f"{SNAPSHOT_PATH}: missing or built by other code; run `python snapshot.py build`", file=sys.stderr)
+        return 1
+    if args.cmd == "stats":
+        answers = sum(e is not None for e in snap.entries.values())
+        fps = current_store().preset_fps
+        stale = sorted(k for k in snap.preset_fps.keys() | fps.keys() if snap.preset_fps.get(k) != fps.get(k))
+        print(f"{SNAPSHOT_PATH}: {answers} answers, {len(snap.entries) - answers} escalations, "
+              f"loaded in {load_ms:.1f} ms, kb {snap.kb_fingerprint}"
+              + (f", stale presets: {', '.join(stale)}" if stale else " (current)"))
+        return 0
+
+    # main.py looks answers up through the imported module, not this __main__ copy
+    from main import kb_fast_path
+    from snapshot import prerendered as main_prerendered
+    result = kb_fast_path(args.query)
+    entry = main_prerendered(result) if result is not None else None
+    if entry is None:
+        print("not in the snapshot", file=sys.stderr)
+        return 1
+    print("\n".join(entry.card))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+# streaming.py
+# Streams the agent's final answer and prints each PairingResponse section as soon as
+# its JSON value is complete, instead of waiting for the whole answer + parse.
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from kb import pinned_store
+from metrics import callbacks_config, mark_path, trace_request
+from main import (
+    DEADLINE_S, _agent_within_deadline, _arun_agent, _banner, _kv_summary, _local_answer, _print_footer,
+    _print_result, _quoted, _remember, _render_menu_and_drinks, is_degraded,
+)
+
+# JSON path -> row label in _render_menu_and_drinks
+SECTION_LABELS = {
+    ("menu", "appetizers"): "Appetizers",
+    ("menu", "mains"): "Mains",
+    ("menu", "sides"): "Sides",
+    ("menu", "desserts"): "Desserts",
+    ("drinks", "alcoholic"): "Alcoholic",
+    ("drinks", "non_alcoholic"): "Non-Alcoholic",
+}
+HEADER_FIELDS = {("event",), ("audience",), ("constraints",), ("cuisine_pref",)}
+WANTED_PATHS = set(SECTION_LABELS) | HEADER_FIELDS
+
+_WS = " \t\r\n"
+
+
+class JSONSectionScanner:
+    """
+    Incremental scanner for one JSON object arriving in arbitrary text chunks.
+    feed() returns (path, value) for every wanted value that completed in that chunk.
+    Text before the first '{' (preamble, ```json fences) is skipped.
+    """
+
+    def __init__(self, wanted=WANTED_PATHS):
+        self.wanted = wanted
+        self.buf = ""
+        self.pos = 0
+        self.stack: List[Dict[str, Any]] = []
+        self.done = False
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._start = 0                 # start of the current string / primitive
+        self._value_path: Tuple = ()
+        self._prim = False
+
+    def feed(self, text: str) -> List[Tuple[Tuple, Any]]:
+        out: List[Tuple[Tuple, Any]] = []
+        self.buf += text
+        buf = self.buf
+        while self.pos < len(buf) and not self.done:
+            i, c = self.pos, buf[self.pos]
+            self.pos += 1
+
+            if not self.stack:
+                if c == "{":
+                    self.stack.append({"kind": "obj", "path": (), "start": i, "key": None, "expect": "key"})
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self.stack[-1]["key"] = json.loads(buf[self._start:i + 1])
+                    else:
+                        self._emit(out, self._value_path, self._start, i + 1)
+                continue
+
+            if self._prim and (c in _WS or c in ",}]"):
+                self._prim = False
+                self._emit(out, self._value_path, self._start, i)
+
+            if c in _WS:
+                continue
+            frame = self.stack[-1]
+            if frame["kind"] == "obj":
+                if c == '"' and frame["expect"] == "key":
+                    self._in_string, self._string_is_key, self._start = True, True, i
+                elif c == ":":
+                    frame["expect"] = "value"
+                elif c == ",":
+                    frame["expect"] = "key"
+                elif c == "}":
+                    self._close(out, i)
+                elif frame["expect"] == "value" and not self._prim:
+                    self._open(c, i, frame["path"] + (frame["key"],))
+            else:
+                if c == ",":
+                    frame["index"] += 1
+                elif c == "]":
+                    self._close(out, i)
+                elif not self._prim:
+                    self._open(c, i, frame["path"] + (frame["index"],))
+        return out
+
+    def _open(self, c: str, i: int, path: Tuple) -> None:
+        if c == "{":
+            self.stack.append({"kind": "obj", "path": path, "start": i, "key": None, "expect": "key"})
+        elif c == "[":
+            self.stack.append({"kind": "arr", "path": path, "start": i, "index": 0})
+        elif c == '"':
+            self._in_string, self._string_is_key, self._start, self._value_path = True, False, i, path
+        else:
+            self._prim, self._start, self._value_path = True, i, path
+
+    def _close(self, out, i: int) -> None:
+        frame = self.stack.pop()
+        self._emit(out, frame["path"], frame["start"], i + 1)
+        if not self.stack:
+            self.done = True
+
+    def _emit(self, out, path: Tuple, start: int, end: int) -> None:
+        if path in self.wanted:
+            try:
+                out.append((path, json.loads(self.buf[start:end])))
+            except ValueError:
+                pass
+
+
+def _chunk_text(chunk) -> str:
+    """Text part of an AIMessageChunk (Anthropic streams a list of content blocks)."""
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(b.get("text", "") for b in content
+                       if isinstance(b, dict) and b.get("type", "text") == "text")
+    return ""
+
+
+class SectionPrinter:
+    """Prints the banner once the header fields are in, then each menu/drink section."""
+
+    def __init__(self):
+        self.header: Dict[str, Any] = {}
+        self.header_printed = False
+        self.sections_printed = set()
+
+    def __call__(self, path: Tuple, value: Any) -> None:
+        from schema import DrinkSection, MenuSection
+
+        if path in HEADER_FIELDS:
+            self.header[path[0]] = value
+            return
+        if not self.header_printed:
+            self._print_header()
+        label = SECTION_LABELS[path]
+        self.sections_printed.add(path)
+        if not isinstance(value, list) or not value:
+            return
+        items = [str(v) for v in value]
+        menu = MenuSection(**{path[1]: items}) if path[0] == "menu" else MenuSection()
+        drinks = DrinkSection(**{path[1]: items}) if path[0] == "drinks" else DrinkSection()
+        print()
+        print(_render_menu_and_drinks(menu, drinks, only={label}), flush=True)
+
+    def restart(self) -> None:
+        """The model answering so far gave up; the next one streams a fresh card."""
+        if self.header_printed:
+            print("\n… retrying with another model.\n", flush=True)
+        self.header, self.header_printed, self.sections_printed = {}, False, set()
+
+    def _print_header(self) -> None:
+        self.header_printed = True
+        constraints = self.header.get("constraints") or []
+        print(_banner(str(self.header.get("event") or "Your event")))
+        print(_kv_summary([
+            ("Audience", self.header.get("audience") or "—"),
+            ("Cuisine", self.header.get("cuisine_pref") or "Italian"),
+            ("Constraints", ", ".join(map(str, constraints)) if constraints else "—"),
+        ]), flush=True)
+
+
+async def astream_pairing(query: str, chat_history: Optional[List[Dict[str, Any]]] = None,
+                          on_section=None, on_restart=None, executor=None,
+                          deadline_s: Optional[float] = None):
+    """
+    Like aplan_pairing (same tier fallback and deadline), but calls on_section(path, value)
+    for each section of the final answer as it streams in. When a tier fails after sections
+    were shown, on_restart() is called before the next tier streams its own answer.
+    Returns the validated PairingResponse.
+    """
+    started = time.monotonic()
+    chat_history = chat_history or []
+    deadline_s = DEADLINE_S if deadline_s is None else deadline_s
+    with trace_request(query), pinned_store():
+        result, cache_key = _local_answer(query, chat_history)
+        if result is not None:
+            return _quoted(result, query)
+
+        mark_path("agent")
+        shown = False
+
+        def emit(path, value):
+            nonlocal shown
+            shown = True
+            if on_section:
+                on_section(path, value)
+
+        async def run_tier(tier, agent, inputs):
+            nonlocal shown
+            if shown:   # a previous tier got part way: its sections are void
+                shown = False
+                if on_restart:
+                    on_restart()
+            scanner = JSONSectionScanner()
+            raw = None
+            async for event in agent.astream_events(inputs, config=callbacks_config(), version="v2"):
+                kind = event["event"]
+                if kind == "on_chat_model_start":
+                    scanner = JSONSectionScanner()  # each model turn starts a fresh answer
+                elif kind == "on_chat_model_stream":
+                    for path, value in scanner.feed(_chunk_text(event["data"]["chunk"])):
+                        emit(path, value)
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    raw = event["data"].get("output")
+            return raw or {}
+
+        result, degraded = await _agent_within_deadline(
+            _arun_agent(query, chat_history, executor, run=run_tier), query, chat_history, deadline_s, started)
+        if not degraded:
+            _remember(result, cache_key, query)
+        return _quoted(result, query)
+
+
+async def stream_and_print(query: str, chat_history: Optional[List[Dict[str, Any]]] = None):
+    """CLI helper: print sections live, then whatever didn't stream (rationale, sources...)."""
+    printer = SectionPrinter()
+    result = await astream_pairing(query, chat_history, on_section=printer, on_restart=printer.restart)
+    if printer.header_printed and is_degraded(result):
+        print("\n… that was taking too long; here is a quick answer instead.\n")
+        _print_result(result)
+    elif not printer.header_printed:
+        # Served locally (or nothing streamed): print the whole card at once
+        _print_result(result)
+    else:
+        missing = {SECTION_LABELS[p] for p in SECTION_LABELS if p not in printer.sections_printed}
+        rest = _render_menu_and_drinks(result.menu, result.drinks, only=missing)
+        if rest:
+            print()
+            print(rest)
+        _print_footer(result)
+    return result
@@ -0,0 +1,24 @@
+# tests/conftest.py
+# The modules live flat in the repo root; make them importable however pytest is invoked.
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def no_stray_files(monkeypatch):
+    """
+    Keep traces and caches in memory: no pairings_metrics.jsonl or pairings_cache.sqlite3
+    left in the checkout (subprocesses inherit the environment too).
+    """
+    monkeypatch.setenv("PAIRINGS_METRICS", "")
+    monkeypatch.setenv("PAIRINGS_CACHE", ":memory:")
+    # sinks already built by an earlier test would still point at the real files
+    for module, name in (("metrics", "get_recorder"), ("main", "get_response_cache"), ("tools", "get_tool_cache")):
+        if module in sys.modules:
+            getattr(sys.modules[module], name).cache_clear()
@@ -0,0 +1,38 @@
+# tests/test_batch.py
+import pytest
+
+from batch import read_requests, row_to_query
+from query import parse_query
+
+
+@pytest.mark.parametrize("row, event, audience, constraints, headcount", [
+    ({"event": "pizza night", "audience": "kids"}, "pizza night", "kids", [], None),
+    ({"event": "kids birthday", "audience": "mixed"}, "kids birthday", "mixed", [], None),
+    ({"query": "office lunch", "audience": "adults only", "headcount": "40"}, "office lunch", "21+", [], 40),
+    ({"event": "pizza night", "constraints": "vegan; nut-free"}, "pizza night", None,
+     ["nut-free", "vegan", "vegetarian"], None),
+    ({"event": "taco tuesday", "constraints": ["halal"], "headcount": 25}, "taco tuesday", None, ["halal"], 25),
+])
+def test_row_fields_survive_parsing(row, event, audience, constraints, headcount):
+    parsed = parse_query(row_to_query(row))
+    assert parsed.event == event
+    assert parsed.audience == audience
+    assert parsed.constraints == constraints
+    assert parsed.headcount == headcount
+
+
+def test_unknown_audience_stays_in_the_text():
+    query = row_to_query({"event": "pizza night", "audience": "seniors"})
+    assert "seniors" in query and parse_query(query).audience is None
+
+
+def test_audience_rows_take_the_kb_fast_path():
+    from main import kb_fast_path
+    result = kb_fast_path(row_to_query({"event": "pizza night", "audience": "kids"}))
+    assert result is not None and result.event == "pizza night" and result.audience == "kids"
+
+
+def test_read_csv(tmp_path):
+    path = tmp_path / "orders.csv"
+    path.write_text("event,audience,constraints,headcount\npizza night,kids,nut-free,30\n", encoding="utf-8")
+    assert read_requests(str(path)) == ["pizza night, audience: kids, nut-free, for 30"]
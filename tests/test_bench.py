@@ -0,0 +1,70 @@
+# tests/test_bench.py
+import json
+
+import pytest
+from langchain_core.messages import HumanMessage, ToolMessage
+
+import bench
+from main import parse_model_output
+from tools import pairing_kb
+
+try:
+    from langchain.agents import AgentExecutor  # noqa: F401  (0.x agent stack)
+    HAS_AGENTS = True
+except ImportError:
+    HAS_AGENTS = False
+
+
+def _turns(llm, query, observations):
+    """Drive the fake model like the agent loop: each tool call answered by `observations[name]`."""
+    messages = [HumanMessage(query)]
+    while True:
+        reply = llm.invoke(messages)
+        messages.append(reply)
+        if not reply.tool_calls:
+            return messages
+        for call in reply.tool_calls:
+            messages.append(ToolMessage(observations[call["name"]](call["args"]["__arg1"]),
+                                        tool_call_id=call["id"]))
+
+
+def test_scripted_kb_hit_answers_from_the_preset():
+    llm = bench.make_fake_llm()
+    messages = _turns(llm, "pizza night", {"pairing_kb": pairing_kb})
+    assert [m.tool_calls[0]["name"] for m in messages[1:-1:2]] == ["pairing_kb"]
+    result = parse_model_output(messages[-1].content)
+    assert result.event == "pizza night" and "Stromboli" in result.menu.mains
+    assert llm.calls == 2 and messages[-1].usage_metadata["output_tokens"] > 10
+
+
+def test_scripted_no_match_searches_then_answers_custom():
+    llm = bench.make_fake_llm()
+    messages = _turns(llm, "quantum seminar", {"pairing_kb": lambda q: "NO_MATCH",
+                                                "search": lambda q: bench.CANNED_SEARCH})
+    assert messages[3].tool_calls[0]["name"] == "search"
+    assert json.loads(messages[-1].content)["sources"] == ["Scittino’s-inspired custom plan"]
+
+
+def test_recordings_replay_turn_by_turn():
+    recordings = {"x": [{"tool_calls": [{"name": "search", "args": {"__arg1": "site:a.com x"}}]},
+                        {"content": '{"event": "x", "menu": {}, "drinks": {}, "rationale": "recorded"}'}]}
+    llm = bench.make_fake_llm(recordings)
+    messages = _turns(llm, "x", {"search": lambda q: "ok"})
+    assert messages[1].tool_calls[0]["args"] == {"__arg1": "site:a.com x"}
+    assert json.loads(messages[-1].content)["rationale"] == "recorded"
+
+
+def test_malformed_answers_still_parse_locally():
+    llm = bench.make_fake_llm(malformed_every=2)
+    final = _turns(llm, "pizza night", {"pairing_kb": pairing_kb})[-1].content
+    assert ",\n  ]" in final
+    with pytest.raises(ValueError):
+        json.loads(final)
+    assert parse_model_output(final).event == "pizza night"
+
+
+@pytest.mark.skipif(not HAS_AGENTS, reason="needs the langchain 0.x AgentExecutor")
+def test_bench_runs_the_whole_pipeline_offline():
+    res = bench.run_bench(["pizza night", "quantum seminar"], iterations=2, alloc=False)
+    assert res["requests"] == 4 and res["errors"] == 0
+    assert {"agent", "parse", "render", "save", "total"} <= set(res["latency_ms"])
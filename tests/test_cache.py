@@ -0,0 +1,71 @@
+# tests/test_cache.py
+import pytest
+
+import main
+import routing
+from cache import DiskCache, response_cache_key
+from query import parse_query
+from routing import RouteDecision
+from schema import DrinkSection, MenuSection, PairingResponse
+
+QUERY = "robotics club awards night"   # no preset: goes past the KB fast path to the cache
+
+
+def test_key_composition():
+    a = parse_query("pizza night, vegan, for 40")
+    b = parse_query("Pizza Night for 120 guests, vegan")
+    assert response_cache_key(a, "m", "fp") == response_cache_key(b, "m", "fp")   # headcount left out
+    assert response_cache_key(a, "m", "fp") != response_cache_key(a, "other-model", "fp")
+    assert response_cache_key(a, "m", "fp") != response_cache_key(a, "m", "fp2")
+    assert response_cache_key(a, "m", "fp") != response_cache_key(parse_query("pizza night"), "m", "fp")
+
+
+def test_dependency_invalidation(tmp_path):
+    cache = DiskCache(str(tmp_path / "c.sqlite3"))
+    cache.put("a", "1", tag="t", deps=["pizza night@1"])
+    cache.put("b", "2", tag="t", deps=["office lunch@1", "pizza night@1"])
+    cache.put("c", "3", tag="t", deps=["office lunch@1"])
+    assert cache.drop_deps(["pizza night@1"]) == 2
+    assert cache.get("a") is None and cache.get("c") == "3"
+    assert cache.drop_stale("t2") == 1 and len(cache) == 0
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    monkeypatch.setenv("PAIRINGS_CACHE", ":memory:")
+    monkeypatch.setattr(main, "compose_fast_path", lambda query: None)
+    main.get_response_cache.cache_clear()
+    yield main.get_response_cache()
+    main.get_response_cache.cache_clear()
+
+
+def _route_to(monkeypatch, tier):
+    monkeypatch.setattr(routing, "classify", lambda query, chat_history=None: RouteDecision("custom", tier, "test"))
+
+
+def test_tiers_do_not_share_cached_answers(memory_cache, monkeypatch):
+    answer = PairingResponse(event=QUERY, menu=MenuSection(mains=["Baked ziti tray"]), drinks=DrinkSection(),
+                             rationale="from the fast tier")
+    _route_to(monkeypatch, "fast")
+    result, fast_key = main._local_answer(QUERY, [])
+    assert result is None and fast_key
+    main._remember(answer, fast_key, QUERY)
+    assert main._local_answer(QUERY, [])[0] == answer
+
+    _route_to(monkeypatch, "smart")
+    result, smart_key = main._local_answer(QUERY, [])
+    assert result is None and smart_key != fast_key
+
+
+def test_schema_change_changes_the_prompt_fingerprint(monkeypatch):
+    import schema
+    main.prompt_fingerprint.cache_clear()
+    before = main.prompt_fingerprint()
+    schema_json = schema.PairingResponse.model_json_schema()
+    schema_json["properties"]["headcount"] = {"type": "string"}
+    monkeypatch.setattr(schema.PairingResponse, "model_json_schema", classmethod(lambda cls: schema_json))
+    main.prompt_fingerprint.cache_clear()
+    try:
+        assert main.prompt_fingerprint() != before
+    finally:
+        main.prompt_fingerprint.cache_clear()
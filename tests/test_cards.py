@@ -0,0 +1,107 @@
+# tests/test_cards.py
+import re
+import zlib
+from html.parser import HTMLParser
+
+import pytest
+
+from cards import card_lines, normalize_text, render_cards
+from main import kb_response
+from quantities import with_quote
+
+RESULTS = [
+    with_quote(kb_response("pizza night"), 30),
+    kb_response("kids birthday").model_copy(update={"event": "Nonna’s <b>80th</b> & co (the \\ party)"}),
+    kb_response("holiday antipasto & dessert trays").model_copy(update={"rationale": "Long. " * 900}),
+]
+
+
+# ---------- PDF: structure checked the way a reader walks it ----------
+def _objects(pdf: bytes):
+    startxref = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", pdf).group(1))
+    assert pdf[startxref:startxref + 5] == b"xref\n"
+    size = int(re.search(rb"trailer\n<< /Size (\d+) /Root (\d+) 0 R >>", pdf).group(1))
+    table = pdf[startxref:].split(b"\n")[3:3 + size - 1]
+    objects = {}
+    for oid, row in enumerate(table, start=1):
+        offset = int(row[:10])
+        assert pdf[offset:].startswith(b"%d 0 obj\n" % oid)
+        objects[oid] = pdf[offset:pdf.index(b"\nendobj\n", offset)]
+    return objects
+
+
+def _page_text(obj: bytes) -> str:
+    length = int(re.search(rb"/Length (\d+)", obj).group(1))
+    start = obj.index(b"stream\n") + 7
+    ops = zlib.decompress(obj[start:start + length]).decode("cp1252")
+    return "\n".join(m.replace("\\(", "(").replace("\\)", ")").replace("\\\\", "\\")
+                     for m in re.findall(r"\(((?:\\.|[^\\)])*)\) Tj", ops))
+
+
+def test_pdf_is_well_formed_and_holds_every_card(tmp_path):
+    path = tmp_path / "cards.pdf"
+    assert render_cards(RESULTS, str(path)) == 3
+    pdf = path.read_bytes()
+    assert pdf.startswith(b"%PDF-1.4\n")
+    objects = _objects(pdf)
+    pages_tree = objects[1]
+    kids = [int(k) for k in re.findall(rb"(\d+) 0 R", pages_tree)]
+    assert int(re.search(rb"/Count (\d+)", pages_tree).group(1)) == len(kids) > 3   # long card spans pages
+    texts = []
+    for kid in kids:
+        assert b"/Type /Page " in objects[kid]
+        content = int(re.search(rb"/Contents (\d+) 0 R", objects[kid]).group(1))
+        texts.append(_page_text(objects[content]))
+    text = "\n".join(texts)
+    assert text.startswith("SCITTINO'S PAIRING CARD: PIZZA NIGHT")
+    assert "Quote: 30 guests" in text
+    assert "NONNA'S <B>80TH</B> & CO (THE \\ PARTY)" in text   # escaped parens / backslash survive
+    assert text.count("SCITTINO'S PAIRING CARD:") == 3
+
+
+# ---------- HTML ----------
+class _Checker(HTMLParser):
+    VOID = {"meta", "br", "link"}
+
+    def __init__(self):
+        super().__init__()
+        self.stack, self.articles, self.h1 = [], 0, []
+        self._in_h1 = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in self.VOID:
+            self.stack.append(tag)
+        self.articles += tag == "article"
+        self._in_h1 = tag == "h1"
+
+    def handle_endtag(self, tag):
+        assert self.stack and self.stack.pop() == tag, f"unbalanced </{tag}>"
+        self._in_h1 = False
+
+    def handle_data(self, data):
+        if self._in_h1:
+            self.h1.append(data)
+
+
+def test_html_is_balanced_and_escaped(tmp_path):
+    path = tmp_path / "cards.html"
+    assert render_cards(RESULTS, str(path)) == 3
+    checker = _Checker()
+    checker.feed(path.read_text(encoding="utf-8"))
+    checker.close()
+    assert checker.stack == [] and checker.articles == 3
+    assert checker.h1[1] == "Nonna’S <B>80Th</B> & Co (The \\ Party)"   # text, not markup
+    assert "Quote:" in path.read_text(encoding="utf-8")
+
+
+def test_text_cards_are_form_feed_separated(tmp_path):
+    path = tmp_path / "cards.txt"
+    render_cards(RESULTS, str(path))
+    cards = path.read_text(encoding="utf-8").split("\f\n")
+    assert len(cards) == 3 and cards[0].splitlines() == card_lines(RESULTS[0])
+
+
+@pytest.mark.parametrize("raw, clean", [("Nonna’s “big” day – 8…", "Nonna's \"big\" day - 8..."),
+                                        ("ﬁne", "fine"), ("plain", "plain")])
+def test_normalize_text(raw, clean):
+    assert normalize_text(raw) == clean
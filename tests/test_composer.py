@@ -0,0 +1,31 @@
+# tests/test_composer.py
+import pytest
+
+pytest.importorskip("numpy")
+from composer import _same_dish, compose, dish_key
+
+EVENTS = ["baby shower brunch", "graduation open house", "retirement party", "wine tasting",
+          "family reunion", "church potluck", "book club", "christmas eve dinner"]
+
+
+@pytest.mark.parametrize("a, b, same", [
+    ("Cookie tray", "Assorted cookies", True),
+    ("Biscotti assortment", "Assorted biscotti & cookies", True),
+    ("House salad", "Caesar or house salad", True),
+    ("Cuccidati (fig cookies)", "Assorted cookies", False),
+    ("Chicken Parm sandwich", "The Sicilian sandwich", False),
+])
+def test_dish_key(a, b, same):
+    assert _same_dish(dish_key(a), dish_key(b)) is same
+
+
+@pytest.mark.parametrize("event", EVENTS)
+def test_sections_have_no_near_duplicates_or_foreign_pools(event):
+    plan = compose(event)
+    assert plan is not None
+    for section, items in list(plan.food.items()) + list(plan.drinks.items()):
+        assert 3 <= len(items) <= 6 or section == "alcoholic"
+        assert not any(i.lower().startswith("add-on") for i in items), (section, items)
+        keys = [dish_key(i) for i in items]
+        for i, a in enumerate(keys):
+            assert not any(_same_dish(a, b) for b in keys[i + 1:]), (section, items)
@@ -0,0 +1,43 @@
+# tests/test_deadline.py
+import asyncio
+
+import pytest
+
+import main
+
+
+ANSWER = '{"event": "pizza night", "menu": {"mains": ["Calzone"]}, "drinks": {"non_alcoholic": ["Cola"]}, "rationale": "r"}'
+
+
+class SlowAgent:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def ainvoke(self, inputs, config=None):
+        await asyncio.sleep(self.delay)
+        return {"output": ANSWER}
+
+
+@pytest.fixture
+def agent_path(monkeypatch):
+    remembered = []
+    monkeypatch.setattr(main, "_local_answer", lambda query, history: (None, "key"))
+    monkeypatch.setattr(main, "_remember", lambda *args: remembered.append(args))
+    return remembered
+
+
+def test_deadline_degrades_to_filtered_preset(agent_path):
+    result = asyncio.run(main.aplan_pairing("pizza night, vegetarian", executor=SlowAgent(5),
+                                            deadline_s=0.2, quote=False))
+    assert main.is_degraded(result)
+    assert result.constraints == ["vegetarian"]
+    assert "Stromboli" not in result.menu.mains
+    assert result.rationale.startswith("Quick answer: no answer within 0.2s")
+    assert agent_path == []   # degraded answers are never cached
+
+
+def test_no_deadline_waits_for_agent(agent_path):
+    result = asyncio.run(main.aplan_pairing("pizza night", executor=SlowAgent(0.3), deadline_s=0, quote=False))
+    assert not main.is_degraded(result)
+    assert result.menu.mains == ["Calzone"]
+    assert len(agent_path) == 1
@@ -0,0 +1,20 @@
+# tests/test_diet.py
+from diet import filter_preset
+
+
+def test_vegetarian_drops_or_swaps_meat():
+    filtered = filter_preset("pizza night", ["vegetarian"])
+    assert "Stromboli" in filtered.removed
+    assert not any("Pepperoni" in i for i in filtered.food["mains"])
+    assert filtered.swapped and "Pepperoni" in filtered.swapped[0][0]
+
+
+def test_kids_never_get_alcohol():
+    filtered = filter_preset("pizza night", [], "kids")
+    assert filtered.drinks["alcoholic"] == []
+    assert filtered.drinks["non_alcoholic"]
+
+
+def test_unknown_constraint_escalates():
+    assert filter_preset("pizza night", ["keto"]) is None
+    assert filter_preset("no such preset", ["vegetarian"]) is None
@@ -0,0 +1,34 @@
+# tests/test_fast_path.py
+import pytest
+
+from main import KB_SOURCE, kb_fast_path, kb_response
+
+
+@pytest.mark.parametrize("query, key", [
+    ("pizza night", "pizza night"),
+    ("Pizza Night!", "pizza night"),                      # casing / punctuation
+    ("piza night", "pizza night"),                        # near-exact typo
+    ("kids birthday", "kids birthday"),
+    ("office lunch for 80", "office lunch / team meeting"),   # headcount aside
+])
+def test_preset_requests_skip_the_agent(query, key):
+    result = kb_fast_path(query)
+    assert result is not None
+    assert result.event == key and result.sources == [KB_SOURCE] and result.tools_used == ["pairing_kb"]
+    assert result.menu == kb_response(key).menu
+
+
+def test_kb_response_keeps_the_preset_as_is():
+    result = kb_response("pizza night")
+    assert "Stromboli" in result.menu.mains
+    assert "Espresso" in result.drinks.non_alcoholic   # coffee bar folded into non-alcoholic
+    assert result.constraints == [] and result.audience is None
+
+
+@pytest.mark.parametrize("query", [
+    "a quantum physics seminar",
+    "fancy gala for investors",
+    "pizza night, keto",            # a constraint the diet filter can't vouch for
+])
+def test_everything_else_goes_to_the_agent(query):
+    assert kb_fast_path(query) is None
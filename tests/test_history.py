@@ -0,0 +1,44 @@
+# tests/test_history.py
+from history import HistoryStore, main
+from schema import DrinkSection, MenuSection, PairingResponse
+
+
+def _result(event):
+    return PairingResponse(event=event, menu=MenuSection(mains=["Ziti"]),
+                           drinks=DrinkSection(non_alcoholic=["Cola"]), rationale="r")
+
+
+def _store(tmp_path):
+    store = HistoryStore(str(tmp_path / "h.sqlite3"))
+    store.add(_result("pizza night"), ts=1_700_000_000)
+    store.add(_result("game day"), ts=1_700_100_000)
+    store.flush()
+    return store
+
+
+def test_overlapping_exports_do_not_repeat_cards(tmp_path):
+    out = tmp_path / "cards.txt"
+    out.write_text("legacy card\n", encoding="utf-8")
+    with _store(tmp_path) as store:
+        assert store.export_cards(str(out), store.find(since=1_700_050_000)) == 1
+        assert store.export_cards(str(out), store.find()) == 1
+        assert store.export_cards(str(out), store.find()) == 0
+    text = out.read_text(encoding="utf-8")
+    assert text.startswith("legacy card\n")
+    assert text.count("Event: Pizza Night") == 1 and text.count("Event: Game Day") == 1
+
+
+def test_deleted_file_is_exported_again(tmp_path):
+    out = tmp_path / "cards.txt"
+    with _store(tmp_path) as store:
+        assert store.export_cards(str(out), store.find()) == 2
+        out.unlink()
+        assert store.export_cards(str(out), store.find()) == 2
+
+
+def test_cli_reports_skipped(tmp_path, capsys):
+    _store(tmp_path).close()
+    args = ["--db", str(tmp_path / "h.sqlite3"), "export", str(tmp_path / "cards.txt")]
+    main(args)
+    main(args)
+    assert "0 cards appended" in capsys.readouterr().out.splitlines()[-1]
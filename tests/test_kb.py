@@ -0,0 +1,92 @@
+# tests/test_kb.py
+import pytest
+
+from kb import LOOKUP_MIN_SCORE, current_store, lookup_pairings, rank_pairings, resolve_preset
+from tools import pairing_kb
+
+
+@pytest.mark.parametrize("query, key", [
+    ("tailgate", "game day / tailgate"),               # one side of a "a / b" preset name
+    ("game day", "game day / tailgate"),
+    ("date night", "date night (italian)"),           # parenthetical dropped
+    ("Coffee & Pastry Break", "coffee & pastry break"),
+])
+def test_aliases_resolve_exactly(query, key):
+    assert resolve_preset(query) == key
+    assert rank_pairings(query)[0] == (key, 1.0)
+
+
+@pytest.mark.parametrize("query, key", [
+    ("movie night", "pizza night"),                   # customer synonym
+    ("football party", "game day / tailgate"),
+    ("kids bday", "kids birthday"),
+    ("tailgat party", "game day / tailgate"),          # typo, trigram match
+])
+def test_fuzzy_and_synonym_matches(query, key):
+    best, score = rank_pairings(query)[0]
+    assert best == key and score >= LOOKUP_MIN_SCORE
+    assert lookup_pairings(query) is current_store().presets[key]
+
+
+def test_no_match_reports_closest_presets():
+    assert lookup_pairings("zzzz qqq") == {}
+    assert pairing_kb("zzzz qqq") == "NO_MATCH"
+    assert pairing_kb("quantum seminar").startswith("NO_MATCH (closest presets: ")
+
+
+def test_tool_returns_best_preset():
+    text = pairing_kb("football party")
+    assert "'preset': 'game day / tailgate'" in text and "'match_score': 0.9" in text
+
+
+# ---------- compiled store (inverted indexes vs scanning the preset dicts) ----------
+def _scan(store, item=None, tag=None, course=None, drink=None):
+    """The old dict-KB way: walk every preset."""
+    from kb import _item_tokens
+    out = []
+    for key, data in store.presets.items():
+        if tag and tag not in [t.lower() for t in data.get("tags", [])]:
+            continue
+        if course and not data.get("food", {}).get(course):
+            continue
+        if drink and not data.get("drinks", {}).get(drink):
+            continue
+        if item:
+            wanted = set(_item_tokens(item))
+            listed = [i for sec in ("food", "drinks") for lst in data.get(sec, {}).values() for i in lst]
+            if not any(wanted <= set(_item_tokens(i)) for i in listed):
+                continue
+        out.append(key)
+    return sorted(out)
+
+
+def test_indexes_match_a_full_scan():
+    store = current_store()
+    for tag in store.tag_index:
+        assert store.find(tag=tag) == _scan(store, tag=tag)
+    for course in ("appetizers", "mains", "sides", "desserts"):
+        assert store.find(course=course) == _scan(store, course=course)
+    for drink in ("alcoholic", "non_alcoholic", "coffee"):
+        assert store.find(drink=drink) == _scan(store, drink=drink)
+    for item in ("meatballs", "cannoli", "chicken parm", "espresso", "pepperoni pizza", "sushi"):
+        assert store.find(item=item) == _scan(store, item=item)
+    assert store.find(item="meatballs", course="desserts") == sorted(
+        set(_scan(store, item="meatballs")) & set(_scan(store, course="desserts")))
+
+
+def test_strings_are_interned_across_presets():
+    store = current_store()
+    colas = [i for data in store.presets.values() for i in data["drinks"].get("non_alcoholic", []) if i == "Cola"]
+    assert len(colas) > 1 and all(c is colas[0] for c in colas)
+    tags = [t for data in store.presets.values() for t in data.get("tags", []) if t == "casual"]
+    assert len(tags) > 1 and all(t is tags[0] for t in tags)
+
+
+def test_presets_come_from_the_data_file():
+    import json
+
+    from kb import KB_PATH
+    with open(KB_PATH, encoding="utf-8") as f:
+        raw = json.load(f)
+    assert current_store().presets == raw["presets"]
+    assert current_store().synonyms == raw["synonyms"]
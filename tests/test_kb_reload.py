@@ -0,0 +1,83 @@
+# tests/test_kb_reload.py
+import json
+
+import pytest
+
+import kb
+
+
+@pytest.fixture
+def kb_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(kb, "_STORE", kb._STORE)   # restored after the test
+    path = tmp_path / "kb.json"
+    path.write_text(open(kb.KB_PATH, encoding="utf-8").read(), encoding="utf-8")
+    return path
+
+
+def test_edit_swaps_store_and_reports_changed_preset(kb_copy):
+    old = kb.current_store()
+    raw = json.loads(kb_copy.read_text(encoding="utf-8"))
+    raw["presets"]["pizza night"]["notes"] = "New notes."
+    kb_copy.write_text(json.dumps(raw), encoding="utf-8")
+
+    with kb.pinned_store() as pinned:
+        diff = kb.reload_kb(str(kb_copy))
+        assert kb.current_store() is pinned is old   # a running request keeps its store
+    assert diff.changed == ("pizza night",) and not diff.added and not diff.removed
+    assert kb.current_store() is not old
+    assert kb.current_store().presets["pizza night"]["notes"] == "New notes."
+
+
+def test_unchanged_or_broken_file_keeps_store(kb_copy):
+    old = kb.current_store()
+    assert kb.reload_kb(str(kb_copy)) is None
+    kb_copy.write_text('{"presets": {', encoding="utf-8")
+    assert kb.reload_kb(str(kb_copy)) is None
+    assert kb.current_store() is old
+
+
+def _index_state(store):
+    look = store.lookup
+    return (look.aliases, look.alias_grams, look.token_weights, look.phrases, look.vocab_grams,
+            look._gram_to_tokens, store.item_index, store.tag_index, store.course_index, store.drink_index)
+
+
+def _edited(raw):
+    raw = json.loads(json.dumps(raw))
+    presets = raw["presets"]
+    presets["pizza night"]["tags"] = ["casual", "friday-night"]           # tag moves
+    presets["pizza night"]["food"]["mains"].append("Sfincione")            # new item token
+    presets["kids birthday"]["food"]["sides"] = []                         # course drops out
+    del presets["butcher grill pack"]                                      # preset removed
+    presets["movie marathon"] = {"food": {"mains": ["Stromboli"]}, "drinks": {"non_alcoholic": ["Cola"]},
+                                 "tags": ["casual"]}                       # added, shares an alias
+    raw["synonyms"]["movie marathon"] = ["movie night", "binge watch"]
+    raw["synonyms"]["pizza night"] = ["pizza", "slice"]
+    return raw
+
+
+def test_reload_patches_indexes_like_a_full_build():
+    raw = json.load(open(kb.KB_PATH, encoding="utf-8"))
+    old = kb.load_kb()
+    edited = _edited(raw)
+    patched = kb.KBStore(edited["presets"], edited["synonyms"], edited.get("items"), edited.get("portions"),
+                         base=old)
+    fresh = kb.KBStore(edited["presets"], edited["synonyms"], edited.get("items"), edited.get("portions"))
+    assert _index_state(patched) == _index_state(fresh)
+    assert patched.lookup.rank("movie night") == fresh.lookup.rank("movie night")
+    assert patched.find(tag="friday-night") == ["pizza night"]
+    # untouched entries are shared with the old store, not rebuilt
+    assert patched.tag_index["office-friendly"] is old.tag_index["office-friendly"]
+    assert patched.lookup.token_weights["espresso"] is old.lookup.token_weights["espresso"]
+    # and the old store is left as it was
+    assert _index_state(old) == _index_state(kb.load_kb())
+
+
+def test_back_compat_names_follow_reloads(kb_copy):
+    raw = json.loads(kb_copy.read_text(encoding="utf-8"))
+    raw["presets"]["pizza night"]["notes"] = "Reloaded."
+    kb_copy.write_text(json.dumps(raw), encoding="utf-8")
+    kb.reload_kb(str(kb_copy))
+    assert kb.PairingKB["pizza night"]["notes"] == "Reloaded."
+    from kb import Synonyms
+    assert Synonyms is kb.current_store().synonyms
@@ -0,0 +1,93 @@
+# tests/test_prefetch.py
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+import prefetch
+from tools import pairing_kb
+
+try:
+    from langchain.agents.format_scratchpad.tools import format_to_tool_messages  # noqa: F401  (0.x agent stack)
+    HAS_AGENTS = True
+except ImportError:
+    HAS_AGENTS = False
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_ENABLED", True)
+    monkeypatch.setattr(prefetch, "PREFETCH_STATS", type(prefetch.PREFETCH_STATS)())
+
+
+def test_candidates_exact_fuzzy_and_no_match():
+    assert prefetch.candidate_lookups("pizza night") == ["pizza night"]
+    assert prefetch.candidate_lookups("kids birthday party for 10") == ["kids birthday"]
+    assert prefetch.candidate_lookups("a pizza nite") == ["pizza night"]
+    # nothing close: the raw event goes through, so the model sees the NO_MATCH answer
+    assert prefetch.candidate_lookups("zzqx frobnicate") == ["zzqx frobnicate"]
+
+
+def test_candidates_use_the_last_request_for_follow_ups():
+    history = [{"role": "user", "content": "pizza night for 6"}, {"role": "assistant", "content": "..."}]
+    assert prefetch.candidate_lookups("make it vegetarian", history) == ["pizza night"]
+
+
+def test_messages_are_an_answered_tool_call():
+    msgs = prefetch.prefetched_messages("pizza night for 8")
+    call_msg, *results = msgs
+    assert isinstance(call_msg, AIMessage) and call_msg.content == ""
+    assert [c["name"] for c in call_msg.tool_calls] == ["pairing_kb"]
+    assert len(results) == len(call_msg.tool_calls)
+    for call, result in zip(call_msg.tool_calls, results):
+        # every call id is answered by exactly one ToolMessage carrying the local lookup
+        assert isinstance(result, ToolMessage)
+        assert result.tool_call_id == call["id"] and result.name == "pairing_kb"
+        assert result.content == pairing_kb(call["args"]["__arg1"])
+    assert prefetch.PREFETCH_STATS["requests"] == 1
+    assert prefetch.PREFETCH_STATS["lookups"] == len(results)
+
+
+def test_call_ids_are_unique_per_lookup(monkeypatch):
+    monkeypatch.setattr(prefetch, "candidate_lookups", lambda q, h=None: ["pizza night", "kids birthday"])
+    call_msg, *results = prefetch.prefetched_messages("anything")
+    ids = [c["id"] for c in call_msg.tool_calls]
+    assert len(set(ids)) == 2
+    assert [r.tool_call_id for r in results] == ids
+
+
+def test_disabled_prefetch_adds_nothing(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_ENABLED", False)
+    assert prefetch.prefetched_messages("pizza night") == []
+    assert not prefetch.PREFETCH_STATS
+
+
+def test_record_outcome_counts_hits_and_misses():
+    kb_step = (SimpleNamespace(tool="pairing_kb"), "...")
+    search_step = (SimpleNamespace(tool="search"), "...")
+    assert prefetch.record_outcome({"intermediate_steps": []}) is True
+    assert prefetch.record_outcome({"intermediate_steps": [search_step]}) is True
+    assert prefetch.record_outcome({"intermediate_steps": [search_step, kb_step]}) is False
+    assert prefetch.PREFETCH_STATS["hits"] == 2 and prefetch.PREFETCH_STATS["misses"] == 1
+    assert "2/3 hits" in prefetch.prefetch_summary()
+
+
+def test_agent_inputs_carry_the_prefetched_messages():
+    import main
+    inputs = main._agent_inputs("pizza night", [])
+    assert inputs["query"] == "pizza night" and inputs["chat_history"] == []
+    assert isinstance(inputs["prefetched"][0], AIMessage)
+
+
+@pytest.mark.skipif(not HAS_AGENTS, reason="needs the langchain 0.x agent stack")
+def test_scratchpad_puts_prefetched_calls_before_the_agent_steps():
+    from langchain.agents.output_parsers.tools import ToolAgentAction
+    import main
+    prefetched = prefetch.prefetched_messages("pizza night")
+    action = ToolAgentAction(tool="search", tool_input={"__arg1": "q"}, log="", tool_call_id="call_1",
+                             message_log=[AIMessage(content="", tool_calls=[
+                                 {"name": "search", "args": {"__arg1": "q"}, "id": "call_1"}])])
+    pad = main._scratchpad({"prefetched": prefetched, "intermediate_steps": [(action, "found it")]})
+    assert pad[:len(prefetched)] == prefetched
+    assert isinstance(pad[-1], ToolMessage) and pad[-1].tool_call_id == "call_1"
+    assert main._scratchpad({"intermediate_steps": []}) == []
@@ -0,0 +1,52 @@
+# tests/test_quantities.py
+import pytest
+
+from quantities import quote, quote_many, total_curve, with_quote
+from schema import DrinkSection, MenuSection, PairingResponse, QuotedPairing
+
+# Arancini: dozen, serves 6, $24. Americano: cup, serves 1, $3. Mystery cake: no portion row.
+RESULT = PairingResponse(event="party", menu=MenuSection(mains=["Arancini"], desserts=["Mystery cake"]),
+                         drinks=DrinkSection(non_alcoholic=["Americano"]), rationale="r")
+
+
+def _qty(q):
+    return {line.item: line.qty for line in q.lines}
+
+
+@pytest.mark.parametrize("n, arancini, americano, total, per_guest", [
+    (10, 2, 22, 48 + 66 + 30, 14.4),
+    (60, 11, 132, 264 + 396 + 180, 14.0),   # 60 × 1.1 / 6 is 11 exactly, not 12
+    (7, 2, 16, 48 + 48 + 30, 18.0),
+    (11, 3, 25, 72 + 75 + 60, 18.82),       # 207 / 11 = 18.818...
+])
+def test_quantities_round_up_and_totals_round_to_cents(n, arancini, americano, total, per_guest):
+    q = quote(RESULT, n)
+    assert _qty(q)["Arancini"] == arancini and _qty(q)["Americano"] == americano
+    assert q.total == total and q.per_guest == per_guest
+
+
+def test_unlisted_item_uses_section_default():
+    line = next(line for line in quote(RESULT, 24).lines if line.item == "Mystery cake")
+    assert line.estimated and line.unit == "dozen" and line.qty == 3
+
+
+def test_batch_matches_one_at_a_time():
+    heads = [10, 60, 7, 11, 250]
+    batch = quote_many([RESULT] * len(heads), heads)
+    assert [q.headcount for q in batch] == heads
+    assert batch == [quote(RESULT, n) for n in heads]
+    assert total_curve(RESULT, heads).tolist() == [q.total for q in batch]
+
+
+def test_zero_and_missing_headcount():
+    q = quote_many([RESULT], [0])[0]
+    assert q.total == 0 and q.per_guest == 0.0 and set(_qty(q).values()) == {0}
+    assert with_quote(RESULT, None) is RESULT
+    assert with_quote(RESULT, 0) is RESULT
+
+
+def test_quote_is_attached_outside_the_model_schema():
+    assert "quote" not in PairingResponse.model_json_schema()["properties"]
+    quoted = with_quote(RESULT, 10)
+    assert isinstance(quoted, QuotedPairing) and quoted.headcount == 10
+    assert QuotedPairing.model_validate_json(quoted.model_dump_json()) == quoted
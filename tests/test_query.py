@@ -0,0 +1,36 @@
+# tests/test_query.py
+import pytest
+
+from query import parse_query, with_last_request
+
+
+@pytest.mark.parametrize("text, budget", [
+    ("office lunch, budget $", "budget:$"),
+    ("kids birthday on a budget", "budget:$"),
+    ("office lunch, budget $$", "budget:$$"),
+    ("office lunch, $$ please", "budget:$$"),
+    ("mid-range retirement party", "budget:$$"),
+    ("moderately priced office lunch", "budget:$$"),
+    ("office lunch, budget $$$", "budget:$$$"),
+    ("upscale wedding rehearsal dinner", "budget:$$$"),
+])
+def test_budget_levels(text, budget):
+    parsed = parse_query(text)
+    assert [c for c in parsed.constraints if c.startswith("budget:")] == [budget]
+    assert "$" not in parsed.event
+
+
+@pytest.mark.parametrize("text, event, audience, constraints, headcount", [
+    ("pizza night for 40, vegetarian", "pizza night", None, ["vegetarian"], 40),
+    ("vegan wedding for 150 guests", "wedding", None, ["vegan", "vegetarian"], 150),
+    ("wedding rehearsal dinner, 21+", "wedding rehearsal dinner", "21+", [], None),
+    ("game day, all ages, nut-free", "game day", "mixed", ["nut-free"], None),
+])
+def test_parse_query(text, event, audience, constraints, headcount):
+    assert parse_query(text) == (event, audience, constraints, headcount)
+
+
+def test_follow_up_uses_the_last_request():
+    history = [{"role": "user", "content": "tailgate for 30"}, {"role": "assistant", "content": "..."}]
+    assert with_last_request("make it vegetarian", history) == "tailgate for 30, make it vegetarian"
+    assert parse_query(with_last_request("make it vegetarian", history)).constraints == ["vegetarian"]
@@ -0,0 +1,45 @@
+# tests/test_repair.py
+import json
+
+import pytest
+
+from repair import coerce_pairing, local_repair, repair_json
+from schema import PairingResponse
+
+KB_OBSERVATION = repr({
+    "preset": "pizza night",
+    "food": {"appetizers": ["Garlic knots"], "mains": ["Stromboli", "Calzone"], "sides": [], "desserts": ["Cannoli"]},
+    "drinks": {"alcoholic": ["Chianti"], "non_alcoholic": ["Cola"], "coffee": ["Espresso"]},
+    "notes": "Scittino’s staples.",
+})
+
+
+def test_trailing_comma_and_fence():
+    text = '```json\n{"event": "x", "menu": {"mains": ["Ziti",]}, "drinks": {}, "rationale": "r",}\n```'
+    result = local_repair(text, PairingResponse)
+    assert result is not None and result.menu.mains == ["Ziti"]
+
+
+def test_kb_shape_is_coerced():
+    result = local_repair(KB_OBSERVATION, PairingResponse)
+    assert result.event == "pizza night"
+    assert result.menu.mains == ["Stromboli", "Calzone"]
+    assert result.drinks.non_alcoholic == ["Cola", "Espresso"]
+    assert result.rationale == "Scittino’s staples."
+
+
+@pytest.mark.parametrize("obj", [
+    {"error": "overloaded"},
+    {"event": "office lunch"},                                       # no items at all
+    {"event": "office lunch", "menu": {"mains": []}, "drinks": []},
+    {"menu": {"mains": ["Ziti"]}},                                   # no event / preset
+    {"event": "   ", "menu": {"mains": ["Ziti"]}},
+])
+def test_not_pairing_shaped_goes_to_the_fixer(obj):
+    assert coerce_pairing(obj) is None
+    assert local_repair(json.dumps(obj), PairingResponse) is None
+
+
+def test_unparseable_text():
+    assert repair_json("the kitchen is closed") == (None, None)
+    assert local_repair("the kitchen is closed", PairingResponse) is None
@@ -0,0 +1,39 @@
+# tests/test_routing.py
+import pytest
+
+import routing
+from kb import current_store
+
+
+def test_event_tokens_drop_stopwords_numbers_and_modifiers():
+    assert current_store().event_tokens("sushi night for 10, vegan") == ["sushi", "night"]
+
+
+def test_unknown_tokens_skip_known_words_and_typos():
+    store = current_store()
+    assert store.unknown_tokens("sushi night vegan") == ["sushi"]
+    assert store.unknown_tokens("tailgat party") == []   # typo of a known token
+    assert store.unknown_tokens("") == []
+
+
+@pytest.mark.parametrize("query, route", [
+    ("pizza night", "kb"),
+    ("tailgat party", "kb"),
+    ("game day spread", "kb"),             # one unfamiliar word out of three
+    ("pizza night, vegetarian", "kb+constraints"),
+    ("sushi night", "custom"),
+    ("what are the specials on the menu", "search"),
+])
+def test_classify(query, route):
+    decision = routing.classify(query)
+    assert decision.route == route
+    assert decision.tier == routing.ROUTES[route]
+
+
+def test_unfamiliar_reason_names_the_words():
+    assert routing.classify("sushi night").reason == "unfamiliar: sushi"
+
+
+def test_follow_up_is_classified_with_the_last_request():
+    history = [{"role": "user", "content": "pizza night for 6"}]
+    assert routing.classify("vegetarian please", history).route == "kb+constraints"
@@ -0,0 +1,86 @@
+# tests/test_scheduler.py
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from scheduler import Scheduler, SimulatedRateLimit, _scheduled_class, configure, priority
+
+REPLY = "Antipasto platter and a baked ziti tray"
+
+
+def _fake():
+    return GenericFakeChatModel(messages=iter([AIMessage(content=REPLY)] * 4))
+
+
+def _wrapped(tier="test-stream"):
+    configure(tier, rpm=6000, tpm=10_000_000)
+    return _scheduled_class()(inner=_fake(), tier=tier)
+
+
+async def _stream_events(llm):
+    return [e async for e in llm.astream_events("office lunch", version="v2")
+            if e["event"] == "on_chat_model_stream"]
+
+
+def test_astream_events_still_stream_through_the_scheduler():
+    plain = asyncio.run(_stream_events(_fake()))
+    wrapped = asyncio.run(_stream_events(_wrapped()))
+    assert len(plain) > 1
+    assert len(wrapped) == len(plain)
+    assert "".join(e["data"]["chunk"].content for e in wrapped) == REPLY
+
+
+def test_sync_stream_is_admitted_once():
+    llm = _wrapped("test-sync")
+    chunks = list(llm.stream("office lunch"))
+    assert len(chunks) > 1 and "".join(c.content for c in chunks) == REPLY
+    from scheduler import get_scheduler
+    assert get_scheduler("test-sync").stats["calls:interactive"] == 1
+
+
+def test_stream_retries_only_before_the_first_chunk():
+    sched = Scheduler("test-retry", rpm=6000, tpm=10_000_000)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise SimulatedRateLimit(0.01)
+        yield "a"
+        yield "b"
+
+    assert list(sched.stream(flaky, 10)) == ["a", "b"]
+    assert len(attempts) == 2 and sched.stats["retries"] == 1
+
+    def breaks_midway():
+        yield "a"
+        raise SimulatedRateLimit(0.01)
+
+    with pytest.raises(SimulatedRateLimit):
+        list(sched.stream(breaks_midway, 10))
+
+
+def test_interactive_goes_before_batch():
+    sched = Scheduler("test-prio", rpm=60, tpm=10_000_000, burst_s=1.0)   # one request per second
+    sched.acquire(1, "interactive")                                        # drain the burst
+    order = []
+
+    async def one(name, prio):
+        with priority(prio):
+            await sched.aacquire(1, prio)
+        order.append(name)
+
+    async def run():
+        batch = asyncio.ensure_future(one("batch", "batch"))
+        await asyncio.sleep(0.05)
+        counter = asyncio.ensure_future(one("counter", "interactive"))
+        await asyncio.gather(batch, counter)
+
+    t0 = time.monotonic()
+    asyncio.run(run())
+    assert order == ["counter", "batch"] and time.monotonic() - t0 < 5
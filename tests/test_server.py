@@ -0,0 +1,53 @@
+# tests/test_server.py
+import asyncio
+import json
+
+import pytest
+
+from server import MAX_BODY, MAX_HEADERS, PairingService, handle_connection
+
+
+async def _exchange(raw: bytes) -> bytes:
+    service = PairingService(executor=object())
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return data
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def _status(response: bytes) -> int:
+    return int(response.split(b" ", 2)[1])
+
+
+@pytest.mark.parametrize("length, status", [("abc", 400), ("-5", 400), (str(MAX_BODY + 1), 413)])
+def test_bad_content_length_gets_an_answer(length, status):
+    raw = f"POST /pairings HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode()
+    response = asyncio.run(_exchange(raw))
+    assert _status(response) == status
+    assert b"error" in response
+
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GET /" + b"x" * (70 * 1024) + b" HTTP/1.1\r\n\r\n", 400),
+    (b"GET /healthz HTTP/1.1\r\nX-Big: " + b"x" * (70 * 1024) + b"\r\n\r\n", 431),
+    (b"GET /healthz HTTP/1.1\r\n" + b"X-A: b\r\n" * (MAX_HEADERS + 1) + b"\r\n", 431),
+], ids=["request-line", "header-line", "header-count"])
+def test_oversized_request_head_gets_an_answer(raw, status):
+    response = asyncio.run(_exchange(raw))
+    assert _status(response) == status
+    assert b"error" in response
+
+
+def test_bad_json_body():
+    raw = b"POST /pairings HTTP/1.1\r\nContent-Length: 3\r\nConnection: close\r\n\r\n{x}"
+    response = asyncio.run(_exchange(raw))
+    assert _status(response) == 400
+    assert json.loads(response.split(b"\r\n\r\n", 1)[1]) == {"error": "body must be JSON"}
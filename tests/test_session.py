@@ -0,0 +1,52 @@
+# tests/test_session.py
+import pytest
+
+from main import kb_response
+from session import SessionHistory, summarize_pairing
+
+try:
+    from langchain.output_parsers import PydanticOutputParser  # noqa: F401  (0.x parser stack)
+    HAS_PARSERS = True
+except ImportError:
+    HAS_PARSERS = False
+
+
+def test_history_keeps_only_the_last_turns():
+    session = SessionHistory(max_turns=2)
+    for event in ("pizza night", "kids birthday", "date night (italian)"):
+        session.add(f"  {event}  ", kb_response(event))
+    messages = session.messages()
+    assert len(session) == 2 and len(messages) == 4
+    assert [m["content"] for m in messages if m["role"] == "user"] == ["kids birthday", "date night (italian)"]
+    session.clear()
+    assert not session and session.messages() == []
+
+
+def test_turns_are_one_line_summaries_not_json():
+    result = kb_response("pizza night").model_copy(update={"constraints": ["vegetarian"], "audience": "kids"})
+    line = summarize_pairing(result)
+    assert "\n" not in line and "{" not in line
+    assert line.startswith("Planned 'pizza night' | audience=kids | constraints=vegetarian | mains: ")
+    assert len(line) < len(result.model_dump_json()) / 3
+
+
+def test_prompt_size_stays_flat_as_the_session_grows():
+    session = SessionHistory(max_turns=3)
+    sizes = []
+    for _ in range(8):
+        session.add("pizza night", kb_response("pizza night"))
+        sizes.append(sum(len(m["content"]) for m in session.messages()))
+    assert sizes[2:] == [sizes[2]] * 6
+
+
+@pytest.mark.skipif(not HAS_PARSERS, reason="needs the langchain 0.x output parsers")
+def test_static_prefix_is_cached_and_identical_across_turns():
+    import main
+    prompt = main.get_prompt()
+    first = prompt.format_messages(query="pizza night", chat_history=[], agent_scratchpad=[])
+    later = prompt.format_messages(query="kids birthday", agent_scratchpad=[],
+                                   chat_history=SessionHistory().messages() + [("human", "earlier")])
+    assert first[0].content == later[0].content   # byte-identical system prefix
+    blocks = first[0].content
+    assert "cache_control" not in blocks[0] and blocks[-1]["cache_control"] == {"type": "ephemeral"}
+    assert "{format_instructions}" not in blocks[0]["text"] and '"rationale"' in blocks[0]["text"]
@@ -0,0 +1,74 @@
+# tests/test_siteindex.py
+import pytest
+
+from siteindex import SiteIndex, format_results
+
+PAGES = {
+    "scittinosdeli.com/index.html":
+        '<html><head><title>Scittino’s Deli</title><link rel="canonical" href="https://scittinosdeli.com">'
+        "</head><body><p>Subs, stromboli and a cannoli now and then.</p></body></html>",
+    "scittinosdeli.com/menu/index.html":
+        "<html><head><title>Small plates</title></head><body><script>var cannoli = 1;</script>"
+        "<p>Meatball sliders, arancini, garlic knots.</p></body></html>",
+    "scittinositalianmarketplace.com/bakery.html":
+        "<html><head><title>Cannoli cake</title></head><body><h1>Bakery</h1>"
+        "<p>Cannoli cake, cannoli trays and ricotta cheesecake.</p></body></html>",
+    "scittinositalianmarketplace.com/catering.txt": "Catering platters\nAntipasto and pasta trays for 20.",
+    "example.com/cannoli.html": "<html><head><title>Elsewhere</title></head><body>cannoli</body></html>",
+}
+
+
+@pytest.fixture
+def pages(tmp_path):
+    root = tmp_path / "saved"
+    for rel, text in PAGES.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    return root
+
+
+@pytest.fixture
+def index(tmp_path, pages):
+    idx = SiteIndex(str(tmp_path / "site.sqlite3"))
+    assert idx.import_dir(str(pages)) == (4, 0, 1, 0)   # example.com is not ours
+    yield idx
+    idx.close()
+
+
+def _urls(rows):
+    return [url for _, url, _, _ in rows]
+
+
+def test_bm25_ranks_the_focused_page_first(index):
+    rows = index.search("cannoli cake")
+    assert _urls(rows)[0] == "https://scittinositalianmarketplace.com/bakery"
+    assert "https://scittinosdeli.com" in _urls(rows)
+    assert "https://scittinosdeli.com/menu/" not in _urls(rows)   # script text isn't indexed
+    assert "Cannoli cake — https://scittinositalianmarketplace.com/bakery" in format_results(rows)
+
+
+def test_site_filter_includes_the_bare_host(index):
+    deli = _urls(index.search("cannoli site:scittinosdeli.com"))
+    assert deli == ["https://scittinosdeli.com"]
+    assert _urls(index.search("garlic knots site:www.scittinosdeli.com")) == ["https://scittinosdeli.com/menu/"]
+    assert index.search("garlic knots site:scittinositalianmarketplace.com") == []
+    assert _urls(index.search("antipasto site:example.com")) == [
+        "https://scittinositalianmarketplace.com/catering"]   # not an allowed domain: filter ignored
+
+
+def test_reimport_skips_unchanged_and_prunes_removed_pages(index, pages):
+    (pages / "scittinositalianmarketplace.com/bakery.html").unlink()
+    (pages / "scittinosdeli.com/menu/index.html").write_text(
+        "<html><head><title>Small plates</title></head><body>Fried calamari.</body></html>", encoding="utf-8")
+    assert index.import_dir(str(pages)) == (1, 2, 1, 1)
+    assert len(index) == 3
+    assert "https://scittinositalianmarketplace.com/bakery" not in _urls(index.search("cannoli cake"))
+    assert _urls(index.search("calamari")) == ["https://scittinosdeli.com/menu/"]
+    assert index.search("arancini") == []
+
+
+def test_keep_missing_leaves_pages_in_place(index, pages):
+    (pages / "scittinositalianmarketplace.com/bakery.html").unlink()
+    assert index.import_dir(str(pages), prune=False)[3] == 0
+    assert len(index) == 4
@@ -0,0 +1,64 @@
+# tests/test_snapshot.py
+import json
+import pickle
+
+import pytest
+
+import snapshot
+from kb import KB_PATH, current_store, load_kb
+from snapshot import FORMAT, MAGIC, MISSING, build, code_fingerprint
+
+
+@pytest.fixture(scope="module")
+def snap(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("snap") / "snap.bin")
+    build(path)
+    loaded = snapshot._snapshot(path)
+    assert loaded is not None
+    return loaded
+
+
+def test_answers_match_the_live_path(snap):
+    from diet import filter_preset
+    from main import kb_response
+    checked = 0
+    for (key, audience, cs), entry in list(snap.entries.items())[::40]:
+        filtered = filter_preset(key, cs, audience) if (cs or audience) else None
+        if entry is None:
+            assert filtered is None
+            continue
+        live = kb_response(key, list(cs), audience, filtered) if (cs or audience) else kb_response(key)
+        assert entry.response.model_dump() == live.model_dump()
+        assert entry.payload == live.model_dump(mode="json")
+        checked += 1
+    assert checked
+
+
+def test_edited_preset_falls_back_to_the_live_path(snap, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "_snapshot", lambda path=None: snap)
+    store = current_store()
+    key = "pizza night"
+    assert snapshot.lookup(key, store=store) is not MISSING
+
+    data = json.loads(open(KB_PATH, encoding="utf-8").read())
+    data["presets"][key]["notes"] = "edited"
+    edited = tmp_path / "kb.json"
+    edited.write_text(json.dumps(data), encoding="utf-8")
+    new = load_kb(str(edited), base=store)
+    assert snapshot.lookup(key, store=new) is MISSING
+    other = next(k for k in store.presets if k != key)
+    assert snapshot.lookup(other, store=new) is not MISSING
+
+
+def test_file_is_never_unpickled(tmp_path):
+    class Boom:
+        def __reduce__(self):
+            return (exec, ("raise SystemExit('unpickled')",))
+
+    import zlib
+    store = current_store()
+    path = tmp_path / "evil.bin"
+    header = MAGIC + FORMAT.to_bytes(2, "big") + store.fingerprint.encode() + code_fingerprint().encode()
+    path.write_bytes(header + zlib.compress(pickle.dumps(Boom())))
+    assert snapshot._snapshot(str(path)) is None
+
@@ -0,0 +1,49 @@
+# tests/test_startup.py
+import subprocess
+import sys
+
+from conftest import ROOT
+
+LAZY = ("cache", "cards", "metrics", "repair", "routing", "snapshot", "sqlite3",
+        "langchain", "langchain_core", "langchain_anthropic", "pydantic", "numpy")
+
+
+def _run(code: str) -> str:
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                          check=True).stdout
+
+
+def test_import_keeps_heavy_and_optional_modules_lazy():
+    out = _run("import sys, main; print(' '.join(m for m in %r if m in sys.modules))" % (LAZY,))
+    assert out.strip() == ""
+
+
+def test_kb_only_command_runs_without_the_model_stack():
+    out = subprocess.run([sys.executable, "main.py", "--kb", "pizza night, vegetarian"], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    assert "PIZZA NIGHT" in out.upper()
+
+
+def test_cli_session_keeps_one_event_loop(monkeypatch, capsys):
+    import asyncio
+
+    import main
+
+    loops = []
+
+    async def plan(query, chat_history=None):
+        loops.append(asyncio.get_running_loop())
+        return main.kb_response("pizza night")
+
+    class NoCache:
+        def summary(self):
+            return "cache: -"
+
+    answers = iter(["pizza night", "n", "game day", "n", "exit"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    monkeypatch.setattr(main, "aplan_pairing", plan)
+    monkeypatch.setattr(main, "get_response_cache", NoCache)
+    monkeypatch.setattr(main, "KB_WATCH", False)
+    main.run_cli()
+    assert len(loops) == 2 and loops[0] is loops[1]
+    assert "Goodbye!" in capsys.readouterr().out
@@ -0,0 +1,104 @@
+# tests/test_streaming.py
+import asyncio
+import json
+
+import pytest
+
+import main
+from streaming import WANTED_PATHS, JSONSectionScanner, astream_pairing
+
+ANSWER = {
+    "event": "Nonna’s \"big\" 80th \\ birthday",
+    "audience": None,
+    "constraints": ["nut-free", "budget:$$"],
+    "cuisine_pref": "italian",
+    "menu": {
+        "appetizers": ["Garlic knots", "Arancini (\"Sicilian\" rice balls)"],
+        "mains": ["Baked ziti", "Chicken parm \\u2014 family tray"],
+        "sides": [],
+        "desserts": ["Cannoli", "Tiramisù"],
+    },
+    "drinks": {"alcoholic": ["Chianti (red)"], "non_alcoholic": ["Lemonade", "San Pellegrino\\n"]},
+    "rationale": "Nested [brackets] and {braces}, \"quotes\": all inside strings.",
+    "sources": [],
+    "headcount": 40,
+}
+EXPECTED = {path: ANSWER[path[0]] if len(path) == 1 else ANSWER[path[0]][path[1]] for path in WANTED_PATHS}
+TEXT = "Here you go:\n```json\n" + json.dumps(ANSWER, indent=1, ensure_ascii=False) + "\n```"
+
+
+def _scan(chunks):
+    scanner = JSONSectionScanner()
+    out = []
+    for chunk in chunks:
+        out.extend(scanner.feed(chunk))
+    return out, scanner
+
+
+@pytest.mark.parametrize("split", range(len(TEXT) + 1))
+def test_every_split_point(split):
+    out, scanner = _scan([TEXT[:split], TEXT[split:]])
+    assert scanner.done
+    assert [p for p, _ in out].count(("menu", "mains")) == 1
+    assert dict(out) == EXPECTED and len(out) == len(EXPECTED)
+
+
+def test_one_character_at_a_time():
+    out, scanner = _scan(TEXT)
+    assert dict(out) == EXPECTED and len(out) == len(EXPECTED)
+
+
+def test_sections_arrive_before_the_object_closes():
+    cut = TEXT.index('"drinks"')
+    out, scanner = _scan([TEXT[:cut]])
+    assert not scanner.done
+    assert dict(out)[("menu", "desserts")] == ["Cannoli", "Tiramisù"]
+    assert ("drinks", "alcoholic") not in dict(out)
+
+
+class StreamingAgent:
+    """astream_events stub: streams `text` in small chunks, or fails after `fail_after` chunks."""
+
+    def __init__(self, text, fail_after=None):
+        self.text, self.fail_after = text, fail_after
+
+    async def astream_events(self, inputs, config=None, version=None):
+        yield {"event": "on_chat_model_start", "data": {}}
+        for n, i in enumerate(range(0, len(self.text), 7)):
+            if self.fail_after is not None and n == self.fail_after:
+                raise RuntimeError("upstream went away")
+            await asyncio.sleep(0)
+            yield {"event": "on_chat_model_stream", "data": {"chunk": self.text[i:i + 7]}}
+        yield {"event": "on_chain_end", "parent_ids": [], "data": {"output": {"output": self.text}}}
+
+
+@pytest.fixture
+def agent_path(monkeypatch):
+    monkeypatch.setattr(main, "_local_answer", lambda query, history: (None, None))
+    monkeypatch.setattr(main, "_agent_inputs", lambda query, history: {"query": query, "prefetched": []})
+    import streaming
+    monkeypatch.setattr(streaming, "_local_answer", main._local_answer)
+
+
+def test_failed_tier_falls_back_and_restarts(agent_path, monkeypatch):
+    agents = {"fast": StreamingAgent(TEXT, fail_after=len(TEXT) // 14), "smart": StreamingAgent(TEXT)}
+    monkeypatch.setattr(main, "_agent_attempts", lambda q, h, executor=None: [
+        ("fast", agents["fast"], None), ("smart", agents["smart"], None)])
+    seen = []
+    result = asyncio.run(astream_pairing("80th birthday", on_section=lambda p, v: seen.append(p),
+                                         on_restart=lambda: seen.append("restart"), deadline_s=0))
+    assert result.menu.mains == ANSWER["menu"]["mains"]
+    assert seen.count("restart") == 1 and seen.index("restart") > 0
+    after = seen[seen.index("restart") + 1:]
+    assert sorted(after) == sorted(WANTED_PATHS)
+
+
+def test_stream_degrades_at_deadline(agent_path, monkeypatch):
+    class Stalled(StreamingAgent):
+        async def astream_events(self, inputs, config=None, version=None):
+            yield {"event": "on_chat_model_start", "data": {}}
+            await asyncio.sleep(5)
+
+    monkeypatch.setattr(main, "_agent_attempts", lambda q, h, executor=None: [("smart", Stalled(""), None)])
+    result = asyncio.run(astream_pairing("pizza night", deadline_s=0.2))
+    assert main.is_degraded(result)
@@ -0,0 +1,166 @@
+# tests/test_tools.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+import tools
+
+
+class _Client:
+    def __init__(self, gate=None):
+        self.gate = gate
+
+    def run(self, query):
+        if self.gate is not None:
+            self.gate.wait(5)
+        return f"result for {query}"
+
+
+@pytest.fixture
+def fast_timeouts(monkeypatch):
+    monkeypatch.setenv("PAIRINGS_CACHE", ":memory:")
+    monkeypatch.setattr(tools, "TOOL_TIMEOUT_S", 0.05)
+    monkeypatch.setattr(tools, "MAX_HUNG_CALLS", 2)
+    tools.get_tool_cache.cache_clear()
+    yield
+    tools.get_tool_cache.cache_clear()
+
+
+def _wait_until(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_hung_calls_are_abandoned_and_bounded(fast_timeouts):
+    gate = threading.Event()
+    hung = _Client(gate)
+    assert tools._cached_call("search", lambda: hung, "a").startswith("TOOL_TIMEOUT")
+    assert tools._cached_call("search", lambda: hung, "b").startswith("TOOL_TIMEOUT")
+    assert tools.hung_calls() == 2
+
+    t0 = time.monotonic()
+    assert "not responding" in tools._cached_call("search", lambda: _Client(), "c")
+    assert time.monotonic() - t0 < 0.05   # fails fast, no third stuck thread
+
+    gate.set()
+    assert _wait_until(lambda: tools.hung_calls() == 0)
+    assert tools._cached_call("search", lambda: _Client(), "c") == "result for c"
+
+
+def test_async_call_times_out_without_blocking_later_calls(fast_timeouts):
+    gate = threading.Event()
+
+    async def run():
+        first = await tools._acached_call("wikipedia", lambda: _Client(gate), "x")
+        second = await tools._acached_call("wikipedia", lambda: _Client(), "y")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.startswith("TOOL_TIMEOUT") and second == "result for y"
+    gate.set()
+    assert _wait_until(lambda: tools.hung_calls() == 0)
+
+
+def test_sync_agent_tier_timeout_is_enforced():
+    from main import _invoke_within
+
+    class Hung:
+        def invoke(self, inputs, config=None):
+            time.sleep(2)
+            return {"output": "late"}
+
+    class Quick:
+        def invoke(self, inputs, config=None):
+            return {"output": "ok"}
+
+    t0 = time.monotonic()
+    with pytest.raises(TimeoutError, match="fast tier"):
+        _invoke_within(Hung(), {}, None, 0.1, "fast")
+    assert time.monotonic() - t0 < 1
+    assert _invoke_within(Quick(), {}, None, 0.1, "fast") == {"output": "ok"}
+
+
+def test_abandoned_sync_run_makes_no_more_upstream_calls(fast_timeouts):
+    from langchain_core.language_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.tools import tool
+
+    from main import _invoke_within
+
+    calls, ended = [], threading.Event()
+
+    @tool
+    def lookup(query: str) -> str:
+        """Stand-in for a search call."""
+        calls.append("tool")
+        return tools._cached_call("search", lambda: _Client(), query)
+
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="step")] * 100))
+
+    class LoopingAgent:
+        """Keeps alternating model and tool calls, like an agent that never settles."""
+
+        def invoke(self, inputs, config=None):
+            try:
+                for i in range(50):
+                    model.invoke("next step?", config=config)
+                    calls.append("model")
+                    lookup.invoke({"query": f"q{i}"}, config=config)
+                    time.sleep(0.02)
+            finally:
+                ended.set()
+
+    with pytest.raises(TimeoutError):
+        _invoke_within(LoopingAgent(), {}, None, 0.1, "smart")
+    assert ended.wait(1)   # stopped at its next call, not after all 50 steps
+    made = len(calls)
+    time.sleep(0.1)
+    assert len(calls) == made < 20
+
+
+def test_cancelled_run_skips_client_calls(fast_timeouts):
+    import contextvars
+
+    from metrics import bind_cancel
+
+    event = threading.Event()
+    event.set()
+    ctx = contextvars.copy_context()
+    ctx.run(bind_cancel, event)
+    client = _Client()
+    client.run = lambda query: pytest.fail("client called for a cancelled run")
+    assert ctx.run(tools._cached_call, "search", lambda: client, "x").startswith("TOOL_CANCELLED")
+
+
+def test_hung_cap_is_per_tool(fast_timeouts):
+    gate = threading.Event()
+    for q in ("a", "b"):
+        tools._cached_call("search", lambda: _Client(gate), q)
+    assert tools.hung_calls("search") == 2
+    assert "not responding" in tools._cached_call("search", lambda: _Client(), "c")
+    assert tools._cached_call("wikipedia", lambda: _Client(), "c") == "result for c"
+    gate.set()
+    assert _wait_until(lambda: tools.hung_calls() == 0)
+
+
+@pytest.mark.parametrize("text, filters", [
+    ("item:meatballs", {"item": "meatballs"}),
+    ("tag:office-friendly course:desserts", {"tag": "office-friendly", "course": "desserts"}),
+    ('item:"chicken parm" drink:alcoholic', {"item": "chicken parm", "drink": "alcoholic"}),
+    ('{"item": "meatballs", "colour": "red"}', {"item": "meatballs"}),
+    ("brunch, drink: mimosas", None),          # an event that happens to say "drink:"
+    ("game day item:wings", None),
+    ("tag:", None),
+    ("[1, 2]", None),
+])
+def test_structured_query_only_for_pure_filters(text, filters):
+    assert tools._structured_query(text) == filters
+
+
+def test_event_mentioning_a_filter_word_still_gets_a_lookup():
+    assert "'preset': 'coffee & pastry break'" in tools.pairing_kb("coffee & pastry break, drink: espresso")
+    assert tools.pairing_kb("item:meatballs").startswith("{'filters': {'item': 'meatballs'}")
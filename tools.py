@@ -1,124 +1,419 @@
 # tools.py
-from langchain_community.tools import WikipediaQueryRun, DuckDuckGoSearchRun
-from langchain_community.utilities import WikipediaAPIWrapper
-from langchain.tools import Tool
+# LangChain Tool objects (and the DuckDuckGo / Wikipedia clients behind them) are built on
+# first access, so importing this module for pairing_kb / save_to_txt stays cheap.
+import asyncio
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from functools import lru_cache
 from datetime import datetime
-from kb import lookup_pairings
+from typing import Optional
+from kb import LOOKUP_MIN_SCORE, current_store, rank_pairings
 
 # ---------- domain tool ----------
+_FILTER_KEYS = ("item", "tag", "course", "drink")
+
+
+_FILTER_TOKEN_RE = re.compile(r'(\w+):("[^"]*"|\S+)')
+
+
+def _structured_query(text: str):
+    """
+    'item:meatballs tag:office-friendly', 'item:"chicken parm"' or {"item": "meatballs"}
+    -> filter dict. None for anything else, including an event description that merely
+    contains a "drink:" ("brunch, drink: mimosas"): every token has to be a filter.
+    """
+    text = text.strip()
+    if text.startswith("{"):
+        import json
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(obj, dict):
+            return None
+        return {k: str(v) for k, v in obj.items() if k in _FILTER_KEYS and v} or None
+    filters = {}
+    for word in re.split(r"\s+(?=\w+:)", text):
+        m = _FILTER_TOKEN_RE.fullmatch(word)
+        if not m or m.group(1).lower() not in _FILTER_KEYS:
+            return None
+        filters[m.group(1).lower()] = m.group(2).strip('"').strip()
+    return {k: v for k, v in filters.items() if v} or None
+
+
+def _find_presets(filters) -> str:
+    store = current_store()
+    keys = store.find(**filters)
+    if not keys:
+        return "NO_MATCH (no preset matches " + ", ".join(f"{k}:{v}" for k, v in filters.items()) + ")"
+    out = []
+    for key in keys:
+        data = store.presets[key]
+        row = {"preset": key, "tags": data.get("tags", [])}
+        if filters.get("item"):
+            row["matching_items"] = store.items_matching(key, filters["item"])
+        if filters.get("course"):
+            row[filters["course"]] = data["food"].get(filters["course"].lower(), [])
+        out.append(row)
+    return {"filters": filters, "presets": out}.__repr__()
+
+
 def pairing_kb(event: str) -> str:
     """Looks up curated pairings for a given event from the local KB."""
-    data = lookup_pairings(event)
-    if not data:
+    filters = _structured_query(event)
+    if filters:
+        return _find_presets(filters)
+    ranked = rank_pairings(event, limit=3)
+    if not ranked or ranked[0][1] < LOOKUP_MIN_SCORE:
+        if ranked:
+            return "NO_MATCH (closest presets: " + ", ".join(k for k, _ in ranked) + ")"
         return "NO_MATCH"
+    key, score = ranked[0]
+    data = current_store().presets[key]
     # Return a compact, deterministic JSON-ish string (LLM will parse)
     return {
         "event": event,
+        "preset": key,
+        "match_score": score,
         "menu": data["food"],
         "drinks": data["drinks"],
         "tags": data.get("tags", [])
     }.__repr__()
 
-pairing_kb_tool = Tool(
-    name="pairing_kb",
-    func=pairing_kb,
-    description=(
-        "Look up curated pairings for a specific event (e.g., 'football party', 'wedding dinner', "
-        "'kids birthday'). Returns menu and drinks if found, else 'NO_MATCH'."
-    ),
-)
+def _pairing_kb_tool():
+    from langchain.tools import Tool
+    return Tool(
+        name="pairing_kb",
+        func=pairing_kb,
+        description=(
+            "Look up curated pairings for a specific event (e.g., 'football party', 'wedding dinner', "
+            "'kids birthday'). Matches preset names, aliases and synonyms fuzzily. Returns menu and "
+            "drinks of the best preset if found, else 'NO_MATCH' with the closest preset names. "
+            "Can also filter presets: 'item:meatballs', 'item:\"chicken parm\"', "
+            "'tag:office-friendly course:desserts', 'drink:alcoholic' (keys: item, tag, course, drink; "
+            "the whole input must be filters; combined filters must all match)."
+        ),
+    )
 
 # ---------- save to file ----------
-def save_to_txt(data: str, filename: str = "pairings_output.txt"):
-    """Save nicely formatted pairing output instead of raw JSON."""
-    import json, re
-    from datetime import datetime
+CARD_TITLE = "🍝  SCITTINO’S PAIRING RECOMMENDATION  🍷"
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    # Normalize to dict if possible
-    parsed = None
+def _as_dict(data):
+    """PairingResponse / dict / model text -> dict, or None if there's no JSON object in it."""
     if isinstance(data, dict):
-        parsed = data
-    else:
-        # Try direct JSON
+        return data
+    if hasattr(data, "model_dump"):
+        return data.model_dump()
+    import json
+    from repair import extract_json_span
+    try:
+        return json.loads(data)
+    except Exception:
+        pass
+    # First balanced {...} in mixed text (a greedy regex would swallow trailing braces)
+    span = extract_json_span(str(data))
+    if span:
         try:
-            parsed = json.loads(data)
+            return json.loads(span)
         except Exception:
-            # Try to extract the first JSON object from mixed text
-            m = re.search(r"\{.*\}", data, flags=re.S)
-            if m:
-                try:
-                    parsed = json.loads(m.group(0))
-                except Exception:
-                    parsed = None
+            return None
+    return None
+
+
+def format_card(data, timestamp: str) -> str:
+    """The human-readable pairing card written to pairings_output.txt."""
+    parsed = _as_dict(data)
+    if parsed is None:
+        # Fallback: save whatever text we got
+        return "\n".join([CARD_TITLE, f"Generated on: {timestamp}\n", str(data), "\n" + "=" * 60 + "\n"])
 
     formatted = []
-    if parsed is not None:
-        # Pretty, human-readable card
-        formatted.append("🍝  SCITTINO’S PAIRING RECOMMENDATION  🍷")
-        formatted.append(f"Generated on: {timestamp}\n")
-        formatted.append(f"Event: {parsed.get('event','N/A').title()}")
-        formatted.append("-" * 45 + "\n")
-
-        menu = parsed.get("menu", {})
-        drinks = parsed.get("drinks", {})
-
-        def fmt_list(label, items):
-            if items:
-                formatted.append(f"{label}:")
-                for i in items:
-                    formatted.append(f"  • {i}")
-                formatted.append("")
-
-        fmt_list("Appetizers",       menu.get("appetizers", []))
-        fmt_list("Mains",            menu.get("mains", []))
-        fmt_list("Sides",            menu.get("sides", []))
-        fmt_list("Desserts",         menu.get("desserts", []))
-        fmt_list("Drinks (Alcoholic)",     drinks.get("alcoholic", []))
-        fmt_list("Drinks (Non-Alcoholic)", drinks.get("non_alcoholic", []))
-
-        rationale = (parsed.get("rationale") or "").strip()
-        if rationale:
-            formatted.append("Rationale:")
-            formatted.append("  " + rationale + "\n")
-
-        sources = parsed.get("sources", [])
-        if sources:
-            formatted.append("Sources:")
-            for s in sources:
-                formatted.append(f"  • {s}")
+    formatted.append(CARD_TITLE)
+    formatted.append(f"Generated on: {timestamp}\n")
+    formatted.append(f"Event: {parsed.get('event','N/A').title()}")
+    formatted.append("-" * 45 + "\n")
+
+    menu = parsed.get("menu", {})
+    drinks = parsed.get("drinks", {})
+
+    def fmt_list(label, items):
+        if items:
+            formatted.append(f"{label}:")
+            for i in items:
+                formatted.append(f"  • {i}")
             formatted.append("")
 
-        tools_used = parsed.get("tools_used", [])
-        if tools_used:
-            formatted.append("Tools Used:")
-            formatted.append("  " + ", ".join(tools_used))
+    fmt_list("Appetizers",       menu.get("appetizers", []))
+    fmt_list("Mains",            menu.get("mains", []))
+    fmt_list("Sides",            menu.get("sides", []))
+    fmt_list("Desserts",         menu.get("desserts", []))
+    fmt_list("Drinks (Alcoholic)",     drinks.get("alcoholic", []))
+    fmt_list("Drinks (Non-Alcoholic)", drinks.get("non_alcoholic", []))
 
-        formatted.append("\n" + "=" * 60 + "\n")
-    else:
-        # Fallback: save whatever text we got
-        formatted = [
-            "🍝  SCITTINO’S PAIRING RECOMMENDATION  🍷",
-            f"Generated on: {timestamp}\n",
-            str(data),
-            "\n" + "=" * 60 + "\n",
-        ]
+    rationale = (parsed.get("rationale") or "").strip()
+    if rationale:
+        formatted.append("Rationale:")
+        formatted.append("  " + rationale + "\n")
+
+    sources = parsed.get("sources", [])
+    if sources:
+        formatted.append("Sources:")
+        for s in sources:
+            formatted.append(f"  • {s}")
+        formatted.append("")
+
+    tools_used = parsed.get("tools_used", [])
+    if tools_used:
+        formatted.append("Tools Used:")
+        formatted.append("  " + ", ".join(tools_used))
 
+    formatted.append("\n" + "=" * 60 + "\n")
+    return "\n".join(formatted)
+
+
+def save_to_txt(data: str, filename: str = "pairings_output.txt"):
+    """Save nicely formatted pairing output instead of raw JSON."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     with open(filename, "a", encoding="utf-8") as f:
-        f.write("\n".join(formatted))
+        f.write(format_card(data, timestamp))
 
     return f"✅ Pairing successfully saved to {filename}"
 
 
 
 # ---------- web/wiki enrichment (optional) ----------
-search = DuckDuckGoSearchRun()
-search_tool = Tool(
-    name="search",
-    func=search.run,
-    description="Search the web for menu or drink details if the KB is insufficient.",
-)
-
-api_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=600)
-wiki_tool = WikipediaQueryRun(api_wrapper=api_wrapper)
+@lru_cache(maxsize=None)
+def _ddg():
+    from langchain_community.tools import DuckDuckGoSearchRun
+    return DuckDuckGoSearchRun()
+
+
+@lru_cache(maxsize=None)
+def _wiki():
+    from langchain_community.tools import WikipediaQueryRun
+    from langchain_community.utilities import WikipediaAPIWrapper
+    api_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=600)
+    return WikipediaQueryRun(api_wrapper=api_wrapper)
+
+
+# Enrichment calls are cached on disk (same SQLite file as responses, own table) and
+# bounded by a per-call deadline; a timeout comes back as text so the agent carries on.
+TOOL_TIMEOUT_S = float(os.getenv("PAIRINGS_TOOL_TIMEOUT", "8"))
+TOOL_CACHE_TTL = 24 * 3600.0
+TOOL_STATS: Counter = Counter()   # "timeout:search", "error:wikipedia", "busy:search", "cancelled:search", ...
+# calls of one tool still running past their deadline; beyond this, new calls of that tool
+# fail fast instead of stacking up more stuck threads
+MAX_HUNG_CALLS = int(os.getenv("PAIRINGS_TOOL_MAX_HUNG", "8"))
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_tool_query(query: str) -> str:
+    """Cache key form: casefolded, whitespace collapsed ('site:' operators kept as-is)."""
+    return _WS_RE.sub(" ", (query or "").strip()).casefold()
+
+
+@lru_cache(maxsize=None)
+def get_tool_cache():
+    from cache import DiskCache
+    return DiskCache(os.getenv("PAIRINGS_CACHE", "pairings_cache.sqlite3"), table="tool_results",
+                     ttl=TOOL_CACHE_TTL, max_entries=2000)
+
+
+# Each blocking client call gets its own daemon thread, so one that hangs past its deadline
+# is abandoned without holding a worker that later calls need. Stuck calls are counted per
+# tool: a slow search upstream doesn't take wikipedia down with it.
+_HUNG_LOCK = threading.Lock()
+_hung: Counter = Counter()
+
+
+def _start(name: str, fn) -> Optional[Future]:
+    """Run fn() on its own daemon thread; None while MAX_HUNG_CALLS `name` calls are still stuck."""
+    with _HUNG_LOCK:
+        if _hung[name] >= MAX_HUNG_CALLS:
+            return None
+    fut: Future = Future()
+    fut.set_running_or_notify_cancel()   # running: a caller's cancel() can't break set_result
+    fut.abandoned = False
+
+    def run():
+        try:
+            fut.set_result(fn())
+        except BaseException as ex:
+            fut.set_exception(ex)
+        with _HUNG_LOCK:
+            if fut.abandoned:
+                _hung[name] -= 1
+
+    threading.Thread(target=run, daemon=True, name=f"tool-{name}").start()
+    return fut
+
+
+def _abandon(name: str, fut: Future) -> None:
+    with _HUNG_LOCK:
+        if not fut.done() and not fut.abandoned:
+            fut.abandoned = True
+            _hung[name] += 1
+            if _hung[name] == MAX_HUNG_CALLS:
+                print(f"tools: {MAX_HUNG_CALLS} {name} calls stuck past {TOOL_TIMEOUT_S:g}s; "
+                      f"answering 'not responding' until one finishes", file=sys.stderr)
+
+
+def hung_calls(name: Optional[str] = None) -> int:
+    return _hung[name] if name else sum(_hung.values())
+
+
+def _timeout_text(name: str) -> str:
+    return f"TOOL_TIMEOUT: {name} gave no answer within {TOOL_TIMEOUT_S:g}s; continue without it."
+
+
+def _busy_text(name: str) -> str:
+    TOOL_STATS[f"busy:{name}"] += 1
+    return f"TOOL_TIMEOUT: {name} is not responding right now; continue without it."
+
+
+def _cancelled_text(name: str) -> str:
+    TOOL_STATS[f"cancelled:{name}"] += 1
+    return f"TOOL_CANCELLED: {name} skipped, the request was given up on."
+
+
+def _cached_call(name: str, client, query: str) -> str:
+    from metrics import cancelled
+    key = f"{name}:{normalize_tool_query(query)}"
+    hit = get_tool_cache().get(key)
+    if hit is not None:
+        return hit
+    if cancelled():   # abandoned agent run: don't spend another upstream call on it
+        return _cancelled_text(name)
+    fut = _start(name, lambda: client().run(query))
+    if fut is None:
+        return _busy_text(name)
+    try:
+        text = fut.result(timeout=TOOL_TIMEOUT_S)
+    except FutureTimeout:
+        _abandon(name, fut)
+        TOOL_STATS[f"timeout:{name}"] += 1
+        return _timeout_text(name)
+    except Exception as ex:
+        TOOL_STATS[f"error:{name}"] += 1
+        return f"TOOL_ERROR: {name} failed ({type(ex).__name__}); continue without it."
+    if not cancelled():
+        get_tool_cache().put(key, text)
+    return text
+
+
+async def _acached_call(name: str, client, query: str) -> str:
+    key = f"{name}:{normalize_tool_query(query)}"
+    hit = get_tool_cache().get(key)
+    if hit is not None:
+        return hit
+    fut = _start(name, lambda: client().run(query))
+    if fut is None:
+        return _busy_text(name)
+    try:
+        text = await asyncio.wait_for(asyncio.wrap_future(fut), TOOL_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        _abandon(name, fut)
+        TOOL_STATS[f"timeout:{name}"] += 1
+        return _timeout_text(name)
+    except asyncio.CancelledError:
+        _abandon(name, fut)   # request deadline: the thread keeps going, unobserved
+        raise
+    except Exception as ex:
+        TOOL_STATS[f"error:{name}"] += 1
+        return f"TOOL_ERROR: {name} failed ({type(ex).__name__}); continue without it."
+    get_tool_cache().put(key, text)
+    return text
+
+
+def web_search(query: str) -> str:
+    return _cached_call("search", _ddg, query)
+
+
+async def aweb_search(query: str) -> str:
+    return await _acached_call("search", _ddg, query)
+
+
+def wiki_lookup(query: str) -> str:
+    return _cached_call("wikipedia", _wiki, query)
+
+
+async def awiki_lookup(query: str) -> str:
+    return await _acached_call("wikipedia", _wiki, query)
+
+
+def tool_summary() -> str:
+    base = get_tool_cache().summary(label="tool cache")
+    if TOOL_STATS:
+        base += "; " + ", ".join(f"{k}={v}" for k, v in sorted(TOOL_STATS.items()))
+    if hung_calls():
+        base += "; still hung: " + ", ".join(f"{k}={v}" for k, v in sorted(_hung.items()) if v)
+    return base
+
+
+@lru_cache(maxsize=None)
+def _site_index():
+    from siteindex import SITE_INDEX_PATH, SiteIndex, index_available
+    return SiteIndex(SITE_INDEX_PATH, readonly=True) if index_available(SITE_INDEX_PATH) else None
+
+
+def site_search(query: str) -> str:
+    """Offline BM25 search over the imported Scittino’s pages (see siteindex.py)."""
+    from siteindex import format_results
+    return format_results(_site_index().search(query, limit=5))
+
+
+def _search_tool():
+    from langchain.tools import Tool
+    if _site_index() is not None:
+        # local snapshot of the two allowed sites: no network, reproducible results
+        return Tool(
+            name="search",
+            func=site_search,
+            description=(
+                "Search Scittino’s own sites (offline snapshot of scittinosdeli.com and "
+                "scittinositalianmarketplace.com) for menu, catering or bakery details if the KB is "
+                "insufficient. Plain keywords work; 'site:' narrows to one domain. Returns page titles "
+                "and URLs to cite in `sources`."
+            ),
+        )
+    return Tool(
+        name="search",
+        func=web_search,
+        coroutine=aweb_search,
+        description="Search the web for menu or drink details if the KB is insufficient.",
+    )
+
+
+def _wiki_tool():
+    from langchain.tools import Tool
+    # Same name/description as WikipediaQueryRun, but the client is only built when first used
+    return Tool(
+        name="wikipedia",
+        func=wiki_lookup,
+        coroutine=awiki_lookup,
+        description=(
+            "A wrapper around Wikipedia. Useful for when you need to answer general questions about "
+            "people, places, companies, facts, historical events, or other subjects. "
+            "Input should be a search query."
+        ),
+    )
+
+
+_LAZY_TOOLS = {"pairing_kb_tool": _pairing_kb_tool, "search_tool": _search_tool, "wiki_tool": _wiki_tool}
+
+
+@lru_cache(maxsize=None)
+def get_tool(name: str):
+    return _LAZY_TOOLS[name]()
+
+
+def __getattr__(name: str):
+    if name in _LAZY_TOOLS:
+        return get_tool(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")